@@ -0,0 +1,8 @@
+-- อัปเกรดตาราง event_log ที่สร้างจาก init_eventlog.sql เวอร์ชันก่อน (ไม่มีคอลัมน์ id)
+-- sync แบบเพิ่มเฉพาะแถวใหม่ (roll/sync_to_clickhouse.py) ใช้ id เป็น watermark และเช็คแถวซ้ำ
+--   docker exec -i clickhouse clickhouse-client --multiquery < clickhouse/002_eventlog_id.sql
+-- แถวเดิมจาก sync แบบเก่าได้ id = 0 และมีแถวซ้ำอยู่แล้ว → ล้างแล้วส่งใหม่ครั้งเดียว:
+--   python manage.py sync_clickhouse --reset
+ALTER TABLE event_log ADD COLUMN IF NOT EXISTS id UInt64 FIRST;
+ALTER TABLE event_log ADD INDEX IF NOT EXISTS idx_id id TYPE minmax GRANULARITY 4;
+ALTER TABLE event_log MATERIALIZE INDEX idx_id;
@@ -1,5 +1,6 @@
 -- สร้างครั้งเดียวตอนขึ้นคอนเทนเนอร์
 CREATE TABLE IF NOT EXISTS event_log (
+  id UInt64,                      -- EventLog.id (watermark + กันส่งซ้ำของ roll/sync_to_clickhouse.py)
   ts DateTime DEFAULT now(),      -- EventLog.ts
   player_id UInt64,               -- FK -> Player.id (int/serial ใช้ UInt64 ปลอดภัย)
   session_id UUID,                -- Session.id
@@ -11,7 +12,8 @@ CREATE TABLE IF NOT EXISTS event_log (
   potions Int32,
   pot_heal_ct Int32,
   pot_boost_ct Int32,
-  attrs JSON                      -- Django JSONField
+  attrs JSON,                     -- Django JSONField
+  INDEX idx_id id TYPE minmax GRANULARITY 4   -- id เพิ่มตาม ts → ค้นช่วง id ได้โดยไม่ scan ทั้งตาราง
 )
 ENGINE = MergeTree()
 PARTITION BY toYYYYMM(ts)
@@ -0,0 +1,132 @@
+# bench/async_vs_sync.py
+# เทียบ narrator path แบบ sync (thread ต่อเทิร์น) กับ async (event loop เดียว) ภายใต้ LLM ที่ช้า
+#
+#   python bench/async_vs_sync.py --turns 200 --latency 2.0 --threads 8
+#
+# ไม่เรียก Groq จริง: ใช้ client ปลอมที่หน่วงเวลาเท่ากับ --latency แล้วคืน JSON narrator ที่ถูกต้อง
+# - sync : เหมือน gunicorn worker ที่มี --threads N → รอ LLM ได้พร้อมกันแค่ N เทิร์น
+# - async: เหมือน uvicorn worker เดียวที่ใช้ views_async → รอพร้อมกันได้ทุกเทิร์น
+# ระหว่างวัดแทน ai.narrator_gate ด้วย gate ที่รับได้ทุกเทิร์น (gate จริงตีกลับส่วนเกินไป baseline หลัง max_wait_s
+# → จะกลายเป็นวัด admission control ไม่ใช่ narrator path) และนับ AIResult.source: มีเทิร์นตกไป baseline = ผลใช้ไม่ได้
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # .../journey
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "journey.settings")
+
+import django
+django.setup()
+
+from roll import ai
+from roll.admission import AdmissionGate
+from roll.rules import make_roll
+
+_CONTENT = json.dumps({
+    "narration": "**[สถานที่]:** ถนนทางเข้าหมู่บ้าน\n**[สถานการณ์]:** เสียงร่ำไห้ลอยมากับสายลม",
+    "hp_delta": -3, "mp_delta": 0, "grant_heal": 0, "grant_boost": 0, "status": [], "extra": {},
+}, ensure_ascii=False)
+
+def _fake_response():
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=_CONTENT))])
+
+class _SlowSyncClient:
+    def __init__(self, latency: float):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.latency = latency
+
+    def _create(self, **kwargs):
+        time.sleep(self.latency)
+        return _fake_response()
+
+class _SlowAsyncClient:
+    def __init__(self, latency: float):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.latency = latency
+
+    async def _create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _fake_response()
+
+def _turn_args():
+    session = SimpleNamespace(stage_index=1, turn=2)
+    player = SimpleNamespace(hp=30, mp=10, pot_heal=1, pot_boost=0, HP_MAX=30, MP_MAX=10)
+    roll = make_roll(turn=2)
+    return dict(session=session, player=player, roll=roll, action_text="สำรวจรอบตัว", kind="NORMAL")
+
+@contextmanager
+def _open_gate(turns: int):
+    """ให้ทุกเทิร์นได้ slot ของ narrator (คืน ai.narrator_gate ตัวจริงเมื่อจบ)"""
+    real = ai.narrator_gate
+    ai.narrator_gate = AdmissionGate(max_concurrent=turns)
+    try:
+        yield
+    finally:
+        ai.narrator_gate = real
+
+def _result(mode: str, turns: int, threads: int, wall: float, results) -> dict:
+    sources = Counter(r.source for r in results)
+    return {"mode": mode, "turns": turns, "threads": threads, "wall_s": round(wall, 3),
+            "turns_per_s": round(turns / wall, 2), "llm": sources["llm"], "baseline": sources["baseline"],
+            "fallback_rate": round(sources["baseline"] / turns, 4) if turns else 0.0}
+
+def bench_sync(turns: int, latency: float, threads: int) -> dict:
+    client = _SlowSyncClient(latency)
+    with _open_gate(turns):
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(lambda _: ai.resolve_effects(groq_client=client, **_turn_args()), range(turns)))
+        wall = time.perf_counter() - t0
+    return _result("sync", turns, threads, wall, results)
+
+def bench_async(turns: int, latency: float) -> dict:
+    client = _SlowAsyncClient(latency)
+
+    async def run():
+        return await asyncio.gather(*(ai.aresolve_effects(groq_client=client, **_turn_args()) for _ in range(turns)))
+
+    threads_before = threading.active_count()
+    with _open_gate(turns):
+        t0 = time.perf_counter()
+        results = asyncio.run(run())
+        wall = time.perf_counter() - t0
+    return _result("async", turns, threads_before, wall, results)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="sync vs async narrator benchmark (simulated slow LLM)")
+    ap.add_argument("--turns", type=int, default=200, help="จำนวนเทิร์นที่ยิงพร้อมกัน")
+    ap.add_argument("--latency", type=float, default=2.0, help="เวลาตอบของ LLM ปลอม (วินาที)")
+    ap.add_argument("--threads", type=int, default=8, help="จำนวน thread ของ worker แบบ sync")
+    ap.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    args = ap.parse_args(argv)
+
+    # ปิด print ของ narrator ระหว่างวัด
+    import contextlib, io
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [bench_sync(args.turns, args.latency, args.threads), bench_async(args.turns, args.latency)]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"simulated LLM latency: {args.latency}s, concurrent turns: {args.turns}")
+        for r in results:
+            print(f"  {r['mode']:<5}  threads={r['threads']:<3}  wall={r['wall_s']:>8.3f}s  {r['turns_per_s']:>8.2f} turns/s"
+                  f"  fallback={r['fallback_rate']:.1%} ({r['baseline']}/{r['turns']})")
+
+    fell_back = [r["mode"] for r in results if r["baseline"]]
+    if fell_back:
+        raise SystemExit(f"❌ some turns fell back to baseline ({', '.join(fell_back)}): "
+                         "turns/s does not measure the narrator path")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# bench/ch_sync_bench.py
+# เทียบความเร็วส่ง EventLog → ClickHouse: แบบเดิม (ทีละแถว) กับแบบคอลัมน์ของ roll/sync_to_clickhouse.py
+#
+#   python bench/ch_sync_bench.py --rows 200000                    # ClickHouse ฝังใน process (chdb) ไม่ต้องมี server
+#   python bench/ch_sync_bench.py --target server --sink mergetree # ใช้ server ตาม settings.CLICKHOUSE
+#   python bench/ch_sync_bench.py --seed 200000 --rows 200000      # DB dev มีแถวไม่พอ: copy EventLog ที่มีอยู่จนครบ
+#
+# อ่าน EventLog --rows แถวแรกทีละ --batch-size แถว (ตาม id แบบรอบ incremental) แล้ว insert ลงตารางชั่วคราว event_log_bench
+# - rows    : .values() → dict → _row (int() ทุกฟิลด์, attrs เป็น dict) → client.insert แถวต่อแถว (โค้ดก่อนเปลี่ยน)
+# - columns : sync._columns (DB แปลง ts/uuid/attrs ให้) → client.insert(column_oriented=True)
+# แยกเวลาเป็น prepare (อ่าน DB + จัดรูป) กับ insert (client serialize + ส่ง) และ CPU ต่อแถวของ process นี้
+# --sink null (default) = ตาราง ENGINE Null: ตัดเวลาเขียน MergeTree ออก เหลือต้นทุนฝั่ง Python ชัดๆ
+# (target chdb: engine อยู่ใน process เดียวกัน CPU ของ insert จึงรวมงาน parse ของ ClickHouse ด้วย)
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # .../journey
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "journey.settings")
+
+import django
+django.setup()
+
+from roll import sync_to_clickhouse as sync
+from roll.models import EventLog
+
+BENCH_TABLE = "event_log_bench"
+INIT_SQL = Path(__file__).resolve().parents[2] / "clickhouse" / "init_eventlog.sql"
+
+# ---------- แบบเดิม (ทีละแถว) ----------
+
+def _legacy_row(r):
+    return [
+        int(r["id"]), r["ts"], int(r["player_id"]), str(r["session_id"]), r["type"],
+        int(r["stage_index"]), int(r["turn"]), int(r["hp"]), int(r["mp"]), int(r["potions"]),
+        int(r["pot_heal_ct"]), int(r["pot_boost_ct"]), r["attrs"] or {},
+    ]
+
+def _prepare_rows(last_id: int, horizon: int, batch_size: int):
+    rows = list(EventLog.objects.filter(id__gt=last_id, id__lte=horizon).order_by("id").values(*sync.COLUMNS)[:batch_size])
+    if not rows:
+        return None, last_id
+    return [_legacy_row(r) for r in rows], rows[-1]["id"]
+
+def _insert_rows(client, data) -> int:
+    client.insert(BENCH_TABLE, data, column_names=sync.COLUMNS)
+    return len(data)
+
+# ---------- แบบคอลัมน์ ----------
+
+def _prepare_columns(last_id: int, horizon: int, batch_size: int):
+    columns = sync._columns(EventLog.objects.filter(id__gt=last_id, id__lte=horizon).order_by("id"), limit=batch_size)
+    if not columns:
+        return None, last_id
+    return columns, columns[0][-1]
+
+def _insert_columns(client, columns) -> int:
+    return sync._insert(client, BENCH_TABLE, columns)
+
+MODES = {
+    "rows": (_prepare_rows, _insert_rows),
+    "columns": (_prepare_columns, _insert_columns),
+}
+
+# ---------- วัด ----------
+
+def _fresh_table(client, sink: str) -> None:
+    engine = " ENGINE = Null" if sink == "null" else ""   # ตาราง Null TRUNCATE ไม่ได้ → สร้างใหม่ทุกรอบ
+    client.command(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    client.command(f"CREATE TABLE {BENCH_TABLE} AS event_log{engine}")
+
+def run_mode(client, mode: str, horizon: int, batch_size: int, sink: str) -> dict:
+    prepare, insert = MODES[mode]
+    _fresh_table(client, sink)
+    t_prep = t_ins = 0.0
+    rows = 0
+    last_id = 0
+    cpu0 = time.process_time()
+    while True:
+        t0 = time.perf_counter()
+        data, last_id = prepare(last_id, horizon, batch_size)
+        t1 = time.perf_counter()
+        if data is None:
+            break
+        rows += insert(client, data)
+        t_prep += t1 - t0
+        t_ins += time.perf_counter() - t1
+    cpu = time.process_time() - cpu0
+    wall = t_prep + t_ins
+    return {
+        "mode": mode, "rows": rows,
+        "prepare_s": round(t_prep, 3), "insert_s": round(t_ins, 3), "wall_s": round(wall, 3),
+        "rows_per_s": round(rows / wall, 1) if wall else 0.0,
+        "cpu_us_per_row": round(cpu / rows * 1e6, 2) if rows else 0.0,
+    }
+
+def _client(target: str):
+    if target == "server":
+        return sync.get_client()
+    import clickhouse_connect   # ต้องมี chdb (pip install chdb)
+    client = clickhouse_connect.get_client(interface="chdb")
+    client.command(INIT_SQL.read_text(encoding="utf-8"))
+    return client
+
+def _seed(n: int) -> None:
+    """copy EventLog ที่มีอยู่ (id ใหม่, ค่าเดิม) จนมีอย่างน้อย n แถว — ใช้กับ DB dev เท่านั้น"""
+    base = list(EventLog.objects.order_by("id")[:5000])
+    if not base:
+        raise SystemExit("EventLog is empty: play a few sessions first (or run bench/loadgen.py)")
+    fields = [f.attname for f in EventLog._meta.concrete_fields if f.attname != "id"]
+    while (have := EventLog.objects.count()) < n:
+        batch = [EventLog(**{f: getattr(e, f) for f in fields}) for e in base[:n - have]]
+        EventLog.objects.bulk_create(batch, batch_size=5000)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="EventLog → ClickHouse sync throughput: row-by-row vs columnar")
+    ap.add_argument("--rows", type=int, default=100_000, help="ใช้ EventLog กี่แถวแรก")
+    ap.add_argument("--batch-size", type=int, default=5000, help="แถวต่อ insert (เท่ากับ sync_clickhouse)")
+    ap.add_argument("--repeat", type=int, default=3, help="วัดกี่รอบต่อแบบ (รายงานรอบที่เร็วที่สุด)")
+    ap.add_argument("--target", choices=("chdb", "server"), default="chdb")
+    ap.add_argument("--sink", choices=("null", "mergetree"), default="null",
+                    help="null = ไม่เขียนจริง วัดเฉพาะต้นทุนฝั่ง client | mergetree = โครงสร้างเดียวกับ event_log")
+    ap.add_argument("--seed", type=int, default=0, help="copy EventLog ให้มีอย่างน้อยเท่านี้ก่อนวัด (DB dev เท่านั้น)")
+    ap.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON")
+    args = ap.parse_args(argv)
+
+    if args.seed:
+        _seed(args.seed)
+    horizon = EventLog.objects.order_by("id").values_list("id", flat=True)[args.rows - 1:args.rows].first()
+    if horizon is None:
+        horizon = EventLog.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+    client = _client(args.target)
+    try:
+        results = []
+        for mode in MODES:
+            runs = [run_mode(client, mode, horizon, args.batch_size, args.sink) for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda r: r["wall_s"]))
+    finally:
+        client.command(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+
+    before, after = results
+    speedup = {
+        "rows_per_s": round(after["rows_per_s"] / before["rows_per_s"], 2) if before["rows_per_s"] else None,
+        "cpu_per_row": round(before["cpu_us_per_row"] / after["cpu_us_per_row"], 2) if after["cpu_us_per_row"] else None,
+    }
+    if args.json:
+        print(json.dumps({"target": args.target, "sink": args.sink, "results": results, "speedup": speedup}, indent=2))
+        return
+    print(f"{before['rows']:,} EventLog rows, batch {args.batch_size:,}, target={args.target}, sink={args.sink}, best of {args.repeat}")
+    for r in results:
+        print(f"  {r['mode']:<8} prepare={r['prepare_s']:>7.3f}s  insert={r['insert_s']:>7.3f}s"
+              f"  {r['rows_per_s']:>11,.0f} rows/s  {r['cpu_us_per_row']:>7.2f} µs CPU/row")
+    print(f"  columns vs rows: {speedup['rows_per_s']}x rows/s, {speedup['cpu_per_row']}x less CPU per row")
+
+if __name__ == "__main__":
+    main()
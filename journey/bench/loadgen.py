@@ -0,0 +1,247 @@
+# bench/loadgen.py
+# load test แบบผู้เล่นพร้อมกัน N คน ยิงผ่าน HTTP จริงที่ endpoint ใน roll/urls.py
+#
+#   # 1) narrator ปลอม (ไม่เปลือง quota)
+#   python bench/mock_llm_server.py --port 8900 --latency 0.8
+#   # 2) server ที่จะวัด (เปิด header นับ query ด้วย)
+#   #    หลาย worker ต้องใช้ session cache กลาง (ROLL_SESSION_CACHE_BACKEND=django + CACHES เช่น Redis)
+#   LLM_BASE_URL=http://127.0.0.1:8900 api_key=mock ROLL_QUERY_COUNT_HEADER=1 ROLL_SESSION_CACHE_BACKEND=django \
+#       gunicorn journey.wsgi -w 4 --threads 8
+#   # 3) ผู้เล่น 200 คน คิด 2–6 วินาทีต่อเทิร์น
+#   python bench/loadgen.py --base-url http://127.0.0.1:8000 --players 200 --think 2 6 --duration 300
+#
+# ผู้เล่นแต่ละคน (thread ละคน, X-ANON-ID ของตัวเอง):
+#   start → [state → คิด → act] ซ้ำจน session จบ (ตาย / ผ่าน 10×10) → เริ่มรอบใหม่จนครบ --runs
+#   --quit-rate = โอกาสต่อเทิร์นที่จะกด end กลางทาง
+# รายงาน p50/p95/p99 ต่อ endpoint, throughput, error rate และจำนวน DB query ต่อ request
+# (อ่านจาก header X-DB-Queries — ต้องเปิด ROLL_QUERY_COUNT_HEADER=1 ฝั่ง server)
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import requests
+
+ACTIONS = [
+    "สำรวจรอบตัว", "เดินหน้าต่อ", "ซ่อนตัวรอดูสถานการณ์", "สวดมนต์ขอพร",
+    "จุดตะเกียงส่องทาง", "ตามเสียงร่ำไห้ไป", "ค้นหาเบาะแสในห้อง",
+]
+
+# ---------- สถิติ ----------
+
+class Recorder:
+    """เก็บ latency/status/query count ต่อ endpoint (thread-safe)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.queries: Dict[str, List[int]] = defaultdict(list)
+        self.runs_finished: Dict[str, int] = defaultdict(int)
+        self.turns = 0
+
+    def request(self, endpoint: str, seconds: float, status: int, queries: Optional[int]) -> None:
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+            if status >= 400 or status == 0:
+                self.errors[endpoint] += 1
+            if queries is not None:
+                self.queries[endpoint].append(queries)
+            if endpoint == "act" and status == 200:
+                self.turns += 1
+
+    def run_finished(self, status: str) -> None:
+        with self.lock:
+            self.runs_finished[status] += 1
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def summarize(rec: Recorder, elapsed: float) -> Dict[str, Any]:
+    with rec.lock:
+        endpoints = {}
+        total = errors = 0
+        for name, lat in sorted(rec.latencies.items()):
+            s = sorted(lat)
+            n = len(s)
+            q = rec.queries.get(name) or []
+            total += n
+            errors += rec.errors[name]
+            endpoints[name] = {
+                "count": n,
+                "rps": round(n / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(rec.errors[name] / n, 4) if n else 0.0,
+                "statuses": dict(sorted(rec.statuses[name].items())),
+                "p50_ms": round(percentile(s, 50) * 1000, 1),
+                "p95_ms": round(percentile(s, 95) * 1000, 1),
+                "p99_ms": round(percentile(s, 99) * 1000, 1),
+                "max_ms": round(s[-1] * 1000, 1) if s else 0.0,
+                "db_queries_avg": round(sum(q) / len(q), 2) if q else None,
+                "db_queries_max": max(q) if q else None,
+            }
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "turns_per_s": round(rec.turns / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "runs_finished": dict(rec.runs_finished),
+            "endpoints": endpoints,
+        }
+
+def print_report(summary: Dict[str, Any]) -> None:
+    print(f"\n⏱️  {summary['elapsed_s']}s  requests={summary['requests']}  "
+          f"rps={summary['rps']}  turns/s={summary['turns_per_s']}  errors={summary['error_rate']:.2%}")
+    print(f"🏁 runs finished: {summary['runs_finished']}")
+    header = f"{'endpoint':<8} {'count':>7} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'q/req':>6}"
+    print(header)
+    print("-" * len(header))
+    for name, e in summary["endpoints"].items():
+        q = "-" if e["db_queries_avg"] is None else f"{e['db_queries_avg']:.1f}"
+        print(f"{name:<8} {e['count']:>7} {e['rps']:>7} {e['error_rate'] * 100:>5.1f}% "
+              f"{e['p50_ms']:>7.0f}ms {e['p95_ms']:>6.0f}ms {e['p99_ms']:>6.0f}ms {e['max_ms']:>6.0f}ms {q:>6}")
+
+# ---------- ผู้เล่นจำลอง ----------
+
+class Player:
+    def __init__(self, idx: int, opts, rec: Recorder, stop: threading.Event):
+        self.opts = opts
+        self.rec = rec
+        self.stop = stop
+        self.rng = random.Random(None if opts.seed is None else opts.seed + idx)
+        self.http = requests.Session()   # keep-alive ต่อผู้เล่นเหมือน browser
+        self.http.headers["X-ANON-ID"] = uuid.uuid4().hex
+
+    def _call(self, endpoint: str, method: str, path: str, body: Optional[dict] = None) -> Optional[dict]:
+        started = time.perf_counter()
+        status, queries, data = 0, None, None
+        try:
+            resp = self.http.request(method, self.opts.base_url + path, json=body, timeout=self.opts.timeout)
+            status = resp.status_code
+            q = resp.headers.get("X-DB-Queries")
+            queries = int(q) if q is not None else None
+            if resp.headers.get("Content-Type", "").startswith("application/json"):
+                data = resp.json()
+        except requests.RequestException:
+            pass
+        self.rec.request(endpoint, time.perf_counter() - started, status, queries)
+        return data if 200 <= status < 300 else None
+
+    def _think(self) -> None:
+        lo, hi = self.opts.think
+        self.stop.wait(self.rng.uniform(lo, hi))
+
+    def play(self) -> None:
+        for _ in range(self.opts.runs):
+            if self.stop.is_set():
+                return
+            self.play_run()
+
+    def play_run(self) -> None:
+        state = self._call("start", "POST", "/api/session/start")
+        if not state:
+            self._think()
+            return
+        sid = state["session_id"]
+        if self.opts.intro:
+            self._call("intro", "GET", f"/api/session/{sid}/intro")
+
+        status = state.get("status", "ACTIVE")
+        while status == "ACTIVE" and not self.stop.is_set():
+            self._call("state", "GET", f"/api/session/{sid}/state")
+            self._think()
+            if self.stop.is_set():
+                break
+            if self.rng.random() < self.opts.quit_rate:
+                self._call("end", "POST", f"/api/session/{sid}/end")
+                self.rec.run_finished("QUIT")
+                return
+            player = state.get("player") or {}
+            body = {
+                "action_text": self.rng.choice(ACTIONS),
+                "use_mp": self.rng.randint(0, min(3, int(player.get("mp") or 0))),
+                "use_heal": bool(player.get("pot_heal")) and int(player.get("hp") or 0) < 15,
+            }
+            result = self._call("act", "POST", f"/api/session/{sid}/act", body)
+            if result is None:
+                continue   # error/409 → ลองเทิร์นใหม่หลังคิด (เหมือนผู้เล่นกดซ้ำ)
+            state = result
+            status = result.get("status", status)
+
+        if status != "ACTIVE":
+            self.rec.run_finished(status)
+        elif self.opts.end_on_stop:
+            self._call("end", "POST", f"/api/session/{sid}/end")
+
+# ---------- main ----------
+
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Concurrent-player load generator for the session API")
+    p.add_argument("--base-url", default="http://127.0.0.1:8000")
+    p.add_argument("--players", type=int, default=50, help="จำนวนผู้เล่นพร้อมกัน")
+    p.add_argument("--runs", type=int, default=1, help="จำนวนรอบเล่นต่อผู้เล่น")
+    p.add_argument("--duration", type=float, default=None, help="หยุดเมื่อครบกี่วินาที (ไม่ระบุ = จนเล่นครบ)")
+    p.add_argument("--ramp", type=float, default=10.0, help="ทยอยเพิ่มผู้เล่นจนครบภายในกี่วินาที")
+    p.add_argument("--think", type=float, nargs=2, default=(2.0, 6.0), metavar=("MIN", "MAX"),
+                   help="เวลาคิดต่อเทิร์น (วินาที)")
+    p.add_argument("--quit-rate", type=float, default=0.0, help="โอกาสต่อเทิร์นที่จะกด end กลางทาง")
+    p.add_argument("--intro", action="store_true", help="เรียก /intro หลัง start ทุกรอบ")
+    p.add_argument("--end-on-stop", action="store_true", help="กด end ให้ session ที่ค้างเมื่อหมดเวลา")
+    p.add_argument("--timeout", type=float, default=30.0, help="timeout ต่อ request (วินาที)")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--json", dest="json_out", default=None, help="บันทึกผลเป็นไฟล์ JSON")
+    return p
+
+def main(argv=None) -> int:
+    opts = _parser().parse_args(argv)
+    opts.base_url = opts.base_url.rstrip("/")
+    rec = Recorder()
+    stop = threading.Event()
+
+    print(f"🚀 {opts.players} players × {opts.runs} runs → {opts.base_url} "
+          f"(think {opts.think[0]}–{opts.think[1]}s, ramp {opts.ramp}s)")
+    threads = []
+    started = time.perf_counter()
+    for i in range(opts.players):
+        t = threading.Thread(target=Player(i, opts, rec, stop).play, daemon=True)
+        t.start()
+        threads.append(t)
+        if opts.ramp and opts.players > 1:
+            stop.wait(opts.ramp / opts.players)
+
+    deadline = None if opts.duration is None else started + opts.duration
+    try:
+        for t in threads:
+            while t.is_alive():
+                if deadline is not None and time.perf_counter() >= deadline:
+                    stop.set()
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("\n✋ stopping...")
+        stop.set()
+        for t in threads:
+            t.join(timeout=opts.timeout)
+
+    summary = summarize(rec, time.perf_counter() - started)
+    print_report(summary)
+    if opts.json_out:
+        with open(opts.json_out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"💾 saved {opts.json_out}")
+    return 1 if summary["requests"] == 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
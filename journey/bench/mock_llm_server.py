@@ -0,0 +1,247 @@
+# bench/mock_llm_server.py
+# เซิร์ฟเวอร์ LLM ปลอมสำหรับ load test narrator path โดยไม่เปลือง quota ของ Groq
+#
+#   python bench/mock_llm_server.py --port 8900 --latency 0.8 --jitter 0.3 --tokens-per-sec 400 --error-rate 0.02
+#   LLM_BASE_URL=http://127.0.0.1:8900 api_key=mock python manage.py runserver
+#
+# - พูดโปรโตคอล chat.completions แบบเดียวกับ Groq/OpenAI ที่ POST /openai/v1/chat/completions
+#   (ทั้งตอบทั้งก้อน และ stream=True แบบ SSE "data: {...}" ปิดท้ายด้วย "data: [DONE]")
+# - ตอบ JSON ตาม schema ของ ai._build_user_prompt โดยดู tier จากพรอมต์ (fail เสีย HP, great ได้ boost)
+# - --latency/--jitter = เวลาก่อน token แรก, --tokens-per-sec = ความเร็วปล่อยข้อความ (0 = ทันที)
+# - --error-rate ตอบ 500, --rate-limit-rate ตอบ 429 (ไว้ดู breaker/admission ทำงาน)
+# ไม่ต้องใช้ Django — รันเดี่ยวๆ ได้
+from __future__ import annotations
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+CHAT_PATH = "/openai/v1/chat/completions"
+CHARS_PER_TOKEN = 4   # ประมาณคร่าวๆ ใช้แบ่ง chunk ตอน stream และคิด usage
+
+_TIER_EFFECTS = {
+    "fail":    {"hp_delta": -8, "grant_boost": 0, "situation": "เงาดำพุ่งออกมาจากความมืด คุณถูกกรงเล็บเย็นเฉียบข่วนเข้าที่แขน"},
+    "neutral": {"hp_delta": 0,  "grant_boost": 0, "situation": "คุณผ่านไปได้ แต่เสียงร่ำไห้ยังคงตามหลังมาไม่ห่าง"},
+    "success": {"hp_delta": 0,  "grant_boost": 0, "situation": "คุณพบรอยเท้าเปียกน้ำที่ชี้ไปยังทางเดินแคบๆ"},
+    "great":   {"hp_delta": 0,  "grant_boost": 1, "situation": "แสงตะเกียงสะท้อนเครื่องรางเก่าที่ตกอยู่ใต้แท่นบูชา คุณเก็บมันไว้"},
+}
+
+def _prompt_field(prompt: str, pattern: str, default: str) -> str:
+    m = re.search(pattern, prompt)
+    return m.group(1).strip() if m else default
+
+def narrator_content(messages: List[Dict[str, Any]]) -> str:
+    """สร้าง JSON narrator จากข้อความ user ล่าสุด (รูปแบบเดียวกับที่ ai._build_user_prompt ขอ)"""
+    prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    tier = _prompt_field(prompt, r"ผลลัพธ์:\s*(\w+)", "neutral")
+    scene = _prompt_field(prompt, r"\*\*สถานที่ปัจจุบัน:\*\*\s*(.+)", "ถนนทางเข้าหมู่บ้าน")
+    mission = _prompt_field(prompt, r"\*\*ภารกิจ:\*\*\s*(.+)", "-")
+    progress = _prompt_field(prompt, r"\*\*ความคืบหน้า:\*\*\s*(\d+)", "1")
+    fx = _TIER_EFFECTS.get(tier, _TIER_EFFECTS["neutral"])
+    narration = (
+        f"**[สถานที่]:** {scene}\n"
+        f"**[สถานการณ์]:** {fx['situation']}\n"
+        f"**ความคืบหน้าภารกิจ:** [{progress}/10]\n"
+        f"**[ภารกิจปัจจุบัน]:** {mission}\n"
+        "**[ทางเลือก]:**\n* A. เดินหน้าต่อ\n* B. ซ่อนตัวรอดูสถานการณ์\n* C. ถอยกลับไปตั้งหลัก"
+    )
+    return json.dumps({
+        "narration": narration,
+        "hp_delta": fx["hp_delta"], "mp_delta": 0,
+        "grant_heal": 0, "grant_boost": fx["grant_boost"],
+        "status": [], "extra": {"mock": True},
+    }, ensure_ascii=False)
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def enter(self, stream: bool) -> None:
+        with self.lock:
+            self.requests += 1
+            self.streamed += int(stream)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+    def as_dict(self) -> Dict[str, int]:
+        with self.lock:
+            return {k: v for k, v in vars(self).items() if k != "lock"}
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server_version = "mock-llm/1.0"
+    protocol_version = "HTTP/1.1"   # keep-alive เหมือน API จริง (client ใช้ connection pool)
+
+    def log_message(self, fmt, *args):   # ปิด access log ไม่ให้ท่วมจอตอน load test
+        if self.server.opts.verbose:
+            super().log_message(fmt, *args)
+
+    # ---------- helpers ----------
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _send_error(self, status: int, message: str, etype: str) -> None:
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._send_json(status, {"error": {"message": message, "type": etype}}, headers)
+
+    def _sleep_first_token(self) -> None:
+        opts = self.server.opts
+        delay = opts.latency + random.uniform(-opts.jitter, opts.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _token_delay(self) -> float:
+        tps = self.server.opts.tokens_per_sec
+        return 1.0 / tps if tps > 0 else 0.0
+
+    # ---------- routes ----------
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send_json(200, self.server.stats.as_dict())
+        self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.path.rstrip("/") != CHAT_PATH:
+            return self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+        try:
+            req = json.loads(raw or b"{}")
+        except ValueError:
+            return self._send_error(400, "invalid JSON body", "invalid_request_error")
+
+        stream = bool(req.get("stream"))
+        stats, opts = self.server.stats, self.server.opts
+        stats.enter(stream)
+        try:
+            roll = random.random()
+            if roll < opts.rate_limit_rate:
+                with stats.lock:
+                    stats.rate_limited += 1
+                return self._send_error(429, "mock rate limit", "rate_limit_exceeded")
+            if roll < opts.rate_limit_rate + opts.error_rate:
+                with stats.lock:
+                    stats.errors += 1
+                return self._send_error(500, "mock internal error", "server_error")
+
+            content = narrator_content(req.get("messages") or [])
+            model = req.get("model") or "mock"
+            self._sleep_first_token()
+            if stream:
+                self._stream(content, model)
+            else:
+                time.sleep(self._token_delay() * _tokens(content))
+                self._send_json(200, _completion(content, model))
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # client ตัดสายเอง (เช่นเกิน turn budget)
+        finally:
+            stats.leave()
+
+    def _stream(self, content: str, model: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        cid = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        delay = self._token_delay()
+
+        def event(delta: Dict[str, Any], finish=None) -> None:
+            chunk = {
+                "id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+
+        event({"role": "assistant", "content": ""})
+        for i in range(0, len(content), CHARS_PER_TOKEN):
+            event({"content": content[i:i + CHARS_PER_TOKEN]})
+            if delay:
+                time.sleep(delay)
+        event({}, finish="stop")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+def _tokens(content: str) -> int:
+    return max(1, len(content) // CHARS_PER_TOKEN)
+
+def _completion(content: str, model: str) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": _tokens(content), "total_tokens": _tokens(content)},
+    }
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, opts):
+        super().__init__(addr, MockLLMHandler)
+        self.opts = opts
+        self.stats = _Stats()
+
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Groq/OpenAI-compatible mock narrator for load tests")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--latency", type=float, default=0.5, help="วินาทีก่อน token แรก")
+    p.add_argument("--jitter", type=float, default=0.1, help="สุ่ม ± วินาทีรอบ --latency")
+    p.add_argument("--tokens-per-sec", type=float, default=300.0, help="0 = ปล่อยข้อความทันที")
+    p.add_argument("--error-rate", type=float, default=0.0, help="สัดส่วน request ที่ตอบ 500")
+    p.add_argument("--rate-limit-rate", type=float, default=0.0, help="สัดส่วน request ที่ตอบ 429")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("-v", "--verbose", action="store_true")
+    return p
+
+def main(argv=None) -> None:
+    opts = _parser().parse_args(argv)
+    if opts.seed is not None:
+        random.seed(opts.seed)
+    server = MockLLMServer((opts.host, opts.port), opts)
+    print(f"🧪 mock LLM on http://{opts.host}:{opts.port}{CHAT_PATH} "
+          f"(latency={opts.latency}s±{opts.jitter}, {opts.tokens_per_sec} tok/s, "
+          f"errors={opts.error_rate}, 429={opts.rate_limit_rate})")
+    print(f"   export LLM_BASE_URL=http://{opts.host}:{opts.port} api_key=mock")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {server.stats.as_dict()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# bench/rules_bench.py
+# micro-benchmark ของ roll/rules.py (inner loop ของทุกเทิร์นและทุก simulation)
+#
+#   python bench/rules_bench.py                                  # วัดแล้วพิมพ์ผล
+#   python bench/rules_bench.py --save bench/baselines/rules.json  # บันทึก baseline
+#   python bench/rules_bench.py --compare bench/baselines/rules.json --tolerance 0.15
+#       → exit 1 ถ้ามีตัวไหนช้ากว่า baseline เกิน 15%
+#
+# - ใช้ random.Random(seed) ตายตัว input ทุกรอบเหมือนกัน
+# - แต่ละตัววัดด้วย timeit.repeat แล้วเอาค่าที่ดีที่สุด (ลด noise จาก scheduler) หน่วยเป็น ns/op
+# - rules.py / engine.py ไม่พึ่ง Django จึงไม่ต้อง django.setup()
+from __future__ import annotations
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # .../journey
+
+from roll import engine, rules
+from roll.rules import (
+    Progress, RollResult,
+    advance, apply_mp_bonus, classify_turn, make_roll, sanitize_mp_spend, tier_distribution,
+    tier_from_total,
+)
+
+SEED = 20250101
+TOTALS = list(range(-2, 40))                          # ครอบทุก tier + ค่าหลุดขอบ
+TURNS = list(range(1, rules.TURNS_PER_STAGE + 1))
+FULL_RUN = rules.STAGES_TOTAL * rules.TURNS_PER_STAGE
+
+# ---------- benchmarks ----------
+# แต่ละตัวคืน (ฟังก์ชันที่ไม่รับอาร์กิวเมนต์, จำนวน op ต่อการเรียก 1 ครั้ง)
+
+def bench_make_roll() -> Tuple[Callable[[], None], int]:
+    rng = random.Random(SEED)
+    def run():
+        for t in TURNS:
+            make_roll(turn=t, rng=rng)
+    return run, len(TURNS)
+
+def bench_make_roll_buffed() -> Tuple[Callable[[], None], int]:
+    rng = random.Random(SEED)
+    def run():
+        for t in TURNS:
+            make_roll(turn=t, mp_spent=2, boost=True, available_mp=5, rng=rng)
+    return run, len(TURNS)
+
+def bench_tier_from_total() -> Tuple[Callable[[], None], int]:
+    def run():
+        for total in TOTALS:
+            tier_from_total(total)
+    return run, len(TOTALS)
+
+def bench_tier_distribution() -> Tuple[Callable[[], None], int]:
+    combos = [(mp, boost) for mp in range(0, 6) for boost in (False, True)]
+    def run():
+        for mp, boost in combos:
+            tier_distribution(mp, boost)
+    return run, len(combos)
+
+def bench_apply_mp_bonus() -> Tuple[Callable[[], None], int]:
+    dice = list(range(rules.DICE_MIN, rules.DICE_MAX + 1))
+    def run():
+        for d in dice:
+            apply_mp_bonus(d, 2, boost=True)
+    return run, len(dice)
+
+def bench_sanitize_mp_spend() -> Tuple[Callable[[], None], int]:
+    def run():
+        for t in TURNS:
+            sanitize_mp_spend(t, 3, 2)
+    return run, len(TURNS)
+
+def bench_classify_turn() -> Tuple[Callable[[], None], int]:
+    def run():
+        for t in TURNS:
+            classify_turn(t)
+    return run, len(TURNS)
+
+def bench_advance() -> Tuple[Callable[[], None], int]:
+    starts = [Progress(s, t) for s in range(1, rules.STAGES_TOTAL + 1) for t in TURNS]
+    def run():
+        for p in starts:
+            advance(p)
+    return run, len(starts)
+
+def bench_rollresult_alloc() -> Tuple[Callable[[], None], int]:
+    def run():
+        for d in range(rules.DICE_MIN, rules.DICE_MAX + 1):
+            RollResult(dice_roll=d, mp_spent=0, boost_applied=False, mp_bonus=0,
+                       boost_bonus=0, total_roll=d, tier="neutral")
+    return run, rules.DICE_MAX - rules.DICE_MIN + 1
+
+def bench_full_run_sweep() -> Tuple[Callable[[], None], int]:
+    """เดินครบ 10×10 เทิร์น: classify → make_roll → advance (ไม่มี AI/DB)"""
+    rng = random.Random(SEED)
+    def run():
+        p = Progress(1, 1)
+        while True:
+            kind = classify_turn(p.turn)
+            make_roll(turn=p.turn, mp_spent=1 if kind == "FORCED_MP" else 0, available_mp=3, rng=rng)
+            res = advance(p)
+            if res.cleared_game:
+                break
+            p = res.progress
+    return run, FULL_RUN
+
+def bench_engine_full_run() -> Tuple[Callable[[], None], int]:
+    """เล่นครบ 1 รอบผ่าน roll.engine.play_turn (state + event จริง, ผลตาม baseline) — ops = จำนวนเทิร์น"""
+    rng = random.Random(SEED)
+    turns = [0]
+    def run():
+        player, session = engine.PlayerState(), engine.SessionState()
+        while session.status == "ACTIVE":
+            kind = classify_turn(session.turn)
+            engine.play_turn(player, session, action_text="สำรวจ", use_mp=1 if kind == "FORCED_MP" else 0,
+                             use_heal=player.hp < 15, rng=rng)
+            turns[0] += 1
+    run()
+    per_run, turns[0] = turns[0], 0
+    return run, per_run
+
+BENCHMARKS: Dict[str, Callable[[], Tuple[Callable[[], None], int]]] = {
+    "make_roll": bench_make_roll,
+    "make_roll_buffed": bench_make_roll_buffed,
+    "tier_from_total": bench_tier_from_total,
+    "tier_distribution": bench_tier_distribution,
+    "apply_mp_bonus": bench_apply_mp_bonus,
+    "sanitize_mp_spend": bench_sanitize_mp_spend,
+    "classify_turn": bench_classify_turn,
+    "advance": bench_advance,
+    "rollresult_alloc": bench_rollresult_alloc,
+    "full_run_sweep": bench_full_run_sweep,
+    "engine_full_run": bench_engine_full_run,
+}
+
+# ---------- runner ----------
+
+def measure(name: str, *, repeat: int, min_time: float) -> float:
+    """ns ต่อ op (ค่าที่ดีที่สุดจาก repeat รอบ)"""
+    fn, ops = BENCHMARKS[name]()
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()   # จำนวนครั้งที่ใช้เวลา ≥ 0.2s
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / (number * ops) * 1e9
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(terse=True),
+    }
+
+def compare(results: Dict[str, float], baseline: Dict, tolerance: float) -> List[str]:
+    """คืนรายชื่อ benchmark ที่ช้ากว่า baseline เกิน tolerance"""
+    regressions = []
+    base = baseline.get("results", {})
+    if baseline.get("environment") != environment():
+        print(f"⚠️ baseline was recorded on {baseline.get('environment')} — numbers may not be comparable")
+    print(f"\n{'benchmark':<20} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, ns in results.items():
+        if name not in base:
+            print(f"{name:<20} {'-':>10} {ns:>8.1f}ns {'new':>8}")
+            continue
+        change = ns / base[name] - 1
+        flag = ""
+        if change > tolerance:
+            flag = "  ❌"
+            regressions.append(name)
+        print(f"{name:<20} {base[name]:>8.1f}ns {ns:>8.1f}ns {change:>+7.1%}{flag}")
+    return regressions
+
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Micro-benchmarks for roll.rules")
+    p.add_argument("names", nargs="*", help=f"เลือกบางตัว: {', '.join(BENCHMARKS)}")
+    p.add_argument("--repeat", type=int, default=7)
+    p.add_argument("--min-time", type=float, default=0.2, help="เวลาขั้นต่ำต่อ 1 repeat (วินาที)")
+    p.add_argument("--save", default=None, help="บันทึกผลเป็น baseline JSON")
+    p.add_argument("--compare", default=None, help="เทียบกับ baseline JSON")
+    p.add_argument("--tolerance", type=float, default=0.15, help="ช้าลงได้ไม่เกินกี่เท่า (0.15 = 15%%)")
+    return p
+
+def main(argv=None) -> int:
+    opts = _parser().parse_args(argv)
+    names = opts.names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"unknown benchmark(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    results: Dict[str, float] = {}
+    for name in names:
+        results[name] = round(measure(name, repeat=opts.repeat, min_time=opts.min_time), 2)
+        print(f"⏱️  {name:<20} {results[name]:>10.1f} ns/op")
+
+    if opts.save:
+        path = Path(opts.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"environment": environment(), "results": results}, indent=2) + "\n")
+        print(f"💾 saved baseline → {path}")
+
+    if opts.compare:
+        baseline = json.loads(Path(opts.compare).read_text())
+        regressions = compare(results, baseline, opts.tolerance)
+        if regressions:
+            print(f"\n❌ regression > {opts.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print("\n✅ no regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
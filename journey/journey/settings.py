@@ -27,6 +27,27 @@ CLICKHOUSE = {
     "DATABASE": os.getenv("CH_DATABASE", "default"),
 }
 
+# แหล่งตัวเลขของ native_dashboard (roll/analytics.py)
+# "postgres" = ตาราง rollup (manage.py refresh_rollups) | "clickhouse" = aggregate จาก event_log ใน CLICKHOUSE ข้างบน
+ANALYTICS_BACKEND = os.getenv("ROLL_ANALYTICS_BACKEND", "postgres")
+
+# Groq / LLM narrator (roll/llm_client.py): connection pool ที่ใช้ซ้ำทั้งโปรเซส
+LLM = {
+    "API_KEY": os.getenv("api_key"),
+    # ชี้ไปที่ server อื่นที่พูด protocol เดียวกัน เช่น bench/mock_llm_server.py (ว่าง = Groq จริง)
+    "BASE_URL": os.getenv("LLM_BASE_URL") or None,
+    "MAX_CONNECTIONS": int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+    "MAX_KEEPALIVE": int(os.getenv("LLM_MAX_KEEPALIVE", "20")),
+    "KEEPALIVE_EXPIRY": float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+    "MAX_RETRIES": int(os.getenv("LLM_MAX_RETRIES", "0")),
+    # latency budget ต่อเทิร์น + circuit breaker (roll/ai.py)
+    "TURN_BUDGET_S": float(os.getenv("LLM_TURN_BUDGET_S", "8")),
+    "BREAKER_FAILURES": int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    "BREAKER_RESET_S": float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+    # admission control: narrator call พร้อมกันต่อโปรเซส / เวลารอคิวสูงสุดก่อนตัดไป baseline
+    "MAX_CONCURRENT": int(os.getenv("LLM_MAX_CONCURRENT", "32")),
+    "QUEUE_MAX_WAIT_S": float(os.getenv("LLM_QUEUE_MAX_WAIT_S", "2")),
+}
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -141,5 +162,36 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# ใช้ endpoint เกมแบบ async (roll/views_async.py) — เปิดเมื่อรันบน ASGI เช่น uvicorn journey.asgi:application
+ROLL_ASYNC_VIEWS = os.getenv("ROLL_ASYNC_VIEWS", "0") == "1"
+
+# cache narration ของ intro ต่อ (session, stage, turn): อายุ (วินาที) และจำนวน entry สูงสุด (LRU)
+ROLL_INTRO_CACHE = {
+    "TTL": int(os.getenv("ROLL_INTRO_CACHE_TTL", "600")),
+    "MAXSIZE": int(os.getenv("ROLL_INTRO_CACHE_MAXSIZE", "2048")),
+}
+
+# user id / X-ANON-ID → Player.id (roll.identity) — mapping ไม่เปลี่ยน TTL ยาวได้
+ROLL_IDENTITY_CACHE = {
+    "TTL": int(os.getenv("ROLL_IDENTITY_CACHE_TTL", "3600")),
+    "MAXSIZE": int(os.getenv("ROLL_IDENTITY_CACHE_MAXSIZE", "50000")),
+}
+
+# snapshot ของ session ที่ ACTIVE + ผู้เล่น (roll.caches.session_cache) — get_state ไม่ต้องแตะ DB
+# BACKEND: "local" = LRU ในโปรเซส | "django" = ใช้ CACHES[ALIAS] (เช่น Redis) แชร์ระหว่าง worker
+# "local" ถูกต้องเฉพาะตอนมี worker process เดียว: write-through อัปเดตแค่ process ที่ commit
+# → หลาย worker (gunicorn -w 4) อีก process จะคืน state/304 เก่าได้นานถึง TTL ต้องใช้ "django" + cache กลาง
+ROLL_SESSION_CACHE = {
+    "BACKEND": os.getenv("ROLL_SESSION_CACHE_BACKEND", "local"),
+    "ALIAS": os.getenv("ROLL_SESSION_CACHE_ALIAS", "default"),
+    "TTL": int(os.getenv("ROLL_SESSION_CACHE_TTL", "300")),
+    "MAXSIZE": int(os.getenv("ROLL_SESSION_CACHE_MAXSIZE", "10000")),
+}
+
+# ใส่ header X-DB-Queries ทุก response (roll.middleware.QueryCountMiddleware) ไว้ให้ bench/loadgen.py อ่าน
+ROLL_QUERY_COUNT_HEADER = os.getenv("ROLL_QUERY_COUNT_HEADER", "0") == "1"
+if ROLL_QUERY_COUNT_HEADER:
+    MIDDLEWARE.insert(0, "roll.middleware.QueryCountMiddleware")
+
 LOGIN_REDIRECT_URL = '/game/'  # redirect ไปหน้าเกมหลัง login สำเร็จ
 LOGIN_URL = '/login/'  # URL สำหรับ @login_required
\ No newline at end of file
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import Player, Session, EventLog, Checkpoint, Stage
+from .models import Player, Session, EventLog, Checkpoint, Stage, JobCursor
 
 @admin.register(Player)
 class PlayerAdmin(admin.ModelAdmin):
@@ -25,4 +25,7 @@ class CheckpointAdmin(admin.ModelAdmin):
 
 @admin.register(Stage)
 class StageAdmin(admin.ModelAdmin):
-    pass
\ No newline at end of file
+    pass
+@admin.register(JobCursor)
+class JobCursorAdmin(admin.ModelAdmin):
+    list_display = ['name', 'position', 'updated_at']
@@ -0,0 +1,173 @@
+# roll/admission.py
+# ประตูจำกัดจำนวนการเรียก narrator พร้อมกัน (admission control)
+# - เกิน max_concurrent → เข้าคิวตาม priority (act มาก่อน intro) แล้วตามลำดับที่มาถึง
+# - รอเกิน max_wait_s → ไม่ได้ slot ผู้เรียกใช้ baseline ทันทีแทนที่จะรอต่อ
+# - ใช้ได้ทั้ง thread (WSGI) และ coroutine (ASGI) ในโปรเซสเดียวกัน: slot ที่คืนจะส่งต่อให้คิวถัดไปโดยตรง
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional
+
+PRIORITY_ACT = 0
+PRIORITY_INTRO = 1
+
+class _Waiter:
+    __slots__ = ("granted", "cancelled", "event", "future", "loop")
+
+    def __init__(self):
+        self.granted = False
+        self.cancelled = False
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(True)
+
+class AdmissionGate:
+    """
+    semaphore ที่มี priority + เวลารอสูงสุด
+    acquire()/aacquire() คืน True ถ้าได้ slot (ต้อง release() ทีหลัง), False ถ้ารอเกิน max_wait_s
+    ปกติใช้ผ่าน slot()/aslot() ซึ่งคืน slot ให้เอง
+    """
+
+    def __init__(self, *, max_concurrent: int = 32, max_wait_s: float = 2.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_wait_s = float(max_wait_s)
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = []   # (priority, seq, waiter)
+        self._seq = itertools.count()
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    # ---------- core ----------
+
+    def _try_enter(self, priority: int) -> Optional[_Waiter]:
+        """
+        ได้ slot ทันทีคืน None, ไม่งั้นลงคิวแล้วคืน waiter (เรียกภายใต้ _lock)
+        ผู้เรียกต้องตั้ง event/future ของ waiter ก่อนปล่อย lock ไม่งั้น release() จะปลุกไม่ได้
+        """
+        if self.in_flight < self.max_concurrent and not self._heap:
+            self.in_flight += 1
+            self.admitted += 1
+            return None
+        w = _Waiter()
+        heapq.heappush(self._heap, (priority, next(self._seq), w))
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        return w
+
+    def _give_up(self, w: _Waiter) -> bool:
+        """หมดเวลารอ — ถ้าระหว่างนั้นถูกส่ง slot มาให้แล้วก็ถือว่าได้ (คืน True)"""
+        with self._lock:
+            if w.granted:
+                return True
+            w.cancelled = True   # ยังค้างใน heap ให้ release() ข้ามไปเอง
+            self.queued -= 1
+            self.rejected += 1
+            return False
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self.wait_total_s += waited
+            self.wait_max_s = max(self.wait_max_s, waited)
+
+    def release(self) -> None:
+        with self._lock:
+            while self._heap:
+                _, _, w = heapq.heappop(self._heap)
+                if w.cancelled:
+                    continue
+                # ส่ง slot ต่อตรงๆ (in_flight คงเดิม) กันไม่ให้คนมาใหม่แซงคิว
+                w.granted = True
+                self.queued -= 1
+                self.admitted += 1
+                w.wake()
+                return
+            self.in_flight -= 1
+
+    def acquire(self, priority: int = PRIORITY_ACT, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            w = self._try_enter(priority)
+            if w is not None:
+                w.event = threading.Event()
+        if w is None:
+            return True
+        started = time.monotonic()
+        ok = w.event.wait(self.max_wait_s if timeout is None else timeout) or self._give_up(w)
+        self._record_wait(time.monotonic() - started)
+        return ok
+
+    async def aacquire(self, priority: int = PRIORITY_ACT, timeout: Optional[float] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            w = self._try_enter(priority)
+            if w is not None:
+                w.loop, w.future = loop, loop.create_future()
+        if w is None:
+            return True
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(w.future), self.max_wait_s if timeout is None else timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            ok = self._give_up(w)
+        except asyncio.CancelledError:
+            # request ถูกยกเลิกระหว่างรอ — ถ้าได้ slot มาแล้วต้องคืน ไม่งั้นคืนคิวเฉยๆ
+            if self._give_up(w):
+                self.release()
+            raise
+        self._record_wait(time.monotonic() - started)
+        return ok
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_ACT):
+        """with gate.slot(p) as admitted: ... (admitted=False → ใช้ baseline)"""
+        admitted = self.acquire(priority)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_ACT):
+        admitted = await self.aacquire(priority)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    # ---------- metrics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waited = self.admitted + self.rejected
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_wait_s": self.max_wait_s,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queued,
+                "peak_queue_depth": self.peak_queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_avg_ms": round(self.wait_total_s * 1000 / waited, 2) if waited else 0.0,
+                "wait_max_ms": round(self.wait_max_s * 1000, 2),
+            }
@@ -1,13 +1,17 @@
 from __future__ import annotations
-import os, json, re
+import asyncio, json, re, threading, time
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional
-from roll.rules import clamp
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Tuple
+from roll.rules import clamp, BASELINE_TIER_EFFECTS
+from roll import llm_client, metrics
+from roll.admission import AdmissionGate, PRIORITY_ACT, PRIORITY_INTRO
+from roll.breaker import CircuitBreaker
 from dotenv import load_dotenv
 try:
-    from groq import Groq
+    from groq import Groq, AsyncGroq
 except Exception:
     Groq = None
+    AsyncGroq = None
 
 load_dotenv()     
 
@@ -73,23 +77,85 @@ class AIResult:
     grant_boost: int = 0
     status: List[str] = None
     extra: Dict[str, Any] = None
+    # ที่มาของผล: "llm" | "baseline" (LLM ล้ม / timeout / breaker เปิด / คิวเต็ม) — ไม่ลง EventLog
+    source: str = "baseline"
 
     def to_attrs(self) -> Dict[str, Any]:
         d = asdict(self)
+        d.pop("source")
         if d.get("status") is None: d["status"] = []
         if d.get("extra")  is None: d["extra"]  = {}
         return d
 
 # ===================== Groq helpers =====================
 
+# เวลารอ narrator สูงสุดต่อเทิร์น (วินาที) — เกินนี้ตัดไปใช้ baseline
+NARRATOR_TURN_BUDGET_S = float(llm_client.setting("TURN_BUDGET_S", 8.0))
+
+# Groq ล่มเมื่อไหร่ ไม่ต้องให้ทุกเทิร์นรอจน timeout: breaker เปิด → ใช้ baseline ทันที
+narrator_breaker = CircuitBreaker(
+    failure_threshold=int(llm_client.setting("BREAKER_FAILURES", 5)),
+    reset_timeout=float(llm_client.setting("BREAKER_RESET_S", 30.0)),
+)
+
+# จำกัดจำนวน narrator call พร้อมกันต่อโปรเซส — ช่วง spike ไม่ยิงจน provider ตอบ 429
+# รอคิวเกิน QUEUE_MAX_WAIT_S → ใช้ baseline ทันที (intro ได้ priority ต่ำกว่า act)
+narrator_gate = AdmissionGate(
+    max_concurrent=int(llm_client.setting("MAX_CONCURRENT", 32)),
+    max_wait_s=float(llm_client.setting("QUEUE_MAX_WAIT_S", 2.0)),
+)
+metrics.register("narrator_queue", narrator_gate.stats)
+
+class NarratorBudgetExceeded(TimeoutError):
+    """stream ของ narrator เกิน NARRATOR_TURN_BUDGET_S"""
+
+_narrator_counts = {"llm": 0, "baseline": 0}
+_counts_lock = threading.Lock()
+
+def _count_narration(source: str) -> None:
+    with _counts_lock:
+        _narrator_counts[source] += 1
+
+def narrator_stats() -> Dict[str, Any]:
+    with _counts_lock:
+        llm, baseline = _narrator_counts["llm"], _narrator_counts["baseline"]
+    total = llm + baseline
+    return {
+        "turn_budget_s": NARRATOR_TURN_BUDGET_S,
+        "llm": llm,
+        "baseline": baseline,
+        "fallback_rate": round(baseline / total, 4) if total else 0.0,
+        "breaker": narrator_breaker.stats(),
+    }
+
+metrics.register("narrator", narrator_stats)
+
+def _narrator_allowed() -> bool:
+    if narrator_breaker.allow():
+        return True
+    print("⚡ Narrator circuit open - using baseline")
+    return False
+
+def _record_llm_failure(e: BaseException) -> None:
+    narrator_breaker.record_failure(timeout=llm_client.is_timeout(e))
+
+def _record_parsed(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    นับผลกับ breaker หลัง parse แล้วเท่านั้น: ตอบ 200 แต่ content ว่าง/ไม่ใช่ JSON narrator = ล้มเหลว
+    (ไม่งั้นทุกเทิร์นตกไป baseline ขณะที่ breaker นับว่าสำเร็จและไม่เปิดเลย)
+    """
+    if isinstance(data, dict) and "narration" in data:
+        narrator_breaker.record_success()
+        return data
+    narrator_breaker.record_failure()
+    return None
+
 def _default_groq_client() -> Optional["Groq"]:
-    api_key = os.getenv("api_key")
-    if Groq is None or not api_key:
-        return None
-    try:
-        return Groq(api_key=api_key)
-    except Exception:
-        return None
+    # client ตัวเดียวต่อโปรเซส ใช้ connection pool ซ้ำ (ดู roll/llm_client.py)
+    return llm_client.get_client()
+
+def _default_async_groq_client() -> Optional["AsyncGroq"]:
+    return llm_client.get_async_client()
 
 def _build_user_prompt(payload: Dict[str, Any]) -> str:
     """สร้าง prompt แบบละเอียดสำหรับ GM"""
@@ -184,59 +250,293 @@ def _extract_json(text: str) -> Optional[Dict[str, Any]]:
     except Exception:
         return None
 
+def _budget_timeout(deadline: float):
+    """
+    timeout ของ httpx จากเวลาที่เหลือก่อน deadline ของเทิร์น (time.monotonic())
+    httpx จับเวลาแยกทีละช่วง (pool / connect / write / read) → ส่ง budget เต็มให้ทุกช่วงจะรอได้เกือบ 2 เท่า
+    จึงแบ่งให้ผลรวมไม่เกินเวลาที่เหลือ (read = ต่อครั้งที่อ่าน ฝั่ง stream เช็ค deadline ซ้ำทุก chunk)
+    """
+    remaining = max(0.001, deadline - time.monotonic())
+    if llm_client.httpx is None:
+        return remaining
+    setup = remaining * 0.1
+    return llm_client.httpx.Timeout(remaining - 3 * setup, connect=setup, write=setup, pool=setup)
+
+def _narrator_request(payload: Dict[str, Any], *, model: Optional[str],
+                      temperature: float, timeout) -> Dict[str, Any]:
+    """kwargs ของ chat.completions.create (ใช้ร่วมกันทั้ง sync/async)"""
+    # ลองใช้โมเดลอื่นถ้าไม่ระบุ
+    model_name = model or "openai/gpt-oss-20b"  # เปลี่ยนจาก openai/gpt-oss-20b
+
+    messages = [
+        {"role": "system", "content": GM_SYSTEM_PROMPT},
+        {"role": "user", "content": _build_user_prompt(payload)}
+    ]
+    return {
+        "model": model_name,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": 1000,
+        "timeout": timeout,
+    }
+
+def _parse_narrator_response(resp) -> Optional[Dict[str, Any]]:
+    if not resp or not resp.choices:
+        print("❌ No response from API")
+        return None
+
+    content = resp.choices[0].message.content or ""
+    print(f"📝 AI Response length: {len(content)} chars")
+    print(f"📄 First 200 chars: {content[:200]}")
+
+    result = _extract_json(content)
+    if result:
+        print("✅ JSON extracted successfully")
+    else:
+        print("❌ Failed to extract JSON from response")
+        print(f"Full response: {content}")
+
+    return result
+
+def _report_llm_error(e: Exception, client=None) -> None:
+    _record_llm_failure(e)
+    llm_client.report_error(client, e)   # connection เสีย → สร้าง client ใหม่รอบหน้า
+    _log_llm_error(e)
+
+def _log_llm_error(e: Exception) -> None:
+    print(f"❌ AI Error: {type(e).__name__}: {e}")
+    import traceback
+    traceback.print_exc()
+
 def call_llm_narrator(payload: Dict[str, Any],
                       *,
                       groq_client: Optional["Groq"]=None,
                       model: Optional[str]=None,
                       temperature: float=0.7,
-                      timeout_s: int=30) -> Optional[Dict[str, Any]]:
-    """เรียก AI เพื่อสร้าง narration"""
+                      timeout_s: Optional[float]=None) -> Optional[Dict[str, Any]]:
+    """เรียก AI เพื่อสร้าง narration (timeout_s ไม่ระบุ = NARRATOR_TURN_BUDGET_S)"""
     client = groq_client or _default_groq_client()
     if client is None:
         print("❌ Groq client is None - check API key in .env file")
         return None
+    if not _narrator_allowed():
+        return None
 
-    # ลองใช้โมเดลอื่นถ้าไม่ระบุ
-    model_name = model or "openai/gpt-oss-20b"  # เปลี่ยนจาก openai/gpt-oss-20b
-    
-    messages = [
-        {"role": "system", "content": GM_SYSTEM_PROMPT},
-        {"role": "user", "content": _build_user_prompt(payload)}
-    ]
+    deadline = time.monotonic() + (timeout_s or NARRATOR_TURN_BUDGET_S)
+    req = _narrator_request(payload, model=model, temperature=temperature, timeout=_budget_timeout(deadline))
+    try:
+        print(f"📡 Calling Groq API with model: {req['model']}")
+        with llm_client.tracking():
+            resp = client.chat.completions.create(**req)
+    except Exception as e:
+        _report_llm_error(e, client)
+        return None
+    return _record_parsed(_parse_narrator_response(resp))
+
+async def acall_llm_narrator(payload: Dict[str, Any],
+                             *,
+                             groq_client: Optional["AsyncGroq"]=None,
+                             model: Optional[str]=None,
+                             temperature: float=0.7,
+                             timeout_s: Optional[float]=None) -> Optional[Dict[str, Any]]:
+    """เวอร์ชัน async ของ call_llm_narrator (ไม่บล็อก thread ระหว่างรอ LLM) — budget เป็น deadline จริงผ่าน asyncio.timeout"""
+    client = groq_client or _default_async_groq_client()
+    if client is None:
+        print("❌ AsyncGroq client is None - check API key in .env file")
+        return None
+    if not _narrator_allowed():
+        return None
 
+    budget = timeout_s or NARRATOR_TURN_BUDGET_S
+    req = _narrator_request(payload, model=model, temperature=temperature,
+                            timeout=_budget_timeout(time.monotonic() + budget))
     try:
-        print(f"📡 Calling Groq API with model: {model_name}")
-        
-        resp = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=1000,
-            timeout=timeout_s,
-        )
-        
-        if not resp or not resp.choices:
-            print("❌ No response from API")
-            return None
-            
-        content = resp.choices[0].message.content
-        print(f"📝 AI Response length: {len(content)} chars")
-        print(f"📄 First 200 chars: {content[:200]}")
-        
-        result = _extract_json(content)
-        if result:
-            print("✅ JSON extracted successfully")
-        else:
-            print("❌ Failed to extract JSON from response")
-            print(f"Full response: {content}")
-        
-        return result
-        
+        print(f"📡 Calling Groq API (async) with model: {req['model']}")
+        with llm_client.tracking():
+            async with asyncio.timeout(budget):
+                resp = await client.chat.completions.create(**req)
     except Exception as e:
-        print(f"❌ AI Error: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        _report_llm_error(e, client)
         return None
+    return _record_parsed(_parse_narrator_response(resp))
+
+# ===================== Streaming =====================
+
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class _NarrationStream:
+    """
+    ถอดค่า "narration" ออกจาก JSON ที่ LLM ทยอยส่งมาทีละ chunk
+    - feed(chunk) คืนข้อความ narration ส่วนที่เพิ่งถอดได้ (อาจเป็น "" ถ้ายังไม่ถึง/escape ยังไม่ครบ)
+    - content เก็บข้อความดิบทั้งหมดไว้ parse JSON เต็มตอนจบ
+    """
+
+    _KEY = re.compile(r'"narration"\s*:\s*"')
+
+    def __init__(self):
+        self.content = ""
+        self.streamed = False   # ส่ง narration จาก LLM ออกไปแล้วอย่างน้อย 1 ส่วน
+        self._pos: Optional[int] = None
+        self._done = False
+
+    def feed(self, chunk: str) -> str:
+        self.content += chunk or ""
+        if self._done:
+            return ""
+        if self._pos is None:
+            m = self._KEY.search(self.content)
+            if not m:
+                return ""
+            self._pos = m.end()
+
+        s, i, n = self.content, self._pos, len(self.content)
+        out: List[str] = []
+        while i < n:
+            c = s[i]
+            if c == '"':
+                self._done = True
+                i += 1
+                break
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            # escape: รอให้ครบก่อนค่อยถอด
+            if i + 1 >= n:
+                break
+            e = s[i + 1]
+            if e != "u":
+                out.append(_JSON_ESCAPES.get(e, e))
+                i += 2
+                continue
+            if i + 6 > n:
+                break
+            try:
+                code = int(s[i + 2:i + 6], 16)
+            except ValueError:
+                out.append(s[i:i + 6])
+                i += 6
+                continue
+            if 0xD800 <= code < 0xDC00:   # surrogate pair (\uD83D\uDC7B)
+                if i + 12 > n:
+                    break
+                try:
+                    low = int(s[i + 8:i + 12], 16) if s[i + 6:i + 8] == "\\u" else -1
+                except ValueError:
+                    low = -1
+                if 0xDC00 <= low < 0xE000:
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                out.append("\ufffd")
+                i += 6
+                continue
+            out.append(chr(code))
+            i += 6
+
+        self._pos = i
+        text = "".join(out)
+        if text:
+            self.streamed = True
+        return text
+
+def _stream_delta(chunk) -> str:
+    try:
+        return chunk.choices[0].delta.content or ""
+    except (AttributeError, IndexError):
+        return ""
+
+def stream_llm_narrator(payload: Dict[str, Any],
+                        *,
+                        groq_client: Optional["Groq"]=None,
+                        model: Optional[str]=None,
+                        temperature: float=0.7,
+                        timeout_s: Optional[float]=None) -> Iterator[str]:
+    """
+    เหมือน call_llm_narrator แต่ stream=True → yield ข้อความดิบทีละ chunk (ผู้เรียกจัดการ error เอง)
+    ทั้ง stream ต้องจบภายใน timeout_s (ไม่ระบุ = NARRATOR_TURN_BUDGET_S) ไม่งั้น raise NarratorBudgetExceeded
+    (sync ขัดจังหวะ read ที่ค้างไม่ได้: httpx timeout แบ่งจาก budget + เช็ค deadline ทุก chunk)
+    """
+    client = groq_client or _default_groq_client()
+    if client is None:
+        print("❌ Groq client is None - check API key in .env file")
+        return
+    if not _narrator_allowed():
+        return
+
+    budget = timeout_s or NARRATOR_TURN_BUDGET_S
+    deadline = time.monotonic() + budget
+    req = _narrator_request(payload, model=model, temperature=temperature, timeout=_budget_timeout(deadline))
+    print(f"📡 Streaming Groq API with model: {req['model']}")
+    parts: List[str] = []
+    try:
+        with llm_client.tracking():
+            stream = client.chat.completions.create(stream=True, **req)
+            try:
+                for chunk in stream:
+                    if time.monotonic() > deadline:
+                        raise NarratorBudgetExceeded(f"narrator stream exceeded {budget}s")
+                    delta = _stream_delta(chunk)
+                    parts.append(delta)
+                    yield delta
+            finally:
+                getattr(stream, "close", lambda: None)()
+        _record_parsed(_extract_json("".join(parts)))
+    except Exception as e:
+        _record_llm_failure(e)
+        llm_client.report_error(client, e)
+        raise
+
+async def astream_llm_narrator(payload: Dict[str, Any],
+                               *,
+                               groq_client: Optional["AsyncGroq"]=None,
+                               model: Optional[str]=None,
+                               temperature: float=0.7,
+                               timeout_s: Optional[float]=None) -> AsyncIterator[str]:
+    """
+    เวอร์ชัน async ของ stream_llm_narrator — budget เป็น deadline จริง: ทุก await (เปิด stream / รอ chunk)
+    อยู่ใต้ asyncio.timeout_at เดียวกัน stream ที่ค้างจึงถูกตัดตรงเวลา (ไม่ครอบข้าม yield: ผู้ใช้ generator อยู่ task เดียวกัน)
+    """
+    client = groq_client or _default_async_groq_client()
+    if client is None:
+        print("❌ AsyncGroq client is None - check API key in .env file")
+        return
+    if not _narrator_allowed():
+        return
+
+    budget = timeout_s or NARRATOR_TURN_BUDGET_S
+    when = asyncio.get_running_loop().time() + budget
+    req = _narrator_request(payload, model=model, temperature=temperature,
+                            timeout=_budget_timeout(time.monotonic() + budget))
+    print(f"📡 Streaming Groq API (async) with model: {req['model']}")
+    parts: List[str] = []
+    try:
+        with llm_client.tracking():
+            async with asyncio.timeout_at(when):
+                stream = await client.chat.completions.create(stream=True, **req)
+            try:
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        async with asyncio.timeout_at(when):
+                            chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    delta = _stream_delta(chunk)
+                    parts.append(delta)
+                    yield delta
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    await close()
+        _record_parsed(_extract_json("".join(parts)))
+    except TimeoutError as e:   # asyncio.timeout_at
+        _record_llm_failure(e)
+        raise NarratorBudgetExceeded(f"narrator stream exceeded {budget}s") from e
+    except Exception as e:
+        _record_llm_failure(e)
+        llm_client.report_error(client, e)
+        raise
 
 # ===================== Baseline (no-LLM fallback) =====================
 
@@ -272,6 +572,29 @@ f"* B. {b}\n"
 f"* C. {c}"
     )
 
+_BASELINE_SITUATIONS = {
+    "fail": (
+        "คุณพยายาม '{action_text}' แต่จังหวะผิดพลาด เงามืดเคลื่อนตัวมาข้างหลัง. "
+        "ลมเย็นเฉียบพัดสวนกับกลิ่นดินชื้นจนสันหลังชาวาบ. "
+        "บางสิ่งกำลังเฝ้ามอง—และมันรู้ว่าคุณอยู่ที่นี่."
+    ),
+    "neutral": (
+        "คุณ '{action_text}' อย่างระมัดระวัง ทุกอย่างดูเงียบงันเกินจริง. "
+        "สายหมอกบดบังรายละเอียดเล็กๆ และเสียงหยดน้ำคอยกวนใจ. "
+        "ไม่มีอะไรเกิดขึ้นชัดเจน แต่ความรู้สึกไม่แน่ใจเริ่มก่อตัว."
+    ),
+    "success": (
+        "คุณลงมือ '{action_text}' ได้อย่างเฉียบคม เงามืดถอยห่างไปชั่วครู่. "
+        "เบาะแสเล็กๆ โผล่มาใต้แสงฟ้าแลบ ทำให้คุณมีกำลังใจขึ้น. "
+        "เส้นทางถัดไปชัดเจนขึ้น แม้ยังแฝงอันตราย."
+    ),
+    "great": (
+        "การ '{action_text}' ของคุณแม่นยำจนน่าประหลาด เงามืดแตกซ่าน. "
+        "สัญญาณดีปรากฏตรงหน้า—บันไดทางลับ/สัญลักษณ์นำทางเผยตัวออกมา. "
+        "คุณสูดลมหายใจลึก ความมั่นใจไหลคืนสติ."
+    ),
+}
+
 def baseline_from_tier(
     *, tier: str, action_text: str, scene_idx: int, player, progress: int
 ) -> AIResult:
@@ -283,38 +606,8 @@ def baseline_from_tier(
     items_text = f"Heal Potion ×{player.pot_heal}, Boost Charm ×{player.pot_boost}"
     choices = _choices_for_scene(scene_idx)
 
-    if tier == "fail":
-        situation = (
-            f"คุณพยายาม '{action_text}' แต่จังหวะผิดพลาด เงามืดเคลื่อนตัวมาข้างหลัง. "
-            "ลมเย็นเฉียบพัดสวนกับกลิ่นดินชื้นจนสันหลังชาวาบ. "
-            "บางสิ่งกำลังเฝ้ามอง—และมันรู้ว่าคุณอยู่ที่นี่."
-        )
-        hp_delta = -8
-        grant_boost = 0
-    elif tier == "neutral":
-        situation = (
-            f"คุณ '{action_text}' อย่างระมัดระวัง ทุกอย่างดูเงียบงันเกินจริง. "
-            "สายหมอกบดบังรายละเอียดเล็กๆ และเสียงหยดน้ำคอยกวนใจ. "
-            "ไม่มีอะไรเกิดขึ้นชัดเจน แต่ความรู้สึกไม่แน่ใจเริ่มก่อตัว."
-        )
-        hp_delta = 0
-        grant_boost = 0
-    elif tier == "success":
-        situation = (
-            f"คุณลงมือ '{action_text}' ได้อย่างเฉียบคม เงามืดถอยห่างไปชั่วครู่. "
-            "เบาะแสเล็กๆ โผล่มาใต้แสงฟ้าแลบ ทำให้คุณมีกำลังใจขึ้น. "
-            "เส้นทางถัดไปชัดเจนขึ้น แม้ยังแฝงอันตราย."
-        )
-        hp_delta = 0
-        grant_boost = 0
-    else:  # great
-        situation = (
-            f"การ '{action_text}' ของคุณแม่นยำจนน่าประหลาด เงามืดแตกซ่าน. "
-            "สัญญาณดีปรากฏตรงหน้า—บันไดทางลับ/สัญลักษณ์นำทางเผยตัวออกมา. "
-            "คุณสูดลมหายใจลึก ความมั่นใจไหลคืนสติ."
-        )
-        hp_delta = 0
-        grant_boost = 1
+    situation = _BASELINE_SITUATIONS.get(tier, _BASELINE_SITUATIONS["great"]).format(action_text=action_text)
+    effects = BASELINE_TIER_EFFECTS.get(tier, BASELINE_TIER_EFFECTS["great"])
 
     narration = _render_narration_template(
         scene_title=scene,
@@ -329,33 +622,23 @@ def baseline_from_tier(
     
     return AIResult(
         narration=narration,
-        hp_delta=hp_delta,
-        mp_delta=0,
-        grant_heal=0,
-        grant_boost=grant_boost,
+        hp_delta=effects["hp_delta"],
+        mp_delta=effects["mp_delta"],
+        grant_heal=effects["grant_heal"],
+        grant_boost=effects["grant_boost"],
         status=[],
         extra={"scene_title": scene, "mission": mission},
     )
 
 # ===================== Entry point =====================
 
-def resolve_effects(
-    *,
-    session,
-    player,
-    roll,
-    action_text: str,
-    kind: str,
-    groq_client: Optional["Groq"]=None,
-    model: Optional[str]=None,
-) -> AIResult:
-    """ใช้ AI จริงๆ ในการสร้าง narration"""
+def _narrator_payload(*, session, player, roll, action_text: str, kind: str) -> Dict[str, Any]:
     scene_idx = max(1, min(10, int(session.stage_index)))
     scene_title = SCENE_TITLES[scene_idx] or f"ฉากที่ {scene_idx}"
     mission = DEFAULT_MISSIONS.get(scene_idx, "เดินหน้าไขปริศนา")
     progress = max(1, min(10, int(session.turn)))
 
-    payload = {
+    return {
         "scene_index": scene_idx,
         "scene_title": scene_title,
         "mission": mission,
@@ -379,12 +662,11 @@ def resolve_effects(
         "action_text": action_text,
     }
 
-    # ลอง call AI ก่อน
-    print(f"🎲 Calling AI for scene {scene_idx}...")
-    data = call_llm_narrator(payload, groq_client=groq_client, model=model)
-    
+def _effects_from_llm(data: Optional[Dict[str, Any]], *, payload: Dict[str, Any], roll, player) -> AIResult:
+    """แปลงผล JSON จาก LLM เป็น AIResult (หรือ baseline ถ้าใช้ไม่ได้) แล้ว validate"""
     if data and isinstance(data, dict) and "narration" in data:
         print("✅ AI response received!")
+        _count_narration("llm")
         ai = AIResult(
             narration=str(data.get("narration") or ""),
             hp_delta=int(data.get("hp_delta") or 0),
@@ -392,20 +674,143 @@ def resolve_effects(
             grant_heal=int(data.get("grant_heal") or 0),
             grant_boost=int(data.get("grant_boost") or 0),
             status=list(data.get("status") or []),
-            extra=dict({"scene_title": scene_title, "mission": mission, **(data.get("extra") or {})}),
+            extra=dict({"scene_title": payload["scene_title"], "mission": payload["mission"],
+                        **(data.get("extra") or {})}),
+            source="llm",
         )
         return _validated(ai, player)
 
-    # Fallback ถ้า AI ไม่ทำงาน
+    # Fallback ถ้า AI ไม่ทำงาน (error / timeout / breaker เปิด / JSON ใช้ไม่ได้)
     print("⚠️ AI failed, using baseline...")
+    _count_narration("baseline")
     return _validated(baseline_from_tier(
         tier=roll.tier, 
-        action_text=action_text,
-        scene_idx=scene_idx, 
+        action_text=payload["action_text"],
+        scene_idx=payload["scene_index"], 
         player=player, 
-        progress=progress
+        progress=payload["progress"]
     ), player)
 
+def resolve_effects(
+    *,
+    session,
+    player,
+    roll,
+    action_text: str,
+    kind: str,
+    groq_client: Optional["Groq"]=None,
+    model: Optional[str]=None,
+    priority: int=PRIORITY_ACT,
+) -> AIResult:
+    """ใช้ AI จริงๆ ในการสร้าง narration (priority: PRIORITY_ACT / PRIORITY_INTRO)"""
+    payload = _narrator_payload(session=session, player=player, roll=roll, action_text=action_text, kind=kind)
+
+    # ลอง call AI ก่อน
+    data = None
+    with narrator_gate.slot(priority) as admitted:
+        if admitted:
+            print(f"🎲 Calling AI for scene {payload['scene_index']}...")
+            data = call_llm_narrator(payload, groq_client=groq_client, model=model)
+        else:
+            print("⏳ Narrator queue full - using baseline")
+    return _effects_from_llm(data, payload=payload, roll=roll, player=player)
+
+async def aresolve_effects(
+    *,
+    session,
+    player,
+    roll,
+    action_text: str,
+    kind: str,
+    groq_client: Optional["AsyncGroq"]=None,
+    model: Optional[str]=None,
+    priority: int=PRIORITY_ACT,
+) -> AIResult:
+    """เวอร์ชัน async ของ resolve_effects สำหรับ view บน ASGI"""
+    payload = _narrator_payload(session=session, player=player, roll=roll, action_text=action_text, kind=kind)
+
+    data = None
+    async with narrator_gate.aslot(priority) as admitted:
+        if admitted:
+            print(f"🎲 Calling AI (async) for scene {payload['scene_index']}...")
+            data = await acall_llm_narrator(payload, groq_client=groq_client, model=model)
+        else:
+            print("⏳ Narrator queue full - using baseline")
+    return _effects_from_llm(data, payload=payload, roll=roll, player=player)
+
+def stream_effects(
+    *,
+    session,
+    player,
+    roll,
+    action_text: str,
+    kind: str,
+    groq_client: Optional["Groq"]=None,
+    model: Optional[str]=None,
+    priority: int=PRIORITY_ACT,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    resolve_effects แบบ streaming:
+    - yield ("narration", ข้อความส่วนที่เพิ่งได้) ระหว่างที่ LLM กำลังตอบ
+    - yield ("effects", AIResult) เป็นตัวสุดท้ายเสมอ หลัง _validated แล้ว
+    ถ้า LLM ใช้ไม่ได้จะได้ narration ของ baseline ทั้งก้อนแทน
+    (AIResult.narration คือข้อความฉบับสมบูรณ์ ให้ client ใช้แทนที่ข้อความที่ทยอยได้มา)
+    """
+    payload = _narrator_payload(session=session, player=player, roll=roll, action_text=action_text, kind=kind)
+    parser = _NarrationStream()
+
+    # ถือ slot ไว้ตลอดช่วงที่ stream (generator ถูกปิดกลางทาง → คืน slot ใน finally ของ slot())
+    with narrator_gate.slot(priority) as admitted:
+        if admitted:
+            print(f"🎲 Streaming AI for scene {payload['scene_index']}...")
+            try:
+                for chunk in stream_llm_narrator(payload, groq_client=groq_client, model=model):
+                    piece = parser.feed(chunk)
+                    if piece:
+                        yield "narration", piece
+            except Exception as e:
+                _log_llm_error(e)
+        else:
+            print("⏳ Narrator queue full - using baseline")
+
+    ai = _effects_from_llm(_extract_json(parser.content), payload=payload, roll=roll, player=player)
+    if not parser.streamed:
+        yield "narration", ai.narration
+    yield "effects", ai
+
+async def astream_effects(
+    *,
+    session,
+    player,
+    roll,
+    action_text: str,
+    kind: str,
+    groq_client: Optional["AsyncGroq"]=None,
+    model: Optional[str]=None,
+    priority: int=PRIORITY_ACT,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """เวอร์ชัน async ของ stream_effects"""
+    payload = _narrator_payload(session=session, player=player, roll=roll, action_text=action_text, kind=kind)
+    parser = _NarrationStream()
+
+    async with narrator_gate.aslot(priority) as admitted:
+        if admitted:
+            print(f"🎲 Streaming AI (async) for scene {payload['scene_index']}...")
+            try:
+                async for chunk in astream_llm_narrator(payload, groq_client=groq_client, model=model):
+                    piece = parser.feed(chunk)
+                    if piece:
+                        yield "narration", piece
+            except Exception as e:
+                _log_llm_error(e)
+        else:
+            print("⏳ Narrator queue full - using baseline")
+
+    ai = _effects_from_llm(_extract_json(parser.content), payload=payload, roll=roll, player=player)
+    if not parser.streamed:
+        yield "narration", ai.narration
+    yield "effects", ai
+
 def _validated(ai: AIResult, player) -> AIResult:
     """ตรวจสอบและจำกัดค่า"""
     ai.hp_delta = max(-50, min(50, int(ai.hp_delta)))
@@ -0,0 +1,304 @@
+# roll/analytics.py
+# ตัวเลขของ native_dashboard จาก backend ที่เลือกได้ (settings.ANALYTICS_BACKEND)
+# - "postgres"   : อ่านตาราง rollup (roll/rollups.py) + session ล่าสุดตาม index — ค่าเริ่มต้น
+# - "clickhouse" : aggregate ตรงจากตาราง event_log ใน ClickHouse (settings.CLICKHOUSE, sync มาจาก EventLog)
+#                  → เปิดแดชบอร์ดไม่แตะ DB ของเกมเลย
+# ทั้งสองคืน DashboardKPIs หน้าตาเดียวกัน; compare() ใช้ตรวจว่าได้ผลตรงกัน (manage.py analytics_parity)
+from __future__ import annotations
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
+
+from roll import rollups
+from roll.enums import SessionStatus
+from roll.models import RollupDaily, RollupStage, Session
+
+BACKENDS = ("postgres", "clickhouse")
+RECENT_PLAYERS = 10
+
+# ---------- ผลลัพธ์ ----------
+
+@dataclass
+class DashboardKPIs:
+    backend: str
+    entrants: int = 0                                            # ผู้เล่นไม่ซ้ำที่เริ่มเล่น
+    finishers: int = 0                                           # ผู้เล่นไม่ซ้ำที่เคลียร์เกม
+    avg_time_to_death: float = 0.0                               # วินาที session_start → death
+    active_by_stage: Dict[int, int] = field(default_factory=dict)
+    deaths_by_stage: Dict[int, int] = field(default_factory=dict)
+    stage_avg_seconds: Dict[int, float] = field(default_factory=dict)
+    daily: List[Tuple[date, int, int]] = field(default_factory=list)   # (วัน, entrants, finishers)
+    recent_players: List[Dict[str, Any]] = field(default_factory=list)
+    as_of: Optional[datetime] = None
+
+    @property
+    def completion_rate(self) -> float:
+        return round((self.finishers / self.entrants) * 100, 1) if self.entrants else 0.0
+
+    def to_context(self) -> Dict[str, Any]:
+        """context ของ roll/native_dashboard.html"""
+        active = sorted((s, c) for s, c in self.active_by_stage.items() if c)
+        deaths = sorted(((s, c) for s, c in self.deaths_by_stage.items() if c), key=lambda x: -x[1])[:10]
+        timed = sorted(self.stage_avg_seconds.items())
+        return {
+            # KPI
+            "total_entrants": self.entrants,
+            "finishers": self.finishers,
+            "completion_rate": self.completion_rate,
+            "avg_time_to_death": round(self.avg_time_to_death, 1),
+
+            # ผู้เล่นล่าสุด
+            "recent_players": self.recent_players,
+
+            # ความคืบหน้า
+            "stage_labels": [f"S{s}" for s, _ in active],
+            "stage_counts": [c for _, c in active],
+
+            # ความตาย
+            "death_total": sum(self.deaths_by_stage.values()),
+            "top_death_stage": deaths[0][0] if deaths else None,
+            "death_by_stage": [{"stage_index": s, "c": c} for s, c in deaths],
+
+            # เวลาเล่น
+            "time_stage_labels": [f"S{s}" for s, _ in timed],
+            "time_stage_avg_sec": [round(v, 1) for _, v in timed],
+
+            # รายวัน
+            "daily_labels": [str(d) for d, _, _ in self.daily],
+            "daily_ent_vals": [e for _, e, _ in self.daily],
+            "daily_fin_vals": [f for _, _, f in self.daily],
+
+            # ความสดของข้อมูล
+            "data_as_of": self.as_of,
+            "analytics_backend": self.backend,
+        }
+
+# ---------- Postgres (rollup) ----------
+
+class PostgresAnalytics:
+    name = "postgres"
+
+    def recent_players(self, limit: int = RECENT_PLAYERS) -> List[Dict[str, Any]]:
+        """ผู้เล่นที่เริ่มรอบล่าสุด: ไล่ session ตาม index started_at จนได้ผู้เล่นครบ (ไม่ GROUP BY ทั้งตาราง)"""
+        latest = {}
+        recent = Session.objects.order_by("-started_at").values_list("player_id", "started_at", "status")
+        for player_id, started_at, status in recent.iterator(chunk_size=limit * 5):
+            latest.setdefault(player_id, (started_at, status))
+            if len(latest) >= limit:
+                break
+        rounds = dict(
+            Session.objects.filter(player_id__in=latest)
+            .values_list("player_id").annotate(c=Count("id")).order_by()
+        )
+        return [
+            {"player_id": pid, "rounds": rounds.get(pid, 0), "last_status": status, "last_started": started_at}
+            for pid, (started_at, status) in latest.items()
+        ]
+
+    def dashboard(self) -> DashboardKPIs:
+        totals = rollups.counters()
+        stages = list(RollupStage.objects.all())
+        return DashboardKPIs(
+            backend=self.name,
+            entrants=int(totals["entrants"]),
+            finishers=int(totals["finishers"]),
+            avg_time_to_death=(
+                totals["death_seconds"] / totals["death_sessions"] if totals["death_sessions"] else 0.0
+            ),
+            active_by_stage={s.stage_index: s.active_sessions for s in stages if s.active_sessions},
+            deaths_by_stage={s.stage_index: s.deaths for s in stages if s.deaths},
+            stage_avg_seconds={s.stage_index: s.span_seconds / s.spans for s in stages if s.spans},
+            daily=[(d.day, d.entrants, d.finishers) for d in RollupDaily.objects.all()],
+            recent_players=self.recent_players(),
+            as_of=rollups.last_refreshed_at(),
+        )
+
+# ---------- ClickHouse (event_log) ----------
+# นิยามเดียวกับ rollup แต่คำนวณจาก event ล้วนๆ:
+#   finishers / daily finishers = event clear_game (เกิดคู่กับ session_end status=CLEARED เสมอ)
+#   stage ปัจจุบันของ session ACTIVE = stage สูงสุดที่มี event (stage ไม่เคยถอยหลัง) ของ session ที่ยังไม่มี session_end
+#   สถานะล่าสุดของผู้เล่น = death → DEAD, clear_game → CLEARED, session_end อย่างเดียว → ESCAPED, ไม่งั้น ACTIVE
+
+def _seconds(a: str, b: str) -> str:
+    """SQL: วินาทีจาก a ถึง b (ใช้ได้ทั้งคอลัมน์ DateTime และ DateTime64)"""
+    return f"(toUnixTimestamp64Micro(toDateTime64({b}, 6)) - toUnixTimestamp64Micro(toDateTime64({a}, 6))) / 1e6"
+
+CH_TOTALS = """
+SELECT
+    uniqExactIf(player_id, type = 'session_start'),
+    uniqExactIf(player_id, type = 'clear_game'),
+    max(ts)
+FROM {table}
+"""
+
+CH_SESSIONS = f"""
+SELECT
+    stage,
+    countIf(ended = 0),
+    countIf(died AND started),
+    sumIf({_seconds('t_start', 't_death')}, died AND started)
+FROM (
+    SELECT
+        session_id,
+        max(stage_index)                    AS stage,
+        countIf(type = 'session_end')       AS ended,
+        countIf(type = 'session_start') > 0 AS started,
+        countIf(type = 'death') > 0         AS died,
+        minIf(ts, type = 'session_start')   AS t_start,
+        minIf(ts, type = 'death')           AS t_death
+    FROM {{table}}
+    GROUP BY session_id
+)
+GROUP BY stage
+"""
+
+CH_STAGE_SPANS = f"""
+SELECT stage_index, countIf(span > 0), sumIf(span, span > 0)
+FROM (
+    SELECT session_id, stage_index, {_seconds('min(ts)', 'max(ts)')} AS span
+    FROM {{table}}
+    GROUP BY session_id, stage_index
+)
+GROUP BY stage_index
+"""
+
+CH_DEATHS = """
+SELECT stage_index, count() FROM {table} WHERE type = 'death' GROUP BY stage_index
+"""
+
+CH_DAILY = """
+SELECT toDate(ts, {tz:String}) AS day, countIf(type = 'session_start'), countIf(type = 'clear_game')
+FROM {table}
+WHERE type IN ('session_start', 'clear_game')
+GROUP BY day
+ORDER BY day
+"""
+
+CH_RECENT = """
+SELECT player_id, max(ts) AS last_started, count(), argMax(session_id, (ts, id))
+FROM {table}
+WHERE type = 'session_start'
+GROUP BY player_id
+ORDER BY last_started DESC
+LIMIT {limit:UInt32}
+"""
+
+CH_SESSION_STATUS = """
+SELECT
+    session_id,
+    multiIf(countIf(type = 'death') > 0, 'DEAD',
+            countIf(type = 'clear_game') > 0, 'CLEARED',
+            countIf(type = 'session_end') > 0, 'ESCAPED',
+            'ACTIVE')
+FROM {table}
+WHERE session_id IN {ids:Array(UUID)}
+GROUP BY session_id
+"""
+
+class ClickHouseAnalytics:
+    name = "clickhouse"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, *, table: str = "event_log"):
+        self.config = config if config is not None else getattr(settings, "CLICKHOUSE", {})
+        self.table = table
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        """clickhouse-connect client ใช้ซ้ำทั้งโปรเซส (HTTP pool ในตัว ยิงพร้อมกันหลาย thread ได้)"""
+        with self._lock:
+            if self._client is None:
+                from roll.sync_to_clickhouse import get_client
+                self._client = get_client(self.config)
+            return self._client
+
+    def _rows(self, sql: str, **params) -> List[tuple]:
+        # ชื่อตารางแทนด้วย format (มาจากโค้ด ไม่ใช่ผู้ใช้) ส่วนค่าอื่นส่งเป็น server-side parameter
+        return self.client().query(sql.replace("{table}", self.table), parameters=params).result_rows
+
+    def recent_players(self, limit: int = RECENT_PLAYERS) -> List[Dict[str, Any]]:
+        recent = self._rows(CH_RECENT, limit=limit)
+        if not recent:
+            return []
+        status = dict(self._rows(CH_SESSION_STATUS, ids=[str(r[3]) for r in recent]))
+        return [
+            {"player_id": pid, "rounds": rounds, "last_status": status.get(sid, SessionStatus.ACTIVE),
+             "last_started": last_started}
+            for pid, last_started, rounds, sid in recent
+        ]
+
+    def dashboard(self) -> DashboardKPIs:
+        entrants, finishers, as_of = self._rows(CH_TOTALS)[0]
+        kpis = DashboardKPIs(backend=self.name, entrants=int(entrants), finishers=int(finishers), as_of=as_of)
+
+        death_sessions, death_seconds = 0, 0.0
+        for stage, active, died, seconds in self._rows(CH_SESSIONS):
+            if active:
+                kpis.active_by_stage[int(stage)] = int(active)
+            death_sessions += int(died)
+            death_seconds += float(seconds)
+        kpis.avg_time_to_death = death_seconds / death_sessions if death_sessions else 0.0
+
+        kpis.stage_avg_seconds = {int(s): float(total) / n for s, n, total in self._rows(CH_STAGE_SPANS) if n}
+        kpis.deaths_by_stage = {int(s): int(c) for s, c in self._rows(CH_DEATHS)}
+        kpis.daily = [(d, int(e), int(f)) for d, e, f in self._rows(CH_DAILY, tz=settings.TIME_ZONE)]
+        kpis.recent_players = self.recent_players()
+        return kpis
+
+# ---------- เลือก backend ----------
+
+_backends: Dict[str, Any] = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name: Optional[str] = None):
+    """backend ตามชื่อ (ค่าเริ่มต้น settings.ANALYTICS_BACKEND) — สร้างครั้งเดียวต่อโปรเซส"""
+    name = name or getattr(settings, "ANALYTICS_BACKEND", "postgres")
+    if name not in BACKENDS:
+        raise ImproperlyConfigured(f"ANALYTICS_BACKEND must be one of {BACKENDS}, got {name!r}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = ClickHouseAnalytics() if name == "clickhouse" else PostgresAnalytics()
+        return _backends[name]
+
+def dashboard() -> DashboardKPIs:
+    """ตัวเลขของแดชบอร์ดจาก backend ที่ตั้งไว้ — ClickHouse ล่ม/ตั้งค่าผิด → ถอยไปใช้ rollup บน Postgres แทนหน้าพัง"""
+    backend = get_backend()
+    try:
+        return backend.dashboard()
+    except Exception as e:
+        if backend.name == "postgres":
+            raise
+        print(f"⚠️ analytics backend {backend.name} failed ({e!r}), falling back to postgres")
+        return get_backend("postgres").dashboard()
+
+# ---------- parity ----------
+
+def compare(a: DashboardKPIs, b: DashboardKPIs, *, time_tolerance: float = 1.0) -> List[str]:
+    """
+    รายการตัวเลขที่สอง backend ไม่ตรงกัน (ว่าง = ตรงกันหมด)
+    ค่าที่เป็นเวลายอมคลาดได้ time_tolerance วินาที (event_log.ts ใน ClickHouse เก็บละเอียดแค่วินาที)
+    """
+    diffs = []
+
+    def check(label: str, x, y, ok: bool) -> None:
+        if not ok:
+            diffs.append(f"{label}: {a.backend}={x!r} {b.backend}={y!r}")
+
+    for attr in ("entrants", "finishers", "active_by_stage", "deaths_by_stage", "daily"):
+        x, y = getattr(a, attr), getattr(b, attr)
+        check(attr, x, y, x == y)
+    check("avg_time_to_death", a.avg_time_to_death, b.avg_time_to_death,
+          abs(a.avg_time_to_death - b.avg_time_to_death) <= time_tolerance)
+    for stage in sorted(set(a.stage_avg_seconds) | set(b.stage_avg_seconds)):
+        x, y = a.stage_avg_seconds.get(stage, 0.0), b.stage_avg_seconds.get(stage, 0.0)
+        check(f"stage_avg_seconds[{stage}]", x, y, abs(x - y) <= time_tolerance)
+
+    def players(kpis):
+        return sorted((p["player_id"], p["rounds"], str(p["last_status"])) for p in kpis.recent_players)
+    check("recent_players", players(a), players(b), players(a) == players(b))
+    return diffs
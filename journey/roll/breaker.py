@@ -0,0 +1,87 @@
+# roll/breaker.py
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Dict
+
+class CircuitBreaker:
+    """
+    circuit breaker แบบนับความล้มเหลวติดกัน
+    - CLOSED   : เรียกได้ปกติ ถ้าล้มเหลว/timeout ติดกันครบ failure_threshold → OPEN
+    - OPEN     : ไม่เรียกเลย (allow() = False) จนครบ reset_timeout วินาที
+    - HALF_OPEN: ปล่อย probe ไปทีละ 1 ครั้ง สำเร็จ → CLOSED, ล้มเหลว → OPEN ใหม่
+      (ถ้า probe หายไปเกิน reset_timeout เช่น client ตัดสาย จะปล่อย probe ใหม่)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, *, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.short_circuits = 0
+        self.opens = 0
+        self.probes = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    self.short_circuits += 1
+                    return False
+                self.state = self.HALF_OPEN
+            elif now - self._probe_at < self.reset_timeout:
+                # HALF_OPEN และมี probe กำลังทดสอบอยู่
+                self.short_circuits += 1
+                return False
+            self._probe_at = now
+            self.probes += 1
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._consecutive = 0
+            self.state = self.CLOSED
+
+    def record_failure(self, *, timeout: bool = False) -> None:
+        with self._lock:
+            self.failures += 1
+            if timeout:
+                self.timeouts += 1
+            self._consecutive += 1
+            if self.state == self.HALF_OPEN or self._consecutive >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "state": self.state,
+                "consecutive_failures": self._consecutive,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_s": self.reset_timeout,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "short_circuits": self.short_circuits,
+                "opens": self.opens,
+                "probes": self.probes,
+            }
+            if self.state == self.OPEN:
+                out["retry_in_s"] = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 2)
+            return out
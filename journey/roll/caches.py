@@ -0,0 +1,250 @@
+# roll/caches.py
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from roll import metrics
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    cache ในโปรเซส จำกัดขนาดแบบ LRU + TTL (วินาที, None = ไม่หมดอายุ)
+    - thread-safe (ใช้ได้ทั้ง WSGI แบบหลาย thread และ ASGI)
+    - stats() คืนตัวนับ hit/miss/eviction สำหรับ /api/metrics
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = (time.monotonic() + ttl) if ttl is not None else None
+        with self._lock:
+            self._store(key, value, expires_at)
+
+    def add(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> bool:
+        """set เฉพาะเมื่อยังไม่มี key (หรือหมดอายุแล้ว) — คืน True ถ้าได้ set"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and (item[0] is None or item[0] > now):
+                return False
+            self._store(key, value, (now + ttl) if ttl is not None else None)
+            return True
+
+    def _store(self, key: Hashable, value: Any, expires_at: Optional[float]) -> None:
+        # เรียกขณะถือ self._lock
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+# ---------- intro cache ----------
+# narration ของ intro ขึ้นกับ (session, stage, turn) เท่านั้น → โหลดหน้าใหม่ไม่ต้องเรียก LLM ซ้ำ
+# เทิร์นเดินหน้าเมื่อไหร่ key เดิมก็ใช้ไม่ได้อีก (commit_turn/end_session จะ pop ทิ้งให้ด้วย)
+
+_INTRO_CFG = getattr(settings, "ROLL_INTRO_CACHE", {})
+intro_cache = LRUCache(
+    maxsize=_INTRO_CFG.get("MAXSIZE", 2048),
+    ttl=_INTRO_CFG.get("TTL", 600),
+)
+metrics.register("intro_cache", intro_cache.stats)
+
+def intro_key(session) -> tuple:
+    return (str(session.id), int(session.stage_index), int(session.turn))
+
+# ---------- session state cache ----------
+# snapshot ของ session ที่ ACTIVE + ผู้เล่นเจ้าของ (key = session id) ให้ get_state/intro/act/end_session
+# ตรวจสิทธิ์/สถานะได้โดยไม่ต้อง query Player + Session ทุก request
+# - write-through: _insert_session / commit_turn เขียน snapshot ใหม่ทับหลัง commit
+# - session จบ (DEAD/CLEARED/ESCAPED) → เขียน tombstone ทับ (ไม่ใช่ลบ) กัน request ที่อ่าน DB ค้างไว้
+#   ก่อนหน้าเอา snapshot เก่ามาใส่คืน (ฝั่งอ่านใช้ add ซึ่งไม่ทับ key ที่มีอยู่)
+# - ค่าที่เก็บเป็น dict ธรรมดา → ใช้ backend กลาง (Django cache เช่น Redis) ร่วมกันหลาย process ได้
+#   ROLL_SESSION_CACHE["BACKEND"] = "local" (LRU ในโปรเซส, ค่าเริ่มต้น) | "django" (caches[ALIAS])
+#   "local" ใช้ได้กับ worker process เดียวเท่านั้น (write-through ไม่ไปถึง process อื่น → state ค้างได้ถึง TTL)
+#   ฝั่งเขียนจึงไม่เชื่อ snapshot: commit_turn ล็อกแถวอ่านใหม่, end_session UPDATE แบบมีเงื่อนไข status=ACTIVE
+
+_ENDED = {"ended": True}
+# updated_at ของทั้งคู่ = validator ของ ETag (views._state_etag) → คำนวณได้จาก entry โดยไม่ต้องโหลดแถว
+_PLAYER_ENTRY_FIELDS = ("id", "anon_id", "user_id", "hp", "mp", "pot_heal", "pot_boost", "updated_at")
+_SESSION_ENTRY_FIELDS = ("id", "player_id", "status", "stage_index", "turn", "updated_at")
+
+class DjangoCacheBackend:
+    """ห่อ django.core.cache ให้หน้าตาเหมือน LRUCache (get/set/add/pop/stats) + นับ hit/miss เอง"""
+
+    def __init__(self, alias: str = "default", ttl: Optional[float] = None):
+        from django.core.cache import caches
+        self.alias = alias
+        self.ttl = ttl
+        self._cache = caches[alias]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, value: Any) -> Any:
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._count(self._cache.get(key))
+        return default if value is None else value
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        value = self._count(await self._cache.aget(key))
+        return default if value is None else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._cache.set(key, value, self.ttl if ttl is None else ttl)
+
+    def add(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> bool:
+        return self._cache.add(key, value, self.ttl if ttl is None else ttl)
+
+    async def aadd(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self._cache.aadd(key, value, self.ttl if ttl is None else ttl)
+
+    def pop(self, key: Hashable) -> None:
+        self._cache.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": f"django:{self.alias}",
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class SessionStateCache:
+    def __init__(self, backend, *, prefix: str = "roll:session:v2:"):   # เปลี่ยนรูป entry เมื่อไหร่ให้ขยับเวอร์ชัน
+        self.backend = backend
+        self.prefix = prefix
+
+    def _key(self, session_id) -> str:
+        return f"{self.prefix}{session_id}"
+
+    @staticmethod
+    def entry(session, player) -> Dict[str, Any]:
+        return {
+            "player": {f: getattr(player, f) for f in _PLAYER_ENTRY_FIELDS},
+            "session": {f: getattr(session, f) for f in _SESSION_ENTRY_FIELDS},
+        }
+
+    @staticmethod
+    def _usable(entry) -> Optional[Dict[str, Any]]:
+        return None if entry is None or entry.get("ended") else entry
+
+    def get(self, session_id) -> Optional[Dict[str, Any]]:
+        """snapshot ของ session ที่ยัง ACTIVE หรือ None (ไม่มี / จบแล้ว → ให้ผู้เรียกอ่าน DB)"""
+        return self._usable(self.backend.get(self._key(session_id)))
+
+    async def aget(self, session_id) -> Optional[Dict[str, Any]]:
+        aget = getattr(self.backend, "aget", None)
+        key = self._key(session_id)
+        return self._usable(await aget(key) if aget else self.backend.get(key))
+
+    def store(self, session, player) -> None:
+        """write-through หลังเขียน DB สำเร็จ (เรียกใน transaction.on_commit)"""
+        value = self.entry(session, player) if session.status == "ACTIVE" else _ENDED
+        self.backend.set(self._key(session.id), value)
+
+    def fill(self, session, player) -> None:
+        """เติมหลังอ่านจาก DB ตอน cache miss — ไม่ทับค่าที่ writer เขียนไว้แล้ว"""
+        if session.status == "ACTIVE":
+            self.backend.add(self._key(session.id), self.entry(session, player))
+
+    async def afill(self, session, player) -> None:
+        if session.status != "ACTIVE":
+            return
+        aadd = getattr(self.backend, "aadd", None)
+        key, value = self._key(session.id), self.entry(session, player)
+        if aadd:
+            await aadd(key, value)
+        else:
+            self.backend.add(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+def instances_from_entry(entry: Dict[str, Any]):
+    """สร้าง (Player, Session) จาก snapshot — ฟิลด์ที่ไม่ได้เก็บเป็น deferred (แตะเมื่อไหร่ค่อย query)"""
+    from roll.models import Player, Session
+    player = _from_entry(Player, entry["player"])
+    session = _from_entry(Session, entry["session"])
+    session.player = player
+    return player, session
+
+def _from_entry(model, data: Dict[str, Any]):
+    # Model.from_db ต้องการค่าเรียงตาม concrete_fields
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in data]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [data[n] for n in names])
+
+_SESSION_CFG = getattr(settings, "ROLL_SESSION_CACHE", {})
+if _SESSION_CFG.get("BACKEND", "local") == "django":
+    _session_backend = DjangoCacheBackend(_SESSION_CFG.get("ALIAS", "default"), ttl=_SESSION_CFG.get("TTL", 300))
+else:
+    _session_backend = LRUCache(maxsize=_SESSION_CFG.get("MAXSIZE", 10000), ttl=_SESSION_CFG.get("TTL", 300))
+session_cache = SessionStateCache(_session_backend)
+metrics.register("session_cache", session_cache.stats)
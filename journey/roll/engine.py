@@ -0,0 +1,310 @@
+# roll/engine.py
+# เอนจินเทิร์นแบบ pure: กติกา + state transition ล้วนๆ ไม่มี Django/DB/LLM
+# - state เป็น object ธรรมดา (__slots__) → bot / simulator / test เล่นได้หลักพันเทิร์นต่อวินาทีใน process เดียว
+# - ทุกฟังก์ชันแก้ state ที่ส่งเข้ามาตรงๆ แล้วคืน event (พร้อม snapshot ณ ตอนเกิด) + เดลต้าของ state
+# - ฝั่ง Django (progress.py) เป็นแค่ adapter: โหลด state จาก model → เรียก engine → เขียนกลับ + bulk_create event
+#
+# 2 จังหวะเหมือน progress: begin_turn (checkpoint/ไอเท็ม/ทอย) → [รอผลจาก narrator] → finish_turn (apply ผล/จบด่าน)
+# ไม่ต้องรอ narrator ใช้ play_turn ทีเดียวจบ (ค่าเริ่มต้นใช้ผลตาม rules.BASELINE_TIER_EFFECTS)
+#
+#   player, session = PlayerState(), SessionState()
+#   while session.status == SessionStatus.ACTIVE:
+#       out = play_turn(player, session, action_text="สำรวจ", use_mp=1, rng=rng)
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+from roll.enums import EventType, ItemCode, SessionStatus
+from roll.rules import (
+    BASELINE_TIER_EFFECTS, HEAL_HP_AMOUNT, ITEM_MP_COST, PLAYER_HP_MAX, PLAYER_MP_MAX,
+    Progress, RollResult, advance, checkpoint_effects, clamp, classify_turn, make_roll,
+)
+
+PLAYER_FIELDS = ("hp", "mp", "pot_heal", "pot_boost")
+SESSION_FIELDS = ("stage_index", "turn", "status")
+
+# ---------- state ----------
+
+class PlayerState:
+    """HP/MP/potion ของผู้เล่น (หน้าตาเหมือน models.Player พอให้ ai.py ใช้แทนกันได้)"""
+    __slots__ = PLAYER_FIELDS
+    HP_MAX = PLAYER_HP_MAX
+    MP_MAX = PLAYER_MP_MAX
+
+    def __init__(self, hp: int = PLAYER_HP_MAX, mp: int = PLAYER_MP_MAX, pot_heal: int = 1, pot_boost: int = 0):
+        self.hp, self.mp = int(hp), int(mp)
+        self.pot_heal, self.pot_boost = int(pot_heal), int(pot_boost)
+
+    @classmethod
+    def of(cls, obj) -> "PlayerState":
+        """คัดลอกจาก object ใดก็ได้ที่มี hp/mp/pot_heal/pot_boost (เช่น models.Player)"""
+        return cls(*(getattr(obj, f) for f in PLAYER_FIELDS))
+
+    def apply_to(self, obj) -> None:
+        for f in PLAYER_FIELDS:
+            setattr(obj, f, getattr(self, f))
+
+    def as_tuple(self) -> Tuple[int, int, int, int]:
+        return (self.hp, self.mp, self.pot_heal, self.pot_boost)
+
+    @property
+    def potions_total(self) -> int:
+        return max(0, self.pot_heal) + max(0, self.pot_boost)
+
+    def __repr__(self):
+        return f"PlayerState(hp={self.hp}, mp={self.mp}, pot_heal={self.pot_heal}, pot_boost={self.pot_boost})"
+
+class SessionState:
+    """ตำแหน่งในเกม + สถานะของรอบเล่น"""
+    __slots__ = SESSION_FIELDS
+
+    def __init__(self, stage_index: int = 1, turn: int = 1, status: str = SessionStatus.ACTIVE):
+        self.stage_index, self.turn = int(stage_index), int(turn)
+        self.status = str(status)
+
+    @classmethod
+    def of(cls, obj) -> "SessionState":
+        return cls(*(getattr(obj, f) for f in SESSION_FIELDS))
+
+    def apply_to(self, obj) -> None:
+        for f in SESSION_FIELDS:
+            setattr(obj, f, getattr(self, f))
+
+    def __repr__(self):
+        return f"SessionState(stage_index={self.stage_index}, turn={self.turn}, status={self.status!r})"
+
+# ---------- event / effects ----------
+
+class Event:
+    """1 แถวของ EventLog ในรูปที่ยังไม่แตะ DB — snapshot ถูกคัดลอกตอนสร้าง"""
+    __slots__ = ("type", "attrs", "stage_index", "turn", "hp", "mp", "pot_heal", "pot_boost")
+
+    def __init__(self, etype: str, player: PlayerState, session: SessionState, attrs: Optional[Dict[str, Any]] = None):
+        self.type = str(etype)
+        self.attrs = attrs or {}
+        self.stage_index, self.turn = session.stage_index, session.turn
+        self.hp, self.mp = player.hp, player.mp
+        self.pot_heal, self.pot_boost = player.pot_heal, player.pot_boost
+
+    def snapshot(self) -> Tuple:
+        return (self.type, self.stage_index, self.turn, self.hp, self.mp, self.pot_heal, self.pot_boost)
+
+    def __repr__(self):
+        return f"Event({self.type!r}, stage={self.stage_index}, turn={self.turn}, hp={self.hp}, mp={self.mp})"
+
+class Effects:
+    """ผลของเทิร์นจาก narrator — ai.AIResult ก็ใช้แทนได้เพราะมีฟิลด์ชื่อเดียวกัน"""
+    __slots__ = ("hp_delta", "mp_delta", "grant_heal", "grant_boost")
+
+    def __init__(self, hp_delta: int = 0, mp_delta: int = 0, grant_heal: int = 0, grant_boost: int = 0):
+        self.hp_delta, self.mp_delta = int(hp_delta), int(mp_delta)
+        self.grant_heal, self.grant_boost = int(grant_heal), int(grant_boost)
+
+    @classmethod
+    def for_tier(cls, tier: str) -> "Effects":
+        return cls(**BASELINE_TIER_EFFECTS[tier])
+
+    def to_attrs(self) -> Dict[str, int]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+# ---------- turn ----------
+
+class TurnStart:
+    """ผลของ begin_turn: ทอยแล้ว รอผลจาก narrator"""
+    __slots__ = ("kind", "action_text", "use_mp", "roll", "events", "player_before", "session_before")
+
+    def __init__(self, *, kind, action_text, use_mp, roll, events, player_before, session_before):
+        self.kind = kind
+        self.action_text = action_text
+        self.use_mp = use_mp
+        self.roll: RollResult = roll
+        self.events: List[Event] = events
+        self.player_before = player_before
+        self.session_before = session_before
+
+class TurnOutcome:
+    """ผลของทั้งเทิร์น: event ทั้งหมดตามลำดับ + ฟิลด์ที่เปลี่ยน {ชื่อ: (ก่อน, หลัง)}"""
+    __slots__ = ("kind", "roll", "events", "dead", "cleared_stage", "cleared_game", "player_delta", "session_delta")
+
+    def __init__(self, *, kind, roll, events, dead, cleared_stage, cleared_game, player_delta, session_delta):
+        self.kind = kind
+        self.roll: RollResult = roll
+        self.events: List[Event] = events
+        self.dead = dead
+        self.cleared_stage = cleared_stage
+        self.cleared_game = cleared_game
+        self.player_delta: Dict[str, Tuple[int, int]] = player_delta
+        self.session_delta: Dict[str, Tuple[Any, Any]] = session_delta
+
+    @property
+    def ended(self) -> bool:
+        return self.dead or self.cleared_game
+
+def _delta(fields, before: Tuple, state) -> Dict[str, Tuple[Any, Any]]:
+    return {f: (b, getattr(state, f)) for f, b in zip(fields, before) if getattr(state, f) != b}
+
+def begin_turn(
+    player: PlayerState,
+    session: SessionState,
+    *,
+    action_text: str,
+    use_mp: int = 0,
+    use_heal: bool = False,
+    use_boost: bool = False,
+    rng: Optional[object] = None,
+) -> TurnStart:
+    """checkpoint → เสนอ MP (3/6/9) → HEAL → BOOST → ทอย (ยังไม่ apply ผลจาก narrator)"""
+    player_before = player.as_tuple()
+    session_before = tuple(getattr(session, f) for f in SESSION_FIELDS)
+    events: List[Event] = []
+    kind = classify_turn(session.turn)
+
+    if session.turn == 1:
+        events.append(Event(EventType.STAGE_ENTER, player, session, {"stage_index": session.stage_index}))
+
+    events.append(Event(EventType.TURN_START, player, session, {"kind": kind, "action_text": action_text}))
+
+    if kind == "CHECKPOINT":
+        heal_full, mp_pct, grant_pots = checkpoint_effects()
+        if heal_full:
+            player.hp = player.HP_MAX
+        if mp_pct > 0:
+            player.mp = clamp(player.mp + int(player.MP_MAX * (mp_pct / 100.0)), 0, player.MP_MAX)
+        if grant_pots > 0:
+            player.pot_heal += grant_pots
+        events.append(Event(EventType.CHECKPOINT, player, session, {
+            "heal_full": heal_full, "mp_pct": mp_pct, "grant_potions": grant_pots
+        }))
+
+    if kind == "FORCED_MP":
+        events.append(Event(EventType.MANA_EVENT_OFFERED, player, session, {"requested_mp": int(use_mp)}))
+
+    if use_heal and player.pot_heal > 0 and player.mp >= ITEM_MP_COST:
+        player.mp -= ITEM_MP_COST
+        player.pot_heal -= 1
+        player.hp = clamp(player.hp + HEAL_HP_AMOUNT, 0, player.HP_MAX)
+        events.append(Event(EventType.ITEM_USED, player, session, {
+            "item": ItemCode.HEAL, "mp_cost": ITEM_MP_COST, "heal_amount": HEAL_HP_AMOUNT
+        }))
+
+    boost_applied = False
+    if use_boost and player.pot_boost > 0 and player.mp >= ITEM_MP_COST:
+        player.mp -= ITEM_MP_COST
+        player.pot_boost -= 1
+        boost_applied = True
+        events.append(Event(EventType.ITEM_USED, player, session, {
+            "item": ItemCode.BOOST, "mp_cost": ITEM_MP_COST, "boost_bonus": 5
+        }))
+
+    roll = make_roll(
+        turn=session.turn,
+        mp_spent=int(use_mp),
+        boost=boost_applied,
+        available_mp=player.mp,
+        rng=rng,
+    )
+    return TurnStart(
+        kind=kind, action_text=action_text, use_mp=int(use_mp), roll=roll, events=events,
+        player_before=player_before, session_before=session_before,
+    )
+
+def finish_turn(
+    player: PlayerState,
+    session: SessionState,
+    start: TurnStart,
+    effects,
+    *,
+    attrs: Optional[Dict[str, Any]] = None,
+) -> TurnOutcome:
+    """
+    apply ผลจาก narrator (effects มี hp_delta/mp_delta/grant_heal/grant_boost) → หัก MP ที่ใช้ทอย
+    → ตาย / ผ่านด่าน / จบเกม แล้วเลื่อนตำแหน่ง
+    attrs = ข้อมูลที่จะต่อท้าย ACTION_RESULT (เช่น ai.to_attrs()) — ไม่ส่งมาจะใช้แค่เดลต้า
+    """
+    kind, roll = start.kind, start.roll
+    events = list(start.events)
+
+    player.hp = clamp(player.hp + effects.hp_delta, 0, player.HP_MAX)
+    player.mp = clamp(player.mp + effects.mp_delta, 0, player.MP_MAX)
+    player.pot_heal += effects.grant_heal
+    player.pot_boost += effects.grant_boost
+
+    if roll.mp_spent > 0:
+        player.mp = clamp(player.mp - roll.mp_spent, 0, player.MP_MAX)
+
+    if kind == "FORCED_MP":
+        if roll.mp_spent > 0:
+            events.append(Event(EventType.MANA_EVENT_ACCEPTED, player, session, {"mp_spent": roll.mp_spent}))
+        else:
+            events.append(Event(EventType.MANA_EVENT_DECLINED, player, session, {"requested_mp": start.use_mp}))
+
+    events.append(Event(EventType.ACTION_RESULT, player, session, {
+        "action_text": start.action_text,
+        "dice_roll": roll.dice_roll,
+        "mp_spent_roll": roll.mp_spent,
+        "mp_bonus": roll.mp_bonus,
+        "boost_applied": roll.boost_applied,
+        "boost_bonus": roll.boost_bonus,
+        "total_roll": roll.total_roll,
+        "outcome": roll.tier,
+        **(attrs if attrs is not None else {
+            "hp_delta": effects.hp_delta, "mp_delta": effects.mp_delta,
+            "grant_heal": effects.grant_heal, "grant_boost": effects.grant_boost,
+        }),
+    }))
+
+    dead = cleared_stage = cleared_game = False
+    if player.hp <= 0:
+        dead = True
+        session.status = SessionStatus.DEAD
+        events.append(Event(EventType.DEATH, player, session, {"reason": "hp<=0"}))
+        events.append(Event(EventType.SESSION_END, player, session, {"status": SessionStatus.DEAD}))
+    else:
+        adv = advance(Progress(session.stage_index, session.turn))
+        cleared_stage, cleared_game = adv.cleared_stage, adv.cleared_game
+        if cleared_stage:
+            events.append(Event(EventType.STAGE_CLEAR, player, session, {"stage_index": session.stage_index}))
+        if cleared_game:
+            session.status = SessionStatus.CLEARED
+            events.append(Event(EventType.CLEAR_GAME, player, session))
+            events.append(Event(EventType.SESSION_END, player, session, {"status": SessionStatus.CLEARED}))
+        else:
+            session.stage_index = adv.progress.stage_index
+            session.turn = adv.progress.turn
+            if cleared_stage and session.turn == 1:
+                events.append(Event(EventType.STAGE_ENTER, player, session, {"stage_index": session.stage_index}))
+
+    events.append(Event(EventType.TURN_END, player, session))
+    return TurnOutcome(
+        kind=kind, roll=roll, events=events,
+        dead=dead, cleared_stage=cleared_stage, cleared_game=cleared_game,
+        player_delta=_delta(PLAYER_FIELDS, start.player_before, player),
+        session_delta=_delta(SESSION_FIELDS, start.session_before, session),
+    )
+
+def play_turn(
+    player: PlayerState,
+    session: SessionState,
+    *,
+    action_text: str = "",
+    use_mp: int = 0,
+    use_heal: bool = False,
+    use_boost: bool = False,
+    rng: Optional[object] = None,
+    effects=None,
+) -> TurnOutcome:
+    """
+    begin_turn + finish_turn ในครั้งเดียว
+    effects: None = ผลตาม tier (rules.BASELINE_TIER_EFFECTS), object ที่มีเดลต้า,
+             หรือ callable(roll) → effects (เช่นสุ่มผลเองใน simulator)
+    """
+    if session.status != SessionStatus.ACTIVE:
+        raise ValueError(f"session is not ACTIVE (status={session.status})")
+    start = begin_turn(player, session, action_text=action_text, use_mp=use_mp,
+                       use_heal=use_heal, use_boost=use_boost, rng=rng)
+    if effects is None:
+        fx = Effects.for_tier(start.roll.tier)
+    elif callable(effects):
+        fx = effects(start.roll)
+    else:
+        fx = effects
+    return finish_turn(player, session, start, fx)
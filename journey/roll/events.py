@@ -0,0 +1,71 @@
+# roll/events.py
+from __future__ import annotations
+from typing import Optional, Dict, Any, Iterable, List
+from django.utils import timezone
+
+from roll.models import EventLog
+from roll.enums import EventType
+
+# ---------- buffer ของ EventLog ระดับเทิร์น ----------
+
+class EventBuffer:
+    """
+    เก็บ EventLog ของ 1 เทิร์น (หรือ 1 คำสั่ง) ไว้ในหน่วยความจำ แล้วเขียนลง DB ทีเดียว
+    ด้วย bulk_create (INSERT เดียว) ตอน flush()
+    - snapshot hp/mp/potions ถูกคัดลอก ณ ตอนเรียก log() ไม่ใช่ตอน flush
+      → ค่าที่บันทึกเหมือนเดิมทุกอย่างกับการ create ทีละแถว
+    - ลำดับแถวใน DB = ลำดับที่ log (bulk_create insert ตามลำดับ list → id เรียงตาม)
+    - ให้เรียก flush() ภายใน transaction เดียวกับการเขียน state เพื่อให้ commit พร้อมกัน
+    """
+    __slots__ = ("_rows",)
+
+    def __init__(self):
+        self._rows: List[EventLog] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def log(self, player, session, etype: EventType, *, attrs: Optional[Dict[str, Any]] = None) -> EventLog:
+        row = EventLog(
+            ts=timezone.now(),
+            player=player,
+            session=session,
+            type=etype,
+            stage_index=session.stage_index,
+            turn=session.turn,
+            hp=player.hp,
+            mp=player.mp,
+            potions=(player.pot_heal + player.pot_boost),
+            pot_heal_ct=player.pot_heal,
+            pot_boost_ct=player.pot_boost,
+            attrs=(attrs or {}),
+        )
+        self._rows.append(row)
+        return row
+
+    def extend(self, player, session, events: Iterable) -> None:
+        """ต่อท้ายด้วย event จาก roll.engine (ใช้ snapshot ที่ engine คัดลอกไว้แล้ว ไม่อ่านจาก model)"""
+        now = timezone.now()
+        for ev in events:
+            self._rows.append(EventLog(
+                ts=now,
+                player=player,
+                session=session,
+                type=ev.type,
+                stage_index=ev.stage_index,
+                turn=ev.turn,
+                hp=ev.hp,
+                mp=ev.mp,
+                potions=(ev.pot_heal + ev.pot_boost),
+                pot_heal_ct=ev.pot_heal,
+                pot_boost_ct=ev.pot_boost,
+                attrs=ev.attrs,
+            ))
+
+    def flush(self) -> int:
+        """เขียนทุก event ที่ค้างอยู่ด้วย bulk_create ครั้งเดียว คืนจำนวนแถวที่เขียน"""
+        if not self._rows:
+            return 0
+        rows, self._rows = self._rows, []
+        EventLog.objects.bulk_create(rows)
+        return len(rows)
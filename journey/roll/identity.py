@@ -0,0 +1,87 @@
+# roll/identity.py
+# แปลงตัวตนของผู้เรียก (user id ที่ login / header X-ANON-ID) → Player.id
+# - warm hit: อ่านจาก LRU ในโปรเซส ไม่แตะ DB เลย
+# - cold miss: INSERT ... ON CONFLICT (anon_id | user_id) DO UPDATE ... RETURNING id คำสั่งเดียว
+#   ได้ id ทั้งกรณีมีอยู่แล้วและสร้างใหม่ ไม่มีช่องว่างระหว่าง SELECT กับ INSERT แบบ get_or_create
+#   (user ใช้ constraint uniq_player_user — migration 0005)
+# - mapping ไม่เปลี่ยนตลอดอายุ Player → ล้างเฉพาะตอนลบ Player (forget) ที่เหลือปล่อยให้ TTL จัดการ
+from __future__ import annotations
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+
+from roll import metrics
+from roll.caches import LRUCache
+from roll.models import Player
+
+_CFG = getattr(settings, "ROLL_IDENTITY_CACHE", {})
+player_ids = LRUCache(maxsize=_CFG.get("MAXSIZE", 50000), ttl=_CFG.get("TTL", 3600))
+metrics.register("identity_cache", player_ids.stats)
+
+Identity = Tuple[Optional[int], Optional[str]]   # (user_id, anon_id) — มีค่าอย่างใดอย่างหนึ่ง
+
+def _key(user_id: Optional[int], anon_id: Optional[str]) -> tuple:
+    return ("u", user_id) if user_id is not None else ("a", anon_id)
+
+def _upsert(user_id: Optional[int], anon_id: Optional[str]) -> Tuple[Player, dict]:
+    """แถวที่จะ INSERT + kwargs ของ bulk_create ให้ได้ ON CONFLICT ... DO UPDATE ... RETURNING id"""
+    if user_id is not None:
+        # DO UPDATE แบบไม่เปลี่ยนค่า เพื่อให้ RETURNING คืน id ของแถวเดิมด้วย (DO NOTHING จะไม่คืนอะไร)
+        return Player(user_id=user_id, anon_id=uuid4().hex), {
+            "update_conflicts": True, "unique_fields": ["user"], "update_fields": ["user"],
+        }
+    return Player(anon_id=anon_id), {
+        "update_conflicts": True, "unique_fields": ["anon_id"], "update_fields": ["anon_id"],
+    }
+
+def resolve_player_id(user_id: Optional[int] = None, anon_id: Optional[str] = None) -> int:
+    """
+    Player.id ของ user/anon นี้ (สร้างให้ถ้ายังไม่มี)
+    anon_id=None และไม่มี user → สร้างผู้เล่น anonymous ใหม่ทุกครั้งเหมือนเดิม (ไม่ cache)
+    """
+    if user_id is None and not anon_id:
+        return Player.objects.create(anon_id=uuid4().hex).id
+    key = _key(user_id, anon_id)
+    pid = player_ids.get(key)
+    if pid is None:
+        row, kwargs = _upsert(user_id, anon_id)
+        Player.objects.bulk_create([row], **kwargs)
+        pid = row.pk
+        player_ids.set(key, pid)
+    return pid
+
+async def aresolve_player_id(user_id: Optional[int] = None, anon_id: Optional[str] = None) -> int:
+    """เวอร์ชัน async ของ resolve_player_id"""
+    if user_id is None and not anon_id:
+        return (await Player.objects.acreate(anon_id=uuid4().hex)).id
+    key = _key(user_id, anon_id)
+    pid = player_ids.get(key)
+    if pid is None:
+        row, kwargs = _upsert(user_id, anon_id)
+        await Player.objects.abulk_create([row], **kwargs)
+        pid = row.pk
+        player_ids.set(key, pid)
+    return pid
+
+def forget(user_id: Optional[int] = None, anon_id: Optional[str] = None) -> None:
+    """ล้าง mapping ของ Player ที่ถูกลบไปแล้ว (ส่งได้ทั้ง user_id และ anon_id ของแถวนั้น)"""
+    if user_id is not None:
+        player_ids.pop(_key(user_id, None))
+    if anon_id:
+        player_ids.pop(_key(None, anon_id))
+
+# ---------- จาก request ----------
+
+def request_identity(request) -> Identity:
+    """(user_id, anon_id) ตามกติกาเดิม: login แล้วใช้ user ก่อน ไม่งั้นใช้ header X-ANON-ID"""
+    user = getattr(request, "user", None)
+    if user and user.is_authenticated:
+        return user.pk, None
+    return None, request.headers.get("X-ANON-ID") or None
+
+async def arequest_identity(request) -> Identity:
+    user = await request.auser()
+    if user and user.is_authenticated:
+        return user.pk, None
+    return None, request.headers.get("X-ANON-ID") or None
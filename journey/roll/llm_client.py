@@ -0,0 +1,191 @@
+# roll/llm_client.py
+# registry ของ Groq client ระดับโปรเซส: สร้างครั้งเดียวแล้วใช้ซ้ำ (keep-alive, ไม่ต้อง TLS handshake ทุกเทิร์น)
+# - fork-safe: โปรเซสลูกของ pre-fork server (gunicorn) จะสร้าง client ของตัวเองใหม่ ไม่ใช้ socket ร่วมกับแม่
+# - เจอ connection error → ทิ้ง client นั้นแล้วสร้างใหม่ในการเรียกครั้งถัดไป
+# - stats() รายงานจำนวน request ที่กำลังรอ / connection ใน pool สำหรับ /api/metrics
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from roll import metrics
+
+try:
+    import httpx
+    from groq import Groq, AsyncGroq, APIConnectionError, APITimeoutError
+    from groq import DefaultHttpxClient, DefaultAsyncHttpxClient
+except Exception:
+    httpx = None
+    Groq = AsyncGroq = None
+    APIConnectionError = APITimeoutError = None
+
+def _cfg() -> Dict[str, Any]:
+    return getattr(settings, "LLM", {})
+
+def setting(name: str, default: Any) -> Any:
+    """อ่านค่าจาก settings.LLM"""
+    return _cfg().get(name, default)
+
+def _api_key() -> Optional[str]:
+    return _cfg().get("API_KEY") or os.getenv("api_key")
+
+def _limits() -> "httpx.Limits":
+    cfg = _cfg()
+    return httpx.Limits(
+        max_connections=int(cfg.get("MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(cfg.get("MAX_KEEPALIVE", 20)),
+        keepalive_expiry=float(cfg.get("KEEPALIVE_EXPIRY", 30.0)),
+    )
+
+def _base_url() -> Optional[str]:
+    # None = ค่า default ของ SDK (api.groq.com); ชี้ไปที่ bench/mock_llm_server.py ได้ตอน load test
+    return _cfg().get("BASE_URL") or None
+
+def _max_retries() -> int:
+    # retry ของ SDK กิน latency budget ของเทิร์น → ปกติปิดไว้ ให้ circuit breaker ใน ai.py ตัดสินแทน
+    return int(_cfg().get("MAX_RETRIES", 0))
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.client: Optional["Groq"] = None
+        # AsyncGroq ผูกกับ event loop ที่สร้าง → แยกต่อ loop (ปกติ uvicorn มี loop เดียว)
+        self.async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGroq]" = weakref.WeakKeyDictionary()
+        self.created = 0
+        self.rebuilds = 0
+        self.requests = 0
+        self.connection_errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+_reg = _Registry()
+
+def _reset_after_fork() -> None:
+    # ไม่ close() client ของโปรเซสแม่ (socket เป็นของแม่) แค่ทิ้ง reference แล้วเริ่มใหม่
+    global _reg
+    _reg = _Registry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _check_pid() -> None:
+    if _reg.pid != os.getpid():   # กันกรณี fork ที่ไม่ผ่าน os.fork (เช่น multiprocessing บางแบบ)
+        _reset_after_fork()
+
+def get_client() -> Optional["Groq"]:
+    """Groq client ที่ใช้ร่วมกันทั้งโปรเซส (None ถ้าไม่มี groq หรือไม่มี API key)"""
+    _check_pid()
+    reg = _reg
+    if reg.client is not None:
+        return reg.client
+    api_key = _api_key()
+    if Groq is None or not api_key:
+        return None
+    with reg.lock:
+        if reg.client is None:
+            try:
+                reg.client = Groq(api_key=api_key, base_url=_base_url(), max_retries=_max_retries(),
+                                  http_client=DefaultHttpxClient(limits=_limits()))
+                reg.created += 1
+            except Exception:
+                return None
+        return reg.client
+
+def get_async_client() -> Optional["AsyncGroq"]:
+    """AsyncGroq client ของ event loop ปัจจุบัน (สร้างครั้งเดียวต่อ loop)"""
+    _check_pid()
+    reg = _reg
+    api_key = _api_key()
+    if AsyncGroq is None or not api_key:
+        return None
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    client = reg.async_clients.get(loop)
+    if client is None:
+        try:
+            client = AsyncGroq(api_key=api_key, base_url=_base_url(), max_retries=_max_retries(),
+                               http_client=DefaultAsyncHttpxClient(limits=_limits()))
+        except Exception:
+            return None
+        with reg.lock:
+            reg.async_clients[loop] = client
+            reg.created += 1
+    return client
+
+def _is_connection_error(exc: BaseException) -> bool:
+    if APIConnectionError is None or not isinstance(exc, APIConnectionError):
+        return False
+    return not isinstance(exc, APITimeoutError)   # timeout ไม่ได้แปลว่า connection เสีย
+
+def is_timeout(exc: BaseException) -> bool:
+    if APITimeoutError is not None and isinstance(exc, APITimeoutError):
+        return True
+    return isinstance(exc, TimeoutError)
+
+def report_error(client, exc: BaseException) -> None:
+    """เรียกเมื่อการเรียก LLM ล้มเหลว — ถ้าเป็น connection error จะทิ้ง client นั้นให้สร้างใหม่"""
+    if not _is_connection_error(exc):
+        return
+    reg = _reg
+    with reg.lock:
+        reg.connection_errors += 1
+        if client is not None and client is reg.client:
+            reg.client = None
+            reg.rebuilds += 1
+            return
+        for loop, c in list(reg.async_clients.items()):
+            if c is client:
+                del reg.async_clients[loop]
+                reg.rebuilds += 1
+
+@contextmanager
+def tracking():
+    """ครอบช่วงที่ request ไปหา LLM เพื่อนับ in-flight / utilization"""
+    reg = _reg
+    with reg.lock:
+        reg.requests += 1
+        reg.in_flight += 1
+        reg.peak_in_flight = max(reg.peak_in_flight, reg.in_flight)
+    try:
+        yield
+    finally:
+        with reg.lock:
+            reg.in_flight -= 1
+
+def _pool_connections(client) -> Optional[Dict[str, int]]:
+    # httpcore ไม่มี public API สำหรับนับ connection ใน pool → อ่านแบบ best-effort
+    try:
+        conns = client._client._transport._pool.connections
+    except Exception:
+        return None
+    idle = sum(1 for c in conns if c.is_idle())
+    return {"open": len(conns), "idle": idle, "active": len(conns) - idle}
+
+def stats() -> Dict[str, Any]:
+    reg = _reg
+    max_conn = int(_cfg().get("MAX_CONNECTIONS", 100))
+    out = {
+        "pid": reg.pid,
+        "clients_created": reg.created,
+        "rebuilds": reg.rebuilds,
+        "requests": reg.requests,
+        "connection_errors": reg.connection_errors,
+        "in_flight": reg.in_flight,
+        "peak_in_flight": reg.peak_in_flight,
+        "max_connections": max_conn,
+        "utilization": round(reg.in_flight / max_conn, 4) if max_conn else 0.0,
+        "async_clients": len(reg.async_clients),
+    }
+    if reg.client is not None:
+        out["pool"] = _pool_connections(reg.client)
+    return out
+
+metrics.register("llm_client", stats)
@@ -0,0 +1,53 @@
+# roll/management/commands/analytics_parity.py
+#   python manage.py analytics_parity                  # เทียบตัวเลขแดชบอร์ด postgres (rollup) กับ clickhouse (event_log)
+#   python manage.py analytics_parity --refresh        # refresh rollup ให้ทันก่อนเทียบ
+#   python manage.py analytics_parity --json out.json  # เก็บตัวเลขทั้งสองฝั่งไว้ดูทีหลัง
+# ทั้งสองฝั่งต้องตามทัน EventLog ชุดเดียวกันก่อน (refresh_rollups + sync ClickHouse) ไม่งั้นจะต่างกันตามช่วงที่ค้าง
+from __future__ import annotations
+import json
+import time
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from roll import analytics, rollups
+
+class Command(BaseCommand):
+    help = "Compare dashboard KPIs computed by two analytics backends (default: postgres vs clickhouse)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--left", choices=analytics.BACKENDS, default="postgres")
+        parser.add_argument("--right", choices=analytics.BACKENDS, default="clickhouse")
+        parser.add_argument("--refresh", action="store_true", help="รัน refresh_rollups ก่อนเทียบ")
+        parser.add_argument("--time-tolerance", type=float, default=1.0,
+                            help="ยอมให้ค่าเวลา (วินาที) ต่างกันได้เท่านี้")
+        parser.add_argument("--json", dest="json_out", default=None, help="บันทึก KPIs ทั้งสองฝั่งเป็นไฟล์ JSON")
+
+    def handle(self, *args, **opts):
+        if opts["refresh"]:
+            r = rollups.refresh()
+            self.stdout.write(f"📊 rollups: folded {r['events']:,} events (up to id {r['last_id']})")
+
+        results = {}
+        for name in (opts["left"], opts["right"]):
+            started = time.perf_counter()
+            try:
+                results[name] = analytics.get_backend(name).dashboard()
+            except Exception as e:
+                raise CommandError(f"{name} backend failed: {e!r}")
+            self.stdout.write(f"⏱️ {name}: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        left, right = results[opts["left"]], results[opts["right"]]
+        if opts["json_out"]:
+            with open(opts["json_out"], "w", encoding="utf-8") as f:
+                json.dump({name: asdict(k) for name, k in results.items()}, f,
+                          cls=DjangoJSONEncoder, ensure_ascii=False, indent=2)
+            self.stdout.write(f"💾 saved {opts['json_out']}")
+
+        diffs = analytics.compare(left, right, time_tolerance=opts["time_tolerance"])
+        for d in diffs:
+            self.stdout.write(f"❌ {d}")
+        if diffs:
+            raise CommandError(f"{len(diffs)} KPI(s) differ between {left.backend} and {right.backend}")
+        self.stdout.write(f"✅ {left.backend} and {right.backend} agree on every KPI")
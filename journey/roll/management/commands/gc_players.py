@@ -0,0 +1,153 @@
+# roll/management/commands/gc_players.py
+# เก็บกวาดผู้เล่น anonymous ที่ถูกทิ้ง (crawler / client ที่ไม่ส่ง X-ANON-ID ซ้ำ → ได้ Player ใหม่ทุก request)
+#   python manage.py gc_players --dry-run                         # ดูว่าจะลบกี่แถว (ไม่ลบ ไม่ขยับ cursor)
+#   python manage.py gc_players --max-batches 50 --pause 0.2      # รันทีละช่วง (cron) ต่อจากตำแหน่งเดิม
+#   python manage.py gc_players --archive gc/players.jsonl.gz     # เก็บแถวที่ลบไว้ก่อน (player + sessions + logs)
+#
+# เป้าหมาย: Player ที่ user เป็น NULL, ไม่ได้อัปเดตมา --idle-days วัน และไม่มี session ที่ขยับภายในช่วงเดียวกัน
+#   (ไม่มี session เลย หรือมีแต่ session เก่าค้าง) → ลบพร้อม sessions/logs (CASCADE)
+# ไล่ตาม Player.id ทีละ --batch-size แถว แต่ละก้อนเป็น transaction สั้นของตัวเอง (ล็อกเฉพาะแถวที่จะลบ)
+# ตำแหน่งล่าสุดเก็บใน JobCursor("gc_players") ใน transaction เดียวกับการลบ → หยุดกลางทางแล้วรันต่อได้
+# ไล่จนสุดตารางแล้ววน cursor กลับไปเริ่มใหม่ในรอบถัดไป
+# cache X-ANON-ID → Player.id (roll.identity) อยู่ในหน่วยความจำของแต่ละ web worker คำสั่งนี้ล้างให้ไม่ได้:
+#   worker ที่ยังถือ mapping ของแถวที่ลบไปจะแก้ตัวเองตอนใช้ — _get_or_create_player หาแถวไม่เจอ → forget แล้ว resolve ใหม่,
+#   _create_session ชน FK → เหมือนกัน; request อื่นที่ใช้ id ค้าง (get_state/act) แค่ได้ 404 เหมือน session ถูกลบ
+from __future__ import annotations
+import gzip
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from roll.models import EventLog, JobCursor, Player, Session
+
+CURSOR_NAME = "gc_players"
+
+def _stale_players(lo: int, hi: int, cutoff):
+    """ผู้เล่น anonymous ในช่วง id (lo, hi] ที่ไม่มีความเคลื่อนไหวตั้งแต่ cutoff"""
+    recent = Session.objects.filter(player=OuterRef("pk"), updated_at__gte=cutoff)
+    return (
+        Player.objects.filter(id__gt=lo, id__lte=hi, user__isnull=True, updated_at__lt=cutoff)
+        .filter(~Exists(recent))
+        .order_by("id")
+    )
+
+def _archive_rows(ids: list) -> list:
+    """1 record ต่อผู้เล่น: แถว player + sessions + logs (ไว้กู้คืน/วิเคราะห์ย้อนหลัง)"""
+    sessions, logs = defaultdict(list), defaultdict(list)
+    for s in Session.objects.filter(player_id__in=ids).order_by("started_at").values():
+        sessions[s["player_id"]].append(s)
+    for e in EventLog.objects.filter(player_id__in=ids).order_by("ts", "id").values():
+        logs[e["player_id"]].append(e)
+    return [
+        {"player": p, "sessions": sessions[p["id"]], "logs": logs[p["id"]]}
+        for p in Player.objects.filter(id__in=ids).order_by("id").values()
+    ]
+
+class Command(BaseCommand):
+    help = "Batched, resumable garbage collection of abandoned anonymous players"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--idle-days", type=int, default=30,
+                            help="ลบผู้เล่นที่ไม่มีความเคลื่อนไหว (player/session) มานานกว่านี้")
+        parser.add_argument("--batch-size", type=int, default=1000, help="จำนวน Player.id ที่สแกนต่อก้อน")
+        parser.add_argument("--max-batches", type=int, default=None,
+                            help="หยุดหลังครบจำนวนก้อนนี้ (ค่าเริ่มต้น: ไล่จนสุดตาราง)")
+        parser.add_argument("--pause", type=float, default=0.0, help="พักระหว่างก้อน (วินาที) ลดภาระ DB")
+        parser.add_argument("--archive", default=None, metavar="PATH",
+                            help="ต่อท้ายแถวที่ลบเป็น JSON lines ก่อนลบ (.gz = บีบอัด)")
+        parser.add_argument("--dry-run", action="store_true", help="นับอย่างเดียว ไม่ลบ ไม่ขยับ cursor")
+        parser.add_argument("--reset", action="store_true", help="เริ่มสแกนจาก id แรกใหม่")
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] <= 0 or opts["idle_days"] <= 0:
+            raise CommandError("--batch-size and --idle-days must be positive")
+        dry = opts["dry_run"]
+        cutoff = timezone.now() - timedelta(days=opts["idle_days"])
+
+        cursor, _ = JobCursor.objects.get_or_create(name=CURSOR_NAME)
+        last_id = 0 if opts["reset"] else int(cursor.position.get("last_id", 0))
+        self.stdout.write(f"🧹 gc_players from id>{last_id}  idle since {cutoff:%Y-%m-%d %H:%M}"
+                          + ("  (dry run)" if dry else ""))
+
+        archive = None
+        if opts["archive"] and not dry:
+            path = opts["archive"]
+            archive = gzip.open(path, "at", encoding="utf-8") if path.endswith(".gz") else open(path, "a", encoding="utf-8")
+
+        started = time.perf_counter()
+        batches = scanned = players = archived = 0
+        deleted = defaultdict(int)
+        finished = False
+        try:
+            while opts["max_batches"] is None or batches < opts["max_batches"]:
+                window = list(
+                    Player.objects.filter(id__gt=last_id).order_by("id")
+                    .values_list("id", flat=True)[:opts["batch_size"]]
+                )
+                if not window:
+                    finished = True
+                    break
+                hi = window[-1]
+
+                if dry:
+                    ids = list(_stale_players(last_id, hi, cutoff).values_list("id", flat=True))
+                    players += len(ids)
+                    deleted["roll.Session"] += Session.objects.filter(player_id__in=ids).count()
+                    deleted["roll.EventLog"] += EventLog.objects.filter(player_id__in=ids).count()
+                else:
+                    with transaction.atomic():
+                        # ล็อกแถวที่จะลบ (ข้ามแถวที่ request อื่นถืออยู่ — แปลว่ายังมีคนใช้) กันสร้าง session ใหม่แทรก
+                        stale = list(
+                            _stale_players(last_id, hi, cutoff)
+                            .select_for_update(skip_locked=True).values_list("id", "anon_id")
+                        )
+                        ids = [pid for pid, _ in stale]
+                        if ids:
+                            if archive:
+                                # เขียนก่อนลบ: ถ้า transaction ล้ม แถวจะถูกเก็บซ้ำในรอบหน้า แต่ไม่หาย
+                                for row in _archive_rows(ids):
+                                    archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+                                archived += len(ids)
+                            _, per_model = Player.objects.filter(id__in=ids).delete()
+                            for label, n in per_model.items():
+                                deleted[label] += n
+                            players += per_model.get("roll.Player", 0)
+                        JobCursor.objects.filter(pk=cursor.pk).update(
+                            position={**cursor.position, "last_id": hi}, updated_at=timezone.now()
+                        )
+
+                batches += 1
+                scanned += len(window)
+                last_id = hi
+                if opts["verbosity"] >= 2:
+                    self.stdout.write(f"   batch {batches}: ids ≤{hi}  stale {len(ids)}")
+                if opts["pause"]:
+                    time.sleep(opts["pause"])
+        finally:
+            if archive:
+                archive.close()
+
+        if finished and not dry:
+            # สุดตารางแล้ว → รอบหน้าเริ่มจากต้นตาราง (ผู้เล่นเก่าที่เพิ่งเลยเกณฑ์ idle จะถูกเก็บในรอบนั้น)
+            JobCursor.objects.filter(pk=cursor.pk).update(
+                position={"last_id": 0, "last_pass_at": timezone.now().isoformat()}, updated_at=timezone.now()
+            )
+        elapsed = time.perf_counter() - started
+
+        verb = "would reclaim" if dry else "reclaimed"
+        self.stdout.write(f"🔎 scanned {scanned:,} players in {batches:,} batch(es), {elapsed:.2f}s")
+        self.stdout.write(f"🗑️ {verb} players {players:,}  sessions {deleted['roll.Session']:,}  "
+                          f"logs {deleted['roll.EventLog']:,}")
+        if archived:
+            self.stdout.write(f"💾 archived {archived:,} players → {opts['archive']}")
+        if finished:
+            self.stdout.write("🏁 reached the end of the player table" + ("" if dry else "; cursor reset to the start"))
+        else:
+            self.stdout.write(f"⏸️ stopped at id {last_id}" + ("" if dry else "; next run resumes from here"))
@@ -0,0 +1,34 @@
+# roll/management/commands/refresh_rollups.py
+#   python manage.py refresh_rollups                       # รวม EventLog ใหม่ต่อจาก watermark (ตั้ง cron ทุกนาที)
+#   python manage.py refresh_rollups --max-batches 20      # จำกัดงานต่อรอบ ที่เหลือไว้รอบหน้า
+#   python manage.py refresh_rollups --rebuild             # ล้าง rollup แล้วคำนวณใหม่ทั้งหมด
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from roll import rollups
+
+class Command(BaseCommand):
+    help = "Incrementally fold new EventLog rows into the dashboard rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="จำนวน EventLog ต่อ transaction")
+        parser.add_argument("--max-batches", type=int, default=None)
+        parser.add_argument("--settle", type=float, default=2.0,
+                            help="รอ (วินาที) ให้ transaction ที่ค้างอยู่ commit ก่อนรวมถึง max(id)")
+        parser.add_argument("--rebuild", action="store_true", help="ล้าง rollup + watermark แล้วเริ่มใหม่")
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive")
+        run = rollups.rebuild if opts["rebuild"] else rollups.refresh
+        r = run(batch_size=opts["batch_size"], max_batches=opts["max_batches"], settle=opts["settle"])
+
+        rate = f"{r['events'] / r['elapsed_s']:,.0f} events/s" if r["elapsed_s"] else "-"
+        self.stdout.write(f"📊 folded {r['events']:,} events in {r['batches']:,} batch(es), {r['elapsed_s']:.2f}s  ({rate})")
+        if r["pruned_spans"]:
+            self.stdout.write(f"🧹 pruned {r['pruned_spans']:,} stale span(s)")
+        if r["caught_up"]:
+            self.stdout.write(f"✅ caught up to EventLog id {r['horizon']}")
+        else:
+            self.stdout.write(f"⏸️ at id {r['last_id']} of {r['horizon']}; next run continues from here")
@@ -0,0 +1,83 @@
+# roll/management/commands/replay_sessions.py
+#   python manage.py replay_sessions                             # ตรวจทุก session ที่จบแล้ว (ใช้เดลต้า AI จาก log)
+#   python manage.py replay_sessions --session <uuid> -v 2       # ดูจุดที่แยกทางของ session เดียว
+#   python manage.py replay_sessions --effects baseline --limit 50000 --workers 8 --json out.json
+#       → เล่นซ้ำด้วยกติกาใน rules.py ปัจจุบัน (หลังแก้) แล้วสรุปว่าผลจบเกมเปลี่ยนไปเท่าไหร่
+from __future__ import annotations
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from roll.enums import SessionStatus
+from roll.models import Session
+from roll.replay import EFFECTS_MODES, iter_session_events, replay_many
+
+class Command(BaseCommand):
+    help = "Deterministically replay sessions from EventLog (no LLM calls) and verify or re-simulate outcomes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--session", dest="sessions", action="append", default=[], metavar="UUID",
+                            help="เลือกเฉพาะ session (ใส่ซ้ำได้)")
+        parser.add_argument("--status", action="append", default=[], choices=SessionStatus.values,
+                            help="กรองตามสถานะ (ค่าเริ่มต้น: ทุกสถานะที่ไม่ใช่ ACTIVE)")
+        parser.add_argument("--limit", type=int, default=None)
+        parser.add_argument("--effects", choices=EFFECTS_MODES, default="recorded",
+                            help="recorded = ใช้เดลต้า AI ตาม log (ตรวจสอบ), baseline = ใช้ตาราง tier ปัจจุบัน (จำลองซ้ำ)")
+        parser.add_argument("--workers", type=int, default=None, help="จำนวน process (ค่าเริ่มต้น = จำนวน core)")
+        parser.add_argument("--chunk-size", type=int, default=200, help="จำนวน session ต่อก้อนที่ส่งให้ worker")
+        parser.add_argument("--json", dest="json_out", default=None, help="บันทึกผลราย session เป็นไฟล์ JSON")
+
+    def handle(self, *args, **opts):
+        qs = Session.objects.all()
+        if opts["sessions"]:
+            qs = qs.filter(id__in=opts["sessions"])
+        elif opts["status"]:
+            qs = qs.filter(status__in=opts["status"])
+        else:
+            qs = qs.exclude(status=SessionStatus.ACTIVE)
+        if opts["limit"]:
+            qs = qs.order_by("started_at", "id")[:opts["limit"]]
+
+        effects = opts["effects"]
+        verbosity = opts["verbosity"]
+        started = time.perf_counter()
+        total = ok = errors = tiers_changed = 0
+        outcomes = Counter()
+        results = []
+        try:
+            for r in replay_many(iter_session_events(qs), effects=effects,
+                                 workers=opts["workers"], chunk_size=opts["chunk_size"]):
+                total += 1
+                ok += r["ok"]
+                tiers_changed += r["tiers_changed"]
+                if r["error"]:
+                    errors += 1
+                outcomes[(r["recorded"]["status"], r["status"])] += 1
+                if opts["json_out"]:
+                    results.append(r)
+                if not r["ok"] and (verbosity >= 2 or (effects == "recorded" and verbosity >= 1)):
+                    self.stdout.write(f"❌ {r['session_id']}: {r['error'] or r['divergence']}")
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        rate = f"{total / elapsed:,.0f} sessions/s" if elapsed else "-"
+        self.stdout.write(f"🔁 replayed {total:,} sessions ({effects}) in {elapsed:.2f}s  ({rate})")
+        if effects == "recorded":
+            self.stdout.write(f"✅ matched {ok:,}/{total:,}  ❌ diverged {total - ok - errors:,}  ⚠️ unreadable {errors:,}")
+        else:
+            self.stdout.write(f"🎯 turns with a different tier: {tiers_changed:,}  ⚠️ unreadable {errors:,}")
+            self.stdout.write("🏁 outcome (recorded → replayed):")
+            for (before, after), n in sorted(outcomes.items()):
+                mark = "" if before == after else "  *"
+                self.stdout.write(f"   {before or '-':>8} → {after or '-':<8} {n:>8,}{mark}")
+
+        if opts["json_out"]:
+            with open(opts["json_out"], "w", encoding="utf-8") as f:
+                json.dump({"effects": effects, "results": results}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"💾 saved {opts['json_out']}")
+
+        if effects == "recorded" and ok != total:
+            raise CommandError(f"{total - ok} session(s) did not replay to their recorded state")
@@ -0,0 +1,82 @@
+# roll/management/commands/simulate_balance.py
+#   python manage.py simulate_balance --runs 1000000 --seed 1
+#   python manage.py simulate_balance --set MP_BONUS_PER_POINT=4 --set HEAL_HP_AMOUNT=12 --boost always
+#   python manage.py simulate_balance --compare --set BASELINE_TIER_EFFECTS='{"fail": {"hp_delta": -12, ...}}'
+from __future__ import annotations
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from roll.simulate import BOOST_POLICIES, Policy, simulate
+
+def _parse_override(text: str):
+    """KEY=VALUE โดย VALUE อ่านเป็น JSON ถ้าได้ (ตัวเลข, list, dict) ไม่งั้นเป็น string"""
+    if "=" not in text:
+        raise CommandError(f"--set expects KEY=VALUE, got {text!r}")
+    key, raw = text.split("=", 1)
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        value = raw
+    return key.strip(), value
+
+class Command(BaseCommand):
+    help = "Monte Carlo balance simulation of full 10x10 runs using roll.rules (needs numpy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=1_000_000)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--heal-below", type=int, default=Policy.heal_below,
+                            help="ใช้ Heal เมื่อ HP ต่ำกว่าค่านี้ (0 = ไม่ใช้)")
+        parser.add_argument("--mp-spend", type=int, default=Policy.mp_spend,
+                            help="MP ที่ใช้บัฟทอยในเทิร์น forced MP")
+        parser.add_argument("--boost", choices=BOOST_POLICIES, default=Policy.boost)
+        parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                            help="แทนค่าคงที่ใน rules.py ชั่วคราว (ใส่ซ้ำได้)")
+        parser.add_argument("--compare", action="store_true",
+                            help="รันค่าปัจจุบันด้วย seed เดียวกันแล้วแสดงผลต่างเทียบกับ --set")
+        parser.add_argument("--json", dest="json_out", default=None, help="บันทึกผลเต็มเป็นไฟล์ JSON")
+
+    def handle(self, *args, **opts):
+        overrides = dict(_parse_override(o) for o in opts["overrides"])
+        policy = Policy(heal_below=opts["heal_below"], mp_spend=opts["mp_spend"], boost=opts["boost"])
+
+        try:
+            started = time.perf_counter()
+            result = simulate(opts["runs"], seed=opts["seed"], policy=policy, overrides=overrides)
+            elapsed = time.perf_counter() - started
+            baseline = None
+            if opts["compare"] and overrides:
+                baseline = simulate(opts["runs"], seed=opts["seed"], policy=policy)
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"🎲 {opts['runs']:,} runs in {elapsed:.2f}s  policy={policy}  overrides={overrides or '-'}")
+        self._report(result.to_dict(), None if baseline is None else baseline.to_dict())
+
+        if opts["json_out"]:
+            out = {"result": result.to_dict(), "overrides": overrides}
+            if baseline is not None:
+                out["baseline"] = baseline.to_dict()
+            with open(opts["json_out"], "w", encoding="utf-8") as f:
+                json.dump(out, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"💾 saved {opts['json_out']}")
+
+    def _report(self, d, base):
+        def delta(key, fmt="{:+.2%}"):
+            return "" if base is None else "  (" + fmt.format(d[key] - base[key]) + ")"
+
+        self.stdout.write(f"🏁 clear rate: {d['clear_rate']:.4%}{delta('clear_rate')}")
+        self.stdout.write("💀 death rate by stage (given reached):")
+        for i, rate in enumerate(d["death_rate_by_stage"], start=1):
+            extra = "" if base is None else f"  ({rate - base['death_rate_by_stage'][i - 1]:+.3%})"
+            self.stdout.write(f"   stage {i:>2}: {rate:.3%}  deaths={d['deaths_by_stage'][i - 1]:,}{extra}")
+        self.stdout.write(f"🎯 tier share: {d['tier_share']}")
+        self.stdout.write(f"🧪 per run: {d['per_run']}")
+        turns = len(d["mean_hp"])
+        marks = sorted({0, turns // 4, turns // 2, 3 * turns // 4, turns - 1})
+        self.stdout.write("📈 resources of survivors (step: hp / mp / heal / boost):")
+        for i in marks:
+            self.stdout.write(f"   {i + 1:>3}: {d['mean_hp'][i]:.1f} / {d['mean_mp'][i]:.1f} / "
+                              f"{d['mean_pot_heal'][i]:.2f} / {d['mean_pot_boost'][i]:.2f}")
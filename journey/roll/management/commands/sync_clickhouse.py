@@ -0,0 +1,78 @@
+# roll/management/commands/sync_clickhouse.py
+#   python manage.py sync_clickhouse                        # ส่ง EventLog ใหม่ต่อจาก watermark (ตั้ง cron ทุกนาที)
+#   python manage.py sync_clickhouse --max-batches 10       # จำกัดงานต่อรอบ ที่เหลือไว้รอบหน้า
+#   python manage.py sync_clickhouse --reset                # TRUNCATE event_log ใน ClickHouse แล้วส่งใหม่ทั้งหมด
+#   python manage.py sync_clickhouse --backfill --workers 8 # ส่งย้อนหลังก้อนใหญ่ขนานหลาย process แล้ว sync ต่อตามปกติ
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from roll import sync_to_clickhouse as sync
+
+class Command(BaseCommand):
+    help = "Incrementally ship new EventLog rows to the ClickHouse event_log table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="จำนวนแถวต่อ insert / checkpoint")
+        parser.add_argument("--overlap-seconds", type=float, default=300,
+                            help="ย้อนเช็คแถวที่ commit ช้ากว่ารอบก่อนในช่วงนี้ (0 = ไม่ย้อน)")
+        parser.add_argument("--max-batches", type=int, default=None)
+        parser.add_argument("--reset", action="store_true",
+                            help="ล้าง event_log ใน ClickHouse + watermark ก่อน แล้วส่งใหม่ตั้งแต่แถวแรก")
+        parser.add_argument("--backfill", action="store_true",
+                            help="ส่งช่วงที่ค้างแบบแบ่งช่วง id ขนานหลาย process (COPY บน Postgres) ก่อน sync ปกติ")
+        parser.add_argument("--workers", type=int, default=None, help="จำนวน process ของ --backfill (default: จำนวน core)")
+        parser.add_argument("--chunk-ids", type=int, default=200_000, help="ขนาดช่วง id ต่อ chunk ของ --backfill")
+        parser.add_argument("--retries", type=int, default=3, help="retry ต่อช่วงย่อยของ --backfill")
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive")
+        try:
+            client = sync.get_client()
+            if opts["reset"]:
+                sync.reset(client)
+                self.stdout.write("🧹 truncated ClickHouse event_log and cleared the sync watermark")
+            if opts["backfill"]:
+                self._backfill(opts)
+            r = sync.sync_event_logs(
+                opts["batch_size"], overlap_seconds=opts["overlap_seconds"],
+                max_batches=opts["max_batches"], client=client,
+            )
+        except sync.SyncBusy as e:
+            raise CommandError(str(e))
+
+        rate = f"{r['inserted'] / r['elapsed_s']:,.0f} rows/s" if r["elapsed_s"] else "-"
+        self.stdout.write(f"🚚 inserted {r['inserted']:,} rows in {r['batches']:,} batch(es), {r['elapsed_s']:.2f}s  ({rate})")
+        if r["late"] or r["recovered"]:
+            self.stdout.write(f"↩️ late arrivals {r['late']:,}  recovered from an interrupted batch {r['recovered']:,}")
+        if r["caught_up"]:
+            self.stdout.write(f"✅ caught up to EventLog id {r['last_id']}")
+        else:
+            self.stdout.write(f"⏸️ at id {r['last_id']}; next run continues from here")
+
+    def _backfill(self, opts):
+        if opts["chunk_ids"] <= 0:
+            raise CommandError("--chunk-ids must be positive")
+
+        def report(p):
+            self.stdout.write(
+                f"  📦 {p['chunks_done']:,}/{p['chunks']:,} chunks  watermark {p['last_id']:,}/{p['horizon']:,}"
+                f"  {p['inserted']:,} inserted  {p['rows_per_s']:,.0f} rows/s  ETA {p['eta_s']:,.0f}s"
+            )
+
+        try:
+            r = sync.backfill(workers=opts["workers"], chunk_ids=opts["chunk_ids"], retries=opts["retries"], progress=report)
+        except RuntimeError as e:
+            # watermark ขยับถึง chunk สุดท้ายที่เสร็จต่อเนื่องแล้ว → รันซ้ำจะทำต่อจากตรงนั้น
+            raise CommandError(f"{e} — rerun to resume")
+        if not r["chunks"]:
+            self.stdout.write("🚚 backfill: nothing behind the watermark")
+            return
+        rate = f"{(r['inserted'] + r['skipped']) / r['elapsed_s']:,.0f} rows/s" if r["elapsed_s"] else "-"
+        self.stdout.write(
+            f"🚚 backfill: {r['inserted']:,} inserted, {r['skipped']:,} already present, ids {r['first_id']:,}..{r['horizon']:,}"
+            f" with {r['workers']} worker(s) in {r['elapsed_s']:.2f}s  ({rate})"
+        )
+        if r["retries"]:
+            self.stdout.write(f"↩️ {r['retries']} sub-range(s) retried")
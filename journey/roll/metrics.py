@@ -0,0 +1,19 @@
+# roll/metrics.py
+# registry เล็กๆ ของตัวเลข runtime (cache, LLM client ฯลฯ) ที่ /api/metrics ดึงไปแสดง (staff เท่านั้น)
+# แต่ละโมดูลเรียก register(ชื่อ, ฟังก์ชันที่คืน dict) ตอน import
+from __future__ import annotations
+from typing import Any, Callable, Dict
+
+_SOURCES: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def register(name: str, fn: Callable[[], Dict[str, Any]]) -> None:
+    _SOURCES[name] = fn
+
+def snapshot() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, fn in sorted(_SOURCES.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:   # ตัวเลขตัวเดียวพังไม่ควรทำให้ทั้งหน้า metrics ใช้ไม่ได้
+            out[name] = {"error": f"{type(e).__name__}: {e}"}
+    return out
@@ -0,0 +1,60 @@
+# roll/middleware.py
+from __future__ import annotations
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.backends.signals import connection_created
+
+# ตัวนับ query ของ request ปัจจุบัน (None = ไม่ได้นับ)
+# ใช้ contextvar แทน connection.execute_wrapper ตรงๆ เพราะ view แบบ async ยิง query ผ่าน
+# sync_to_async ใน thread อื่น — asgiref คัดลอก context ไปด้วย ตัวนับจึงตามไปถึง
+_query_count: contextvars.ContextVar = contextvars.ContextVar("roll_query_count", default=None)
+
+def _count_queries(execute, sql, params, many, context):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+connection_created.connect(_install_wrapper, dispatch_uid="roll.middleware.query_count")
+
+class QueryCountMiddleware:
+    """
+    ใส่ header X-DB-Queries = จำนวน SQL ที่ request นี้ยิง (ใช้กับ bench/loadgen.py)
+    เปิดด้วย settings.ROLL_QUERY_COUNT_HEADER — ปิดไว้ใน production
+    (response แบบ streaming นับได้แค่ช่วงก่อนเริ่มส่ง body)
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = [0]
+        token = _query_count.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_count.reset(token)
+        response["X-DB-Queries"] = str(counter[0])
+        return response
+
+    async def __acall__(self, request):
+        counter = [0]
+        token = _query_count.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_count.reset(token)
+        response["X-DB-Queries"] = str(counter[0])
+        return response
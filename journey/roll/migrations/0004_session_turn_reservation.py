@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roll', '0003_alter_player_anon_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='turn_reserved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='turn_token',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
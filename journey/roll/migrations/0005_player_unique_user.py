@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def detach_duplicate_user_players(apps, schema_editor):
+    """
+    get_or_create เดิมแข่งกันได้ → user เดียวอาจมี Player หลายแถว
+    เก็บแถวแรก (id น้อยสุด) ไว้กับ user ส่วนที่เหลือปลด user ออก (กลายเป็นผู้เล่น anonymous ตาม anon_id เดิม)
+    ไม่ลบข้อมูลใดๆ
+    """
+    Player = apps.get_model("roll", "Player")
+    dup_users = (
+        Player.objects.filter(user__isnull=False)
+        .values("user_id").annotate(n=Count("id")).filter(n__gt=1)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in dup_users:
+        ids = list(Player.objects.filter(user_id=user_id).order_by("id").values_list("id", flat=True))
+        Player.objects.filter(id__in=ids[1:]).update(user=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roll', '0004_session_turn_reservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(detach_duplicate_user_players, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='player',
+            constraint=models.UniqueConstraint(fields=('user',), name='uniq_player_user'),
+        ),
+    ]
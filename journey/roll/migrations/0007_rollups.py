@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('roll', '0006_jobcursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCounter',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('value', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('entrants', models.IntegerField(default=0)),
+                ('finishers', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupPlayer',
+            fields=[
+                ('player_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('started', models.BooleanField(default=False)),
+                ('finished', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.UUIDField()),
+                ('stage_index', models.PositiveIntegerField()),
+                ('tmin', models.DateTimeField()),
+                ('tmax', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage_index', models.PositiveIntegerField(unique=True)),
+                ('deaths', models.IntegerField(default=0)),
+                ('spans', models.IntegerField(default=0)),
+                ('span_seconds', models.FloatField(default=0.0)),
+                ('active_sessions', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['stage_index'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['started_at'], name='roll_sessio_started_58ecde_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rollupspan',
+            constraint=models.UniqueConstraint(fields=('session_id', 'stage_index'), name='uniq_rollupspan_session_stage'),
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models import Q
 from .enums import SessionStatus, EventType, TemplateKind
+from .rules import PLAYER_HP_MAX, PLAYER_MP_MAX
 
 # ---------- Stage ----------
 class Stage(models.Model):
@@ -71,9 +72,16 @@ class Player(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # 1 user = 1 player (NULL ไม่ชนกัน → ผู้เล่น anonymous มีได้ไม่จำกัด)
+            # ใช้เป็นเป้าของ INSERT ... ON CONFLICT (user_id) ใน roll/identity.py
+            models.UniqueConstraint(fields=["user"], name="uniq_player_user"),
+        ]
+
     # ค่าคงที่ (ไม่ใช่คอลัมน์ DB)
-    HP_MAX = 30
-    MP_MAX = 10
+    HP_MAX = PLAYER_HP_MAX
+    MP_MAX = PLAYER_MP_MAX
 
     @property
     def potions_total(self) -> int:
@@ -109,11 +117,16 @@ class Session(models.Model):
     ended_at    = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # จองเทิร์นที่กำลังประมวลผล (ระหว่างรอ LLM ไม่ถือ row lock) ดู progress.begin_turn
+    turn_token       = models.UUIDField(null=True, blank=True)
+    turn_reserved_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-started_at"]
         indexes = [
             models.Index(fields=["player", "status"]),
             models.Index(fields=["player", "stage_index", "turn"]),
+            models.Index(fields=["started_at"]),   # ผู้เล่นล่าสุดในแดชบอร์ด (ORDER BY started_at DESC LIMIT)
         ]
 
     def __str__(self):
@@ -176,3 +189,62 @@ class EventLog(models.Model):
 
     def __str__(self):
         return f"[{self.ts:%H:%M:%S}] {self.type} S{self.stage_index}T{self.turn} hp={self.hp} mp={self.mp}"
+
+# ---------- JobCursor (ตำแหน่งของงานเบื้องหลังที่รันทีละช่วง) ----------
+class JobCursor(models.Model):
+    """
+    งานที่ไล่ตารางใหญ่ทีละก้อน (เช่น gc_players) เก็บตำแหน่งล่าสุดไว้ที่นี่
+    → หยุด/พังกลางทางแล้วรันต่อจากเดิมได้ ไม่ต้องเริ่มสแกนใหม่
+    position เป็น JSON ให้แต่ละงานเก็บรูปแบบของตัวเอง (เช่น {"last_id": 123})
+    """
+    name       = models.CharField(max_length=64, unique=True)
+    position   = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"JobCursor<{self.name}> {self.position}"
+
+# ---------- Rollups (ตารางสรุปของ native_dashboard) ----------
+# เติมโดย roll/rollups.py (refresh_rollups) ทีละช่วงตาม EventLog.id → แดชบอร์ดอ่านแค่ตารางเล็กๆ เหล่านี้
+# ไม่มี FK ไปที่ Player/Session: ลบผู้เล่น (gc_players) แล้วตัวเลขย้อนหลังยังอยู่เหมือนเดิม
+
+class RollupDaily(models.Model):
+    day       = models.DateField(unique=True)
+    entrants  = models.IntegerField(default=0)   # session_start ในวันนั้น
+    finishers = models.IntegerField(default=0)   # session ที่จบแบบ CLEARED ในวันนั้น
+
+    class Meta:
+        ordering = ["day"]
+
+class RollupStage(models.Model):
+    stage_index     = models.PositiveIntegerField(unique=True)
+    deaths          = models.IntegerField(default=0)
+    spans           = models.IntegerField(default=0)     # จำนวน (session, stage) ที่ใช้เวลา > 0
+    span_seconds    = models.FloatField(default=0.0)     # เวลารวมของ spans ข้างบน
+    active_sessions = models.IntegerField(default=0)     # snapshot จาก Session ตอน refresh ล่าสุด
+
+    class Meta:
+        ordering = ["stage_index"]
+
+class RollupPlayer(models.Model):
+    """ใช้นับผู้เล่นแบบไม่ซ้ำ (entrants / finishers) โดยไม่ต้อง COUNT DISTINCT ทั้ง EventLog"""
+    player_id = models.BigIntegerField(primary_key=True)
+    started   = models.BooleanField(default=False)
+    finished  = models.BooleanField(default=False)
+
+class RollupSpan(models.Model):
+    """ts แรก/ล่าสุดของ (session, stage) ที่ยังเล่นอยู่ — ลบทิ้งเมื่อ session จบ (ค่าถูกรวมเข้า RollupStage แล้ว)"""
+    session_id  = models.UUIDField()
+    stage_index = models.PositiveIntegerField()
+    tmin        = models.DateTimeField()
+    tmax        = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["session_id", "stage_index"], name="uniq_rollupspan_session_stage"),
+        ]
+
+class RollupCounter(models.Model):
+    """ตัวเลขรวมทั้งระบบ (entrants, finishers, death_sessions, death_seconds)"""
+    name  = models.CharField(max_length=32, primary_key=True)
+    value = models.FloatField(default=0.0)
@@ -1,40 +1,79 @@
 # rpg/progress.py  (ของคุณใช้ roll.* ก็ให้คง roll.*)
 from __future__ import annotations
-from typing import Optional, Dict, Any
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, Tuple
+from uuid import UUID, uuid4
 from django.db import transaction
 from django.utils import timezone
-from roll.ai import resolve_effects
+from asgiref.sync import sync_to_async
+from roll.ai import AIResult, resolve_effects, aresolve_effects, stream_effects, astream_effects
 
-from roll.models import EventLog
-from roll.enums import EventType, SessionStatus, ItemCode   # <- ตัด OutcomeType ออก
-from roll.rules import (
-    ITEM_MP_COST, HEAL_HP_AMOUNT,
-    classify_turn, checkpoint_effects, clamp,
-    make_roll, Progress, advance,
-)
+from roll import engine
+from roll.engine import PlayerState, SessionState, TurnStart
+from roll.events import EventBuffer
+from roll.caches import intro_cache, intro_key, session_cache
+from roll.models import Session
+from roll.enums import SessionStatus
+from roll.rules import RollResult
 
-# ---------- utils ----------
+# การจองเทิร์นที่ค้างนานกว่านี้ถือว่าหมดอายุ (เช่น worker ตายระหว่างรอ LLM) ให้เทิร์นใหม่แย่งได้
+TURN_RESERVATION_TTL = timedelta(seconds=120)
 
-def _log(player, session, etype: EventType, *, attrs: Optional[Dict[str, Any]] = None):
-    EventLog.objects.create(
-        ts=timezone.now(),
-        player=player,
-        session=session,
-        type=etype,
-        stage_index=session.stage_index,
-        turn=session.turn,
-        hp=player.hp,
-        mp=player.mp,
-        potions=(player.pot_heal + player.pot_boost),
-        pot_heal_ct=player.pot_heal,
-        pot_boost_ct=player.pot_boost,
-        attrs=(attrs or {}),
-    )
+class TurnConflict(Exception):
+    """มีเทิร์นอื่นของ session นี้กำลังประมวลผลอยู่ หรือ session เล่นต่อไม่ได้แล้ว"""
 
-# ---------- core ----------
+# ---------- persistence ----------
 
-@transaction.atomic
-def resolve_turn(
+def _persist_turn(events: EventBuffer, player, session, *, player_changed: bool, session_fields) -> None:
+    """
+    เขียนผลสุดท้ายของเทิร์นลง DB ทีเดียว:
+    - Player: UPDATE เดียว (ข้ามถ้า state ไม่เปลี่ยนเลย)
+    - Session: UPDATE เดียว เฉพาะฟิลด์ที่เปลี่ยน
+    - EventLog: bulk_create เดียว (snapshot ระหว่างทางถูกเก็บไว้ตั้งแต่ตอน log แล้ว)
+    """
+    if player_changed:
+        player.save(update_fields=[*engine.PLAYER_FIELDS, "updated_at"])
+    session.save(update_fields=[*session_fields, "updated_at"])
+    events.flush()
+
+# ---------- two-phase turn ----------
+# begin_turn   : ล็อกสั้นๆ → ตรวจสถานะ + จองเทิร์น แล้วให้ engine.begin_turn คำนวณ checkpoint/ไอเท็ม/ทอยเต๋า
+# fetch_effects: เรียก LLM โดยไม่เปิด transaction / ไม่ถือ row lock
+# commit_turn  : ล็อกสั้นๆ อีกรอบ → ตรวจว่ายังถือการจองอยู่ → engine.finish_turn + เขียน DB ทีเดียว
+# กติกาทั้งหมดอยู่ใน roll.engine — ไฟล์นี้แค่โหลด state จาก model, เขียนผลกลับ และจัดการ lock/การจอง
+
+@dataclass
+class TurnPlan:
+    token: UUID
+    session: Session
+    player: Any
+    start: TurnStart
+    player_state: PlayerState
+    session_state: SessionState
+    events: EventBuffer
+
+    @property
+    def kind(self) -> str:
+        return self.start.kind
+
+    @property
+    def roll(self) -> RollResult:
+        return self.start.roll
+
+    @property
+    def action_text(self) -> str:
+        return self.start.action_text
+
+# ฟิลด์ที่เทิร์นใช้ — ระบุชื่อตรงๆ เพราะ instance จาก session_cache มีฟิลด์อื่นเป็น deferred
+# (refresh_from_db(fields=None) ไม่โหลด deferred ให้ แล้วจะไป query ทีละฟิลด์ทีหลัง)
+_TURN_SESSION_FIELDS = ["status", "stage_index", "turn", "turn_token", "turn_reserved_at"]
+
+def _lock_session(session, fields=None) -> None:
+    """SELECT ... FOR UPDATE แถว session แล้วอัปเดตค่าลง instance เดิม"""
+    session.refresh_from_db(fields=fields or _TURN_SESSION_FIELDS, from_queryset=Session.objects.select_for_update())
+
+def begin_turn(
     *,
     session,
     player,
@@ -43,156 +82,202 @@ def resolve_turn(
     use_heal: bool = False,
     use_boost: bool = False,
     rng: Optional[object] = None,
-) -> Dict[str, Any]:
+) -> TurnPlan:
+    with transaction.atomic():
+        _lock_session(session)
+        if session.status != SessionStatus.ACTIVE:
+            raise TurnConflict(f"session is not ACTIVE (status={session.status})")
 
-    kind = classify_turn(session.turn)
-
-    if session.turn == 1:
-        _log(player, session, EventType.STAGE_ENTER, attrs={"stage_index": session.stage_index})
-
-    _log(player, session, EventType.TURN_START, attrs={"kind": kind, "action_text": action_text})
-
-    if kind == "CHECKPOINT":
-        heal_full, mp_pct, grant_pots = checkpoint_effects()
-        if heal_full:
-            player.hp = player.HP_MAX
-        if mp_pct > 0:
-            player.mp = clamp(player.mp + int(player.MP_MAX * (mp_pct / 100.0)), 0, player.MP_MAX)
-        if grant_pots > 0:
-            player.pot_heal += grant_pots
-        player.save(update_fields=["hp", "mp", "pot_heal", "updated_at"])
-        _log(player, session, EventType.CHECKPOINT, attrs={
-            "heal_full": heal_full, "mp_pct": mp_pct, "grant_potions": grant_pots
-        })
-
-    boost_applied = False
-    if kind == "FORCED_MP":
-        _log(player, session, EventType.MANA_EVENT_OFFERED, attrs={"requested_mp": int(use_mp)})
-
-    if use_heal and player.pot_heal > 0 and player.mp >= ITEM_MP_COST:
-        player.mp -= ITEM_MP_COST
-        player.pot_heal -= 1
-        player.hp = clamp(player.hp + HEAL_HP_AMOUNT, 0, player.HP_MAX)
-        player.save(update_fields=["hp", "mp", "pot_heal", "updated_at"])
-        _log(player, session, EventType.ITEM_USED, attrs={
-            "item": ItemCode.HEAL, "mp_cost": ITEM_MP_COST, "heal_amount": HEAL_HP_AMOUNT
-        })
-    else:
-        if use_heal and (player.pot_heal <= 0 or player.mp < ITEM_MP_COST):
-            use_heal = False
-
-    if use_boost and player.pot_boost > 0 and player.mp >= ITEM_MP_COST:
-        player.mp -= ITEM_MP_COST
-        player.pot_boost -= 1
-        boost_applied = True
-        player.save(update_fields=["mp", "pot_boost", "updated_at"])
-        _log(player, session, EventType.ITEM_USED, attrs={
-            "item": ItemCode.BOOST, "mp_cost": ITEM_MP_COST, "boost_bonus": 5
-        })
-    else:
-        if use_boost and (player.pot_boost <= 0 or player.mp < ITEM_MP_COST):
-            use_boost = False
-
-    roll = make_roll(
-        turn=session.turn,
-        mp_spent=int(use_mp),
-        boost=bool(boost_applied),
-        available_mp=player.mp,
+        now = timezone.now()
+        if session.turn_token and session.turn_reserved_at and now - session.turn_reserved_at < TURN_RESERVATION_TTL:
+            raise TurnConflict("another turn is already in progress for this session")
+
+        token = uuid4()
+        Session.objects.filter(pk=session.pk).update(turn_token=token, turn_reserved_at=now)
+        session.turn_token, session.turn_reserved_at = token, now
+
+        # state ของผู้เล่นเปลี่ยนได้เฉพาะตอน commit เทิร์น (ซึ่งถือ lock แถว session นี้อยู่)
+        # → อ่านใหม่หลังได้ lock เสมอ ไม่ใช้ค่าที่ view โหลดมาก่อน (อาจมาจาก session_cache หรือเก่ากว่าเทิร์นที่เพิ่ง commit)
+        # (updated_at ด้วย เพราะเป็นส่วนหนึ่งของ ETag ใน snapshot ที่ commit_turn จะเขียนกลับ)
+        player.refresh_from_db(fields=[*engine.PLAYER_FIELDS, "updated_at"])
+
+    # คำนวณ state ทั้งเทิร์นในหน่วยความจำ แล้วค่อยเขียน Player/Session/EventLog ทีเดียวตอน commit_turn
+    # (event แต่ละตัวเก็บ snapshot ณ ตอนเกิด จึงยังได้ค่าระหว่างทางที่ถูกต้อง)
+    player_state, session_state = PlayerState.of(player), SessionState.of(session)
+    start = engine.begin_turn(
+        player_state, session_state,
+        action_text=action_text,
+        use_mp=use_mp,
+        use_heal=use_heal,
+        use_boost=use_boost,
         rng=rng,
     )
+    player_state.apply_to(player)   # narrator ต้องเห็น HP/MP หลัง checkpoint/ใช้ไอเท็มแล้ว
+    events = EventBuffer()
+    events.extend(player, session, start.events)
 
-    ai = resolve_effects(
-        session=session,
-        player=player,
-        roll=roll,
-        action_text=action_text,
-        kind=kind,
+    return TurnPlan(
+        token=token, session=session, player=player, start=start,
+        player_state=player_state, session_state=session_state, events=events,
     )
 
-    # apply เอฟเฟกต์จาก AI
-    player.hp = clamp(player.hp + ai.hp_delta, 0, player.HP_MAX)
-    player.mp = clamp(player.mp + ai.mp_delta, 0, player.MP_MAX)
-    player.pot_heal  += ai.grant_heal
-    player.pot_boost += ai.grant_boost
-    player.save(update_fields=["hp", "mp", "pot_heal", "pot_boost", "updated_at"])
-
-    # หัก MP ที่ใช้บัฟทอย
-    if roll.mp_spent > 0:
-        player.mp = clamp(player.mp - roll.mp_spent, 0, player.MP_MAX)
-        player.save(update_fields=["mp", "updated_at"])
-
-    if kind == "FORCED_MP":
-        if roll.mp_spent > 0:
-            _log(player, session, EventType.MANA_EVENT_ACCEPTED, attrs={"mp_spent": roll.mp_spent})
-        else:
-            _log(player, session, EventType.MANA_EVENT_DECLINED, attrs={"requested_mp": int(use_mp)})
-
-    # << เพิ่มรวมผลจาก AI เข้า attrs เพื่อเก็บ narration/เดลต้าไว้ใน log >>
-    _log(player, session, EventType.ACTION_RESULT, attrs={
-        "action_text": action_text,
-        "dice_roll": roll.dice_roll,
-        "mp_spent_roll": roll.mp_spent,
-        "mp_bonus": roll.mp_bonus,
-        "boost_applied": roll.boost_applied,
-        "boost_bonus": roll.boost_bonus,
-        "total_roll": roll.total_roll,
-        "outcome": roll.tier,
-        **ai.to_attrs(),  # <--- สำคัญ
-    })
-
-    if player.hp <= 0:
-        session.status = SessionStatus.DEAD
-        session.ended_at = timezone.now()
-        session.save(update_fields=["status", "ended_at", "updated_at"])
-        _log(player, session, EventType.DEATH, attrs={"reason": "hp<=0"})
-        _log(player, session, EventType.SESSION_END, attrs={"status": SessionStatus.DEAD})
-        _log(player, session, EventType.TURN_END)
-        return {
-            "kind": kind,
-            "roll": roll,
-            "narration": ai.narration,    # <--- ส่งกลับให้ UI ใช้
-            "dead": True,
-            "cleared_stage": False,
-            "cleared_game": False,
-        }
-
-    adv = advance(Progress(session.stage_index, session.turn))
-    cleared_stage = adv.cleared_stage
-    cleared_game = adv.cleared_game
-
-    if cleared_stage:
-        _log(player, session, EventType.STAGE_CLEAR, attrs={"stage_index": session.stage_index})
-
-    if cleared_game:
-        session.status = SessionStatus.CLEARED
+def fetch_effects(plan: TurnPlan) -> AIResult:
+    """เรียก narrator (LLM หรือ baseline) — ต้องเรียกนอก transaction เพื่อไม่ถือ lock ระหว่างรอ"""
+    return resolve_effects(
+        session=plan.session,
+        player=plan.player,
+        roll=plan.roll,
+        action_text=plan.action_text,
+        kind=plan.kind,
+    )
+
+async def afetch_effects(plan: TurnPlan) -> AIResult:
+    """เวอร์ชัน async ของ fetch_effects (รอ LLM บน event loop แทนการบล็อก thread)"""
+    return await aresolve_effects(
+        session=plan.session,
+        player=plan.player,
+        roll=plan.roll,
+        action_text=plan.action_text,
+        kind=plan.kind,
+    )
+
+def stream_fetch_effects(plan: TurnPlan) -> Iterator[Tuple[str, Any]]:
+    """fetch_effects แบบ streaming: yield ("narration", ข้อความ) ... แล้วปิดท้ายด้วย ("effects", AIResult)"""
+    return stream_effects(
+        session=plan.session,
+        player=plan.player,
+        roll=plan.roll,
+        action_text=plan.action_text,
+        kind=plan.kind,
+    )
+
+def astream_fetch_effects(plan: TurnPlan) -> AsyncIterator[Tuple[str, Any]]:
+    """เวอร์ชัน async ของ stream_fetch_effects"""
+    return astream_effects(
+        session=plan.session,
+        player=plan.player,
+        roll=plan.roll,
+        action_text=plan.action_text,
+        kind=plan.kind,
+    )
+
+def release_turn(plan: TurnPlan) -> None:
+    """ยกเลิกการจองเทิร์น (เช่น narrator พังแบบไม่คาดคิด) ให้ผู้เล่นกดใหม่ได้ทันที"""
+    Session.objects.filter(pk=plan.session.pk, turn_token=plan.token).update(
+        turn_token=None, turn_reserved_at=None
+    )
+
+def commit_turn(plan: TurnPlan, ai: AIResult) -> Dict[str, Any]:
+    """
+    เขียนผลเทิร์นลง DB (ดู _commit_turn)
+    ถ้าเขียนไม่สำเร็จ (เช่น DB error) transaction ถูก rollback แต่การจองจาก begin_turn ยังค้าง
+    → ปล่อยการจองทิ้ง ไม่งั้นผู้เล่นจะโดน 409 ไปจนครบ TURN_RESERVATION_TTL
+    """
+    try:
+        return _commit_turn(plan, ai)
+    except Exception:
+        release_turn(plan)   # TurnConflict: token ไม่ตรงแล้ว ไม่มีผลอะไร
+        raise
+
+@transaction.atomic
+def _commit_turn(plan: TurnPlan, ai: AIResult) -> Dict[str, Any]:
+    session, player, events = plan.session, plan.player, plan.events
+
+    _lock_session(session, fields=["turn_token", "status"])
+    if session.turn_token != plan.token:
+        raise TurnConflict("turn reservation expired or was taken by another request")
+    if session.status != SessionStatus.ACTIVE:
+        raise TurnConflict(f"session is not ACTIVE (status={session.status})")
+    session.turn_token = None
+    session.turn_reserved_at = None
+    reservation_fields = ["turn_token", "turn_reserved_at"]
+
+    # ตำแหน่งเดิมจะไม่ถูกใช้อีกหลังเทิร์นนี้ → ทิ้ง intro ที่ cache ไว้เมื่อ commit สำเร็จ
+    old_intro_key = intro_key(session)
+    transaction.on_commit(lambda: intro_cache.pop(old_intro_key))
+    transaction.on_commit(lambda: session_cache.store(session, player))   # write-through (จบเกม → tombstone)
+
+    outcome = engine.finish_turn(plan.player_state, plan.session_state, plan.start, ai, attrs=ai.to_attrs())
+    plan.player_state.apply_to(player)
+    plan.session_state.apply_to(session)
+    events.extend(player, session, outcome.events[len(plan.start.events):])
+
+    if outcome.ended:
         session.ended_at = timezone.now()
-        session.save(update_fields=["status", "ended_at", "updated_at"])
-        _log(player, session, EventType.CLEAR_GAME)
-        _log(player, session, EventType.SESSION_END, attrs={"status": SessionStatus.CLEARED})
-        _log(player, session, EventType.TURN_END)
-        return {
-            "kind": kind,
-            "roll": roll,
-            "narration": ai.narration,    # <--- ส่งกลับให้ UI ใช้
-            "dead": False,
-            "cleared_stage": True,
-            "cleared_game": True,
-        }
-
-    session.stage_index = adv.progress.stage_index
-    session.turn = adv.progress.turn
-    session.save(update_fields=["stage_index", "turn", "updated_at"])
-
-    if cleared_stage and session.turn == 1:
-        _log(player, session, EventType.STAGE_ENTER, attrs={"stage_index": session.stage_index})
-
-    _log(player, session, EventType.TURN_END)
+        session_fields = ["status", "ended_at"]
+    else:
+        session_fields = ["stage_index", "turn"]
+    _persist_turn(events, player, session, player_changed=bool(outcome.player_delta),
+                  session_fields=[*session_fields, *reservation_fields])
 
     return {
-        "kind": kind,
-        "roll": roll,
+        "kind": outcome.kind,
+        "roll": outcome.roll,
         "narration": ai.narration,        # <--- ส่งกลับให้ UI ใช้
-        "dead": False,
-        "cleared_stage": cleared_stage,
-        "cleared_game": False,
+        "dead": outcome.dead,
+        "cleared_stage": outcome.cleared_stage,
+        "cleared_game": outcome.cleared_game,
     }
+
+# ---------- core ----------
+
+def resolve_turn(
+    *,
+    session,
+    player,
+    action_text: str,
+    use_mp: int = 0,
+    use_heal: bool = False,
+    use_boost: bool = False,
+    rng: Optional[object] = None,
+) -> Dict[str, Any]:
+    """
+    เล่น 1 เทิร์นครบวงจร: begin_turn → fetch_effects → commit_turn
+    - อย่าเรียกภายใน transaction.atomic() ของผู้เรียก ไม่งั้น lock จะถูกถือไว้ระหว่างรอ LLM อีก
+    - ถ้ามีเทิร์นอื่นของ session เดียวกันกำลังทำอยู่ จะ raise TurnConflict
+    """
+    plan = begin_turn(
+        session=session,
+        player=player,
+        action_text=action_text,
+        use_mp=use_mp,
+        use_heal=use_heal,
+        use_boost=use_boost,
+        rng=rng,
+    )
+    try:
+        ai = fetch_effects(plan)
+    except Exception:
+        release_turn(plan)
+        raise
+    return commit_turn(plan, ai)
+
+async def aresolve_turn(
+    *,
+    session,
+    player,
+    action_text: str,
+    use_mp: int = 0,
+    use_heal: bool = False,
+    use_boost: bool = False,
+    rng: Optional[object] = None,
+) -> Dict[str, Any]:
+    """
+    resolve_turn สำหรับ view แบบ async:
+    ช่วงที่แตะ DB (begin/commit) สั้นและรันผ่าน sync_to_async ส่วนช่วงรอ LLM เป็น await ล้วน
+    """
+    plan = await sync_to_async(begin_turn)(
+        session=session,
+        player=player,
+        action_text=action_text,
+        use_mp=use_mp,
+        use_heal=use_heal,
+        use_boost=use_boost,
+        rng=rng,
+    )
+    try:
+        ai = await afetch_effects(plan)
+    except BaseException:
+        await sync_to_async(release_turn)(plan)
+        raise
+    return await sync_to_async(commit_turn)(plan, ai)
@@ -0,0 +1,320 @@
+# roll/replay.py
+# เล่น session ซ้ำจาก EventLog แบบ deterministic — ไม่เรียก LLM ไม่เขียน DB
+# - อ่าน event ของ session ตามลำดับ (ts, id) แล้วแยกเป็นเทิร์น (จบที่ TURN_END)
+# - input ของแต่ละเทิร์นดึงจาก log: action_text, MP ที่ขอ (MANA_EVENT_OFFERED), ไอเท็มที่ใช้ (ITEM_USED),
+#   เต๋า (ACTION_RESULT.dice_roll) และเดลต้าจาก AI (ACTION_RESULT.hp_delta/...)
+# - รันเทิร์นใหม่ผ่าน roll.engine (ตัวเดียวกับที่ progress ใช้ตอนเล่นจริง) แล้วเทียบ event + snapshot ทีละแถว
+#
+# effects:
+#   "recorded" : ใช้เดลต้าจาก AI ที่บันทึกไว้ → ต้องได้ผลตรงกับ log ทุกแถว (ใช้ตรวจว่า log/กติกายังสอดคล้องกัน)
+#   "baseline" : ใช้ rules.BASELINE_TIER_EFFECTS ตาม tier ที่คำนวณใหม่ → ใช้จำลองซ้ำหลังแก้ rules.py
+#                (เต๋าและการตัดสินใจของผู้เล่นเหมือนเดิม แต่ผลอาจแยกทางจาก log ได้)
+#
+# ตัว replay รับ/คืนแค่ dict ธรรมดาและไม่ import Django → ส่งข้าม process ได้ (replay_many ใช้ ProcessPoolExecutor)
+# ส่วนที่อ่าน DB (iter_session_events) import models ตอนเรียกเท่านั้น
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from roll import engine, rules
+from roll.engine import Effects, PlayerState, SessionState
+from roll.enums import EventType, ItemCode, SessionStatus
+
+EFFECTS_MODES = ("recorded", "baseline")
+
+# คอลัมน์ของ EventLog ที่ replay ใช้ (ผ่าน .values())
+EVENT_FIELDS = ("session_id", "type", "stage_index", "turn", "hp", "mp", "pot_heal_ct", "pot_boost_ct", "attrs")
+
+# ค่าในผลทอยที่ต้องตรงกับ ACTION_RESULT ที่บันทึกไว้
+_ROLL_ATTRS = ("dice_roll", "mp_spent_roll", "mp_bonus", "boost_applied", "boost_bonus", "total_roll", "outcome")
+_EFFECT_KEYS = ("hp_delta", "mp_delta", "grant_heal", "grant_boost")
+
+class ReplayError(ValueError):
+    """log ของ session ไม่ครบ/ผิดรูปจนเล่นซ้ำไม่ได้"""
+
+# ---------- rng ----------
+
+class FixedDice:
+    """rng สำหรับ rules.make_roll ที่คืนหน้าเต๋าตามที่บันทึกไว้แทนการสุ่ม"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
+        self.value = int(value)
+
+    def randint(self, a: int, b: int) -> int:
+        return self.value
+
+# ---------- state ----------
+
+def _snapshot_of(ev: Dict[str, Any]) -> Tuple:
+    return (ev["type"], ev["stage_index"], ev["turn"], ev["hp"], ev["mp"], ev["pot_heal_ct"], ev["pot_boost_ct"])
+
+# ---------- แยกเทิร์นจาก log ----------
+
+@dataclass
+class TurnInput:
+    action_text: str
+    use_mp: int
+    use_heal: bool
+    use_boost: bool
+    dice_roll: int
+    effects: Dict[str, int]
+    recorded_roll: Dict[str, Any]
+    events: List[Dict[str, Any]] = field(repr=False)
+
+def _turn_input(events: List[Dict[str, Any]]) -> TurnInput:
+    start = result = None
+    use_mp, use_heal, use_boost = 0, False, False
+    for ev in events:
+        t, attrs = ev["type"], ev["attrs"] or {}
+        if t == EventType.TURN_START:
+            start = attrs
+        elif t == EventType.MANA_EVENT_OFFERED:
+            use_mp = int(attrs.get("requested_mp") or 0)
+        elif t == EventType.ITEM_USED:
+            if attrs.get("item") == ItemCode.HEAL:
+                use_heal = True
+            elif attrs.get("item") == ItemCode.BOOST:
+                use_boost = True
+        elif t == EventType.ACTION_RESULT:
+            result = attrs
+    if start is None or result is None:
+        raise ReplayError(f"turn at stage {events[0]['stage_index']} turn {events[0]['turn']} "
+                          f"has no {'turn_start' if start is None else 'action_result'} event")
+    return TurnInput(
+        action_text=start.get("action_text") or result.get("action_text") or "",
+        use_mp=use_mp,
+        use_heal=use_heal,
+        use_boost=use_boost,
+        dice_roll=int(result["dice_roll"]),
+        effects={k: int(result.get(k) or 0) for k in _EFFECT_KEYS},
+        recorded_roll={k: result.get(k) for k in _ROLL_ATTRS},
+        events=events,
+    )
+
+def split_turns(events: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], List[TurnInput], Optional[str]]:
+    """
+    คืน (event SESSION_START, เทิร์นที่เล่นจบแล้วตามลำดับ, สถานะจาก SESSION_END นอกเทิร์น เช่น ESCAPED)
+    event ของเทิร์นหนึ่งถูก flush พร้อมกันตอน commit → เทิร์นที่ไม่มี TURN_END ถือว่า log ขาด
+    """
+    start, turns, ended = None, [], None
+    bucket: List[Dict[str, Any]] = []
+    for ev in events:
+        t = ev["type"]
+        if t == EventType.SESSION_START and not bucket:
+            start = ev
+        elif t == EventType.SESSION_END and not bucket:
+            ended = (ev["attrs"] or {}).get("status")
+        else:
+            bucket.append(ev)
+            if t == EventType.TURN_END:
+                turns.append(_turn_input(bucket))
+                bucket = []
+    if bucket:
+        raise ReplayError(f"incomplete turn at stage {bucket[0]['stage_index']} turn {bucket[0]['turn']} "
+                          f"({len(bucket)} events without turn_end)")
+    return start, turns, ended
+
+# ---------- เล่นเทิร์นซ้ำด้วย roll.engine (กติกาเดียวกับตอนเล่นจริง) ----------
+
+def _play_turn(player: PlayerState, session: SessionState, inp: TurnInput, *, effects: str) -> engine.TurnOutcome:
+    start = engine.begin_turn(player, session, action_text=inp.action_text, use_mp=inp.use_mp,
+                              use_heal=inp.use_heal, use_boost=inp.use_boost, rng=FixedDice(inp.dice_roll))
+    fx = Effects(**inp.effects) if effects == "recorded" else Effects.for_tier(start.roll.tier)
+    return engine.finish_turn(player, session, start, fx)
+
+def _roll_attrs(roll: rules.RollResult) -> Dict[str, Any]:
+    return {
+        "dice_roll": roll.dice_roll, "mp_spent_roll": roll.mp_spent, "mp_bonus": roll.mp_bonus,
+        "boost_applied": roll.boost_applied, "boost_bonus": roll.boost_bonus,
+        "total_roll": roll.total_roll, "outcome": roll.tier,
+    }
+
+# ---------- replay ทั้ง session ----------
+
+@dataclass
+class ReplayResult:
+    session_id: str
+    effects: str
+    ok: bool
+    turns: int                          # จำนวนเทิร์นที่เล่นซ้ำ
+    turns_recorded: int
+    status: str
+    stage_index: int
+    turn: int
+    hp: int
+    mp: int
+    pot_heal: int
+    pot_boost: int
+    recorded: Dict[str, Any]            # ผลสุดท้ายตาม log/Session
+    tiers_changed: int = 0              # เทิร์นที่ tier ต่างจาก log (baseline หลังแก้ rules)
+    divergence: Optional[Dict[str, Any]] = None   # จุดแรกที่ไม่ตรงกับ log
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def replay_session(payload: Dict[str, Any], *, effects: str = "recorded") -> ReplayResult:
+    """
+    payload = {"session_id", "events": [dict ตาม EVENT_FIELDS เรียง ts,id], "session": {"status","stage_index","turn"}}
+    (ได้จาก iter_session_events) — ok=True เมื่อ event/snapshot ทุกแถวและสถานะสุดท้ายตรงกับที่บันทึก
+    """
+    if effects not in EFFECTS_MODES:
+        raise ValueError(f"effects must be one of {EFFECTS_MODES}, got {effects!r}")
+    sid = str(payload["session_id"])
+    events = payload["events"]
+    recorded_session = payload.get("session") or {}
+
+    def failed(msg: str) -> ReplayResult:
+        return ReplayResult(session_id=sid, effects=effects, ok=False, turns=0, turns_recorded=0,
+                            status="", stage_index=0, turn=0, hp=0, mp=0, pot_heal=0, pot_boost=0,
+                            recorded=dict(recorded_session), error=msg)
+
+    if not events:
+        return failed("no events")
+    try:
+        start, turns, ended = split_turns(events)
+    except (ReplayError, KeyError, TypeError, ValueError) as e:
+        return failed(f"{type(e).__name__}: {e}")
+
+    # state เริ่มต้น = snapshot ตอนเปิด session (HP/MP/potion ติดตัวมาจากรอบก่อน)
+    first = start or events[0]
+    player = PlayerState(first["hp"], first["mp"], first["pot_heal_ct"], first["pot_boost_ct"])
+    st = SessionState(first["stage_index"], first["turn"])
+
+    divergence = None
+    tiers_changed = played = 0
+    for n, inp in enumerate(turns, start=1):
+        if st.status != SessionStatus.ACTIVE:
+            break   # ผลใหม่จบเกมเร็วกว่าที่บันทึกไว้
+        at = (st.stage_index, st.turn)
+        out = _play_turn(player, st, inp, effects=effects)
+        played += 1
+        if out.roll.tier != inp.recorded_roll.get("outcome"):
+            tiers_changed += 1
+        if divergence is None:
+            divergence = _first_divergence(n, at, inp, [ev.snapshot() for ev in out.events], _roll_attrs(out.roll))
+
+    last = events[-1]
+    if st.status == SessionStatus.ACTIVE and ended and played == len(turns):
+        st.status = ended   # ผู้เล่นกดจบ (ESCAPED) ณ จุดเดียวกัน
+    recorded = {
+        "status": recorded_session.get("status", ended or ""),
+        "stage_index": recorded_session.get("stage_index", last["stage_index"]),
+        "turn": recorded_session.get("turn", last["turn"]),
+        "hp": last["hp"], "mp": last["mp"], "pot_heal": last["pot_heal_ct"], "pot_boost": last["pot_boost_ct"],
+    }
+    final = {"status": str(st.status), "stage_index": st.stage_index, "turn": st.turn,
+             "hp": player.hp, "mp": player.mp, "pot_heal": player.pot_heal, "pot_boost": player.pot_boost}
+    if divergence is None:
+        diff = {k: (recorded[k], final[k]) for k in final if recorded[k] != final[k]}
+        if diff:
+            divergence = {"turn_no": played, "final": diff}
+
+    return ReplayResult(
+        session_id=sid, effects=effects, ok=divergence is None,
+        turns=played, turns_recorded=len(turns), recorded=recorded,
+        tiers_changed=tiers_changed, divergence=divergence, **final,
+    )
+
+def _first_divergence(n: int, at: Tuple[int, int], inp: TurnInput, replayed: List[Tuple],
+                      roll: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    where = {"turn_no": n, "stage_index": at[0], "turn": at[1]}
+    if roll != inp.recorded_roll:
+        diff = {k: (inp.recorded_roll.get(k), v) for k, v in roll.items() if inp.recorded_roll.get(k) != v}
+        return {**where, "roll": diff}
+    recorded = [_snapshot_of(ev) for ev in inp.events]
+    for i in range(max(len(recorded), len(replayed))):
+        a = recorded[i] if i < len(recorded) else None
+        b = replayed[i] if i < len(replayed) else None
+        if a != b:
+            return {**where, "event": i, "recorded": a, "replayed": b}
+    return None
+
+def _replay_chunk(args: Tuple[List[Dict[str, Any]], str]) -> List[Dict[str, Any]]:
+    payloads, effects = args
+    return [replay_session(p, effects=effects).to_dict() for p in payloads]
+
+def replay_many(
+    payloads: Iterable[Dict[str, Any]],
+    *,
+    effects: str = "recorded",
+    workers: Optional[int] = None,
+    chunk_size: int = 200,
+) -> Iterator[Dict[str, Any]]:
+    """
+    เล่นซ้ำหลาย session ขนานกันหลาย core (ส่งเป็นก้อนละ chunk_size session ลด overhead ของ pickle)
+    - workers=1 รันใน process เดียว (debug ง่าย)
+    - ผลออกมาตามลำดับ payload ที่ส่งเข้า (เป็น dict ของ ReplayResult)
+    - payloads เป็น iterator ได้ ไม่ต้องโหลดทุก session ไว้ในหน่วยความจำพร้อมกัน
+    """
+    if effects not in EFFECTS_MODES:
+        raise ValueError(f"effects must be one of {EFFECTS_MODES}, got {effects!r}")
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(payloads, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _replay_chunk((chunk, effects))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map กิน iterator ทั้งก้อนตอนเรียก → ส่งทีละรอบไม่เกิน workers*2 ก้อนเพื่อคุมหน่วยความจำ
+        window = workers * 2
+        pending: List = []
+        for chunk in chunks:
+            pending.append(pool.submit(_replay_chunk, (chunk, effects)))
+            if len(pending) >= window:
+                yield from pending.pop(0).result()
+        for fut in pending:
+            yield from fut.result()
+
+def _chunked(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# ---------- โหลดจาก DB ----------
+
+def iter_session_events(sessions, *, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    sessions = QuerySet ของ Session (กรอง/limit มาแล้ว) → yield payload ทีละ session สำหรับ replay_session
+    เรียงตาม started_at ให้ถ้ายังไม่ได้ slice (queryset ที่ slice แล้ว order_by ซ้ำไม่ได้ → ใช้ลำดับของผู้เรียก)
+    อ่านทีละ batch_size session: 1 query สำหรับ id/สถานะ + 1 query สำหรับ event ทั้ง batch
+    """
+    from roll.models import EventLog   # import ตอนเรียก: worker process ของ replay_many ไม่ต้องตั้ง Django
+
+    if not sessions.query.is_sliced:
+        sessions = sessions.order_by("started_at", "id")
+    rows = sessions.values_list("id", "status", "stage_index", "turn")
+    batch: List[Tuple] = []
+
+    def flush(batch):
+        ids = [r[0] for r in batch]
+        grouped: Dict[Any, List[Dict[str, Any]]] = {sid: [] for sid in ids}
+        qs = (EventLog.objects.filter(session_id__in=ids)
+              .order_by("session_id", "ts", "id").values(*EVENT_FIELDS))
+        for ev in qs:
+            grouped[ev["session_id"]].append(ev)
+        for sid, status, stage_index, turn in batch:
+            events = grouped[sid]
+            for ev in events:
+                ev["session_id"] = str(ev["session_id"])
+            yield {
+                "session_id": str(sid),
+                "events": events,
+                "session": {"status": status, "stage_index": stage_index, "turn": turn},
+            }
+
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+    if batch:
+        yield from flush(batch)
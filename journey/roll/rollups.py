@@ -0,0 +1,223 @@
+# roll/rollups.py
+# ตารางสรุปของ native_dashboard — อัปเดตทีละช่วงจาก EventLog ตาม watermark (EventLog.id ใน JobCursor "rollups")
+# - EventLog เป็น append-only และ id เพิ่มขึ้นเรื่อยๆ → แต่ละรอบอ่านเฉพาะแถวใหม่ (id > last_id) ตาม PK
+# - แต่ละก้อน: อัปเดต rollup + ขยับ cursor ใน transaction เดียว (ล็อกแถว cursor) → นับครั้งเดียวเสมอ รันซ้อนกันก็ไม่นับซ้ำ
+# - แดชบอร์ดอ่านแค่ RollupCounter/RollupDaily/RollupStage → ต้นทุนไม่ขึ้นกับขนาด EventLog
+#
+# ใช้:
+#   from roll import rollups
+#   rollups.refresh()            # (cron ทุกนาที ผ่าน manage.py refresh_rollups)
+#   rollups.rebuild()            # ล้างแล้วคำนวณใหม่ทั้งหมด (เช่น หลังแก้นิยามตัวเลข)
+from __future__ import annotations
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from roll.enums import EventType, SessionStatus
+from roll.models import (
+    EventLog, JobCursor, Session,
+    RollupCounter, RollupDaily, RollupPlayer, RollupSpan, RollupStage,
+)
+
+CURSOR_NAME = "rollups"
+COUNTERS = ("entrants", "finishers", "death_sessions", "death_seconds")
+_EVENT_FIELDS = ("id", "ts", "player_id", "session_id", "type", "stage_index", "attrs")
+
+# ---------- helpers ----------
+
+def _bump(model, lookup: Dict[str, Any], **deltas) -> None:
+    """UPDATE ... SET x = x + delta (สร้างแถวก่อนถ้ายังไม่มี) — rollup มีผู้เขียนคนเดียวคือ job นี้"""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(**{k: F(k) + v for k, v in deltas.items()})
+
+def _seconds(span: RollupSpan) -> float:
+    return (span.tmax - span.tmin).total_seconds()
+
+# ---------- apply ----------
+
+def apply_events(rows: List[Dict[str, Any]]) -> None:
+    """
+    รวม EventLog หนึ่งก้อน (dict จาก .values(), เรียงตาม id) เข้า rollup — ต้องเรียกใน transaction
+    นิยามตัวเลขเหมือนที่แดชบอร์ดเดิมคำนวณสดจาก EventLog:
+      entrants        = ผู้เล่นไม่ซ้ำที่มี session_start     | daily entrants  = session_start ต่อวัน
+      finishers       = ผู้เล่นไม่ซ้ำที่มี session จบแบบ CLEARED | daily finishers = session CLEARED ต่อวัน
+      stage time      = เฉลี่ยของ (ts ล่าสุด - ts แรก) ต่อ (session, stage) เฉพาะที่ > 0
+      time to death   = death - session_start ของ session เดียวกัน
+    """
+    daily = defaultdict(lambda: [0, 0])          # day -> [entrants, finishers]
+    stage_deaths = defaultdict(int)
+    counters = defaultdict(float)
+    starters, clearers, ended, died = set(), set(), set(), set()
+
+    session_ids = {r["session_id"] for r in rows}
+    spans = {(s.session_id, s.stage_index): s for s in RollupSpan.objects.filter(session_id__in=session_ids)}
+    before = {key: _seconds(s) for key, s in spans.items()}
+    touched = set()
+
+    for r in rows:
+        ts, sid, stage, etype = r["ts"], r["session_id"], r["stage_index"], r["type"]
+        key = (sid, stage)
+        span = spans.get(key)
+        if span is None:
+            spans[key] = RollupSpan(session_id=sid, stage_index=stage, tmin=ts, tmax=ts)
+        else:
+            span.tmin, span.tmax = min(span.tmin, ts), max(span.tmax, ts)
+        touched.add(key)
+
+        if etype == EventType.SESSION_START:
+            daily[timezone.localdate(ts)][0] += 1
+            starters.add(r["player_id"])
+        elif etype == EventType.DEATH:
+            stage_deaths[stage] += 1
+            # session_start เป็น event แรกของ session เสมอ (สร้างใน transaction เดียวกับ Session) → tmin ของ stage 1
+            first = spans.get((sid, 1))
+            if first is not None and sid not in died:
+                died.add(sid)
+                counters["death_sessions"] += 1
+                counters["death_seconds"] += (ts - first.tmin).total_seconds()
+        elif etype == EventType.SESSION_END:
+            ended.add(sid)
+            if (r["attrs"] or {}).get("status") == SessionStatus.CLEARED:
+                daily[timezone.localdate(ts)][1] += 1
+                clearers.add(r["player_id"])
+
+    # เวลาต่อ stage: บวกเฉพาะส่วนต่างของ span ที่เปลี่ยนในก้อนนี้
+    stage_spans = defaultdict(lambda: [0, 0.0])  # stage -> [spans, seconds]
+    for key in touched:
+        old, new = before.get(key, 0.0), _seconds(spans[key])
+        stage_spans[key[1]][0] += (new > 0) - (old > 0)
+        stage_spans[key[1]][1] += new - old
+
+    # span ของ session ที่จบแล้วไม่เปลี่ยนอีก → ทิ้ง เก็บไว้เฉพาะของ session ที่ยังเล่นอยู่
+    RollupSpan.objects.filter(session_id__in=ended).delete()
+    live = [spans[key] for key in touched if key[0] not in ended]
+    RollupSpan.objects.bulk_create([s for s in live if s.pk is None])
+    RollupSpan.objects.bulk_update([s for s in live if s.pk is not None], ["tmin", "tmax"])
+
+    # ผู้เล่นไม่ซ้ำ
+    if starters or clearers:
+        known = {p.player_id: p for p in RollupPlayer.objects.filter(player_id__in=starters | clearers)}
+        new_rows, changed = [], []
+        for pid in starters | clearers:
+            p = known.get(pid)
+            if p is None:
+                p = RollupPlayer(player_id=pid)
+                new_rows.append(p)
+            elif (pid in starters and not p.started) or (pid in clearers and not p.finished):
+                changed.append(p)
+            if pid in starters and not p.started:
+                p.started = True
+                counters["entrants"] += 1
+            if pid in clearers and not p.finished:
+                p.finished = True
+                counters["finishers"] += 1
+        RollupPlayer.objects.bulk_create(new_rows)
+        RollupPlayer.objects.bulk_update(changed, ["started", "finished"])
+
+    for day, (ent, fin) in daily.items():
+        _bump(RollupDaily, {"day": day}, entrants=ent, finishers=fin)
+    for stage in set(stage_deaths) | set(stage_spans):
+        n, secs = stage_spans.get(stage, (0, 0.0))
+        _bump(RollupStage, {"stage_index": stage}, deaths=stage_deaths.get(stage, 0), spans=n, span_seconds=secs)
+    for name, value in counters.items():
+        _bump(RollupCounter, {"name": name}, value=value)
+
+def prune_spans() -> int:
+    """
+    ลบ RollupSpan ของ session ที่ถูกลบไปแล้ว (gc_players) หรือไม่ ACTIVE แล้วแต่ไม่มี session_end ให้ apply_events ลบ
+    (เช่น แก้สถานะผ่าน admin) — ไม่งั้นตารางนี้โตไปเรื่อยๆ
+    เว้นไว้ถ้ายังมี EventLog ของ session นั้นที่ id > cursor: span ยังต้องใช้ตอนรวมแถวพวกนั้น
+    """
+    with transaction.atomic():
+        cursor = JobCursor.objects.select_for_update().filter(name=CURSOR_NAME).first()
+        last_id = int(cursor.position.get("last_id", 0)) if cursor else 0
+        stale = set(
+            RollupSpan.objects.exclude(
+                session_id__in=Session.objects.filter(status=SessionStatus.ACTIVE).values("pk")
+            ).values_list("session_id", flat=True)
+        )
+        if not stale:
+            return 0
+        pending = set(EventLog.objects.filter(id__gt=last_id, session_id__in=stale).values_list("session_id", flat=True))
+        deleted, _ = RollupSpan.objects.filter(session_id__in=stale - pending).delete()
+    return deleted
+
+def snapshot_active_stages() -> None:
+    """จำนวน session ACTIVE ต่อ stage (สถานะปัจจุบัน ไม่ได้มาจาก log) — นับผ่าน index ของ status เฉพาะแถวที่ยังเล่นอยู่"""
+    counts = dict(
+        Session.objects.filter(status=SessionStatus.ACTIVE)
+        .values_list("stage_index").annotate(c=Count("id")).order_by()
+    )
+    with transaction.atomic():
+        RollupStage.objects.exclude(stage_index__in=counts).update(active_sessions=0)
+        for stage, c in counts.items():
+            RollupStage.objects.update_or_create(stage_index=stage, defaults={"active_sessions": c})
+
+# ---------- job ----------
+
+def refresh(*, batch_size: int = 5000, max_batches: Optional[int] = None, settle: float = 2.0) -> Dict[str, Any]:
+    """
+    รวม EventLog ที่ยังไม่ได้รวมทีละ batch_size แถว, ลบ RollupSpan ที่ค้าง แล้วอัปเดต snapshot ACTIVE ต่อ stage
+    settle: อ่าน max(id) ก่อนแล้วรอสักครู่ค่อยรวมถึง id นั้น — INSERT ที่ได้ id น้อยกว่าแต่ยังไม่ commit
+            (transaction ของเทิร์นสั้นมาก flush เป็นขั้นสุดท้าย) จะ commit ทันก่อน ไม่ถูกข้ามไปตลอดกาล
+    """
+    horizon = EventLog.objects.aggregate(m=Max("id"))["m"] or 0
+    if settle:
+        time.sleep(settle)
+    JobCursor.objects.get_or_create(name=CURSOR_NAME)
+
+    started = time.perf_counter()
+    batches = events = 0
+    last_id = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            cursor = JobCursor.objects.select_for_update().get(name=CURSOR_NAME)
+            last_id = int(cursor.position.get("last_id", 0))
+            rows = list(
+                EventLog.objects.filter(id__gt=last_id, id__lte=horizon)
+                .order_by("id").values(*_EVENT_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            apply_events(rows)
+            last_id = rows[-1]["id"]
+            cursor.position = {**cursor.position, "last_id": last_id}
+            cursor.save(update_fields=["position", "updated_at"])
+        batches += 1
+        events += len(rows)
+
+    pruned = prune_spans()
+    snapshot_active_stages()
+    return {
+        "batches": batches,
+        "events": events,
+        "pruned_spans": pruned,
+        "last_id": last_id,
+        "horizon": horizon,
+        "caught_up": last_id >= horizon,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+def rebuild(**kwargs) -> Dict[str, Any]:
+    """ล้าง rollup + cursor แล้ว refresh ใหม่ตั้งแต่ EventLog แถวแรก"""
+    with transaction.atomic():
+        JobCursor.objects.select_for_update().filter(name=CURSOR_NAME).delete()
+        for model in (RollupDaily, RollupStage, RollupPlayer, RollupSpan, RollupCounter):
+            model.objects.all().delete()
+    return refresh(**kwargs)
+
+# ---------- read (native_dashboard) ----------
+
+def counters() -> Dict[str, float]:
+    values = dict(RollupCounter.objects.values_list("name", "value"))
+    return {name: values.get(name, 0.0) for name in COUNTERS}
+
+def last_refreshed_at():
+    return JobCursor.objects.filter(name=CURSOR_NAME).values_list("updated_at", flat=True).first()
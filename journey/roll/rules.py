@@ -1,8 +1,9 @@
 # rpg/rules.py
 from __future__ import annotations
 from dataclasses import dataclass
+from fractions import Fraction
 import random
-from typing import Literal, Tuple, Optional
+from typing import Dict, Literal, Tuple, Optional
 
 # -----------------------------
 # ค่าคงที่ของเกม (แก้ได้จุดเดียว)
@@ -17,6 +18,10 @@ DICE_MIN, DICE_MAX = 1, 20
 MP_BONUS_PER_POINT = 5              # ใช้ MP 1 = +5 แต้มทอย
 BOOST_ROLL_BONUS   = 5              # ใช้ไอเท็ม BOOST ได้ +5 แต้มทอย (ต่อเทิร์น)
 
+# ค่าสูงสุดของผู้เล่น (models.Player.HP_MAX/MP_MAX อ้างจากตรงนี้)
+PLAYER_HP_MAX = 30
+PLAYER_MP_MAX = 10
+
 ITEM_MP_COST   = 1                  # ใช้ไอเท็ม เสีย MP 1
 HEAL_HP_AMOUNT = 10                 # ใช้ HEAL ได้ +10 HP
 
@@ -29,6 +34,14 @@ OUTCOME_BOUNDS = {
     "great":   (18, 20),
 }
 
+# ผลของแต่ละ tier เมื่อไม่มี AI (ai.baseline_from_tier และ roll/simulate.py ใช้ตารางเดียวกัน)
+BASELINE_TIER_EFFECTS = {
+    "fail":    {"hp_delta": -8, "mp_delta": 0, "grant_heal": 0, "grant_boost": 0},
+    "neutral": {"hp_delta": 0,  "mp_delta": 0, "grant_heal": 0, "grant_boost": 0},
+    "success": {"hp_delta": 0,  "mp_delta": 0, "grant_heal": 0, "grant_boost": 0},
+    "great":   {"hp_delta": 0,  "mp_delta": 0, "grant_heal": 0, "grant_boost": 1},
+}
+
 # ผล checkpoint (ปรับได้ตามกติกาคุณ)
 CHECKPOINT_HEAL_HP_FULL: bool = True
 CHECKPOINT_RESTORE_MP_PCT: int = 50  # +50% ของ MP MAX (ให้ service ไป clamp เอง)
@@ -86,7 +99,8 @@ def apply_mp_bonus(dice_roll: int, mp_spent: int, boost: bool = False) -> int:
         total += BOOST_ROLL_BONUS
     return total
 
-def tier_from_total(total_roll: int) -> Literal["fail", "neutral", "success", "great"]:
+def _scan_tier(total_roll: int) -> Literal["fail", "neutral", "success", "great"]:
+    # นิยามจริงของ tier (ไล่ตาม OUTCOME_BOUNDS) ใช้ตอนสร้างตารางด้านล่างเท่านั้น
     for name, (lo, hi) in OUTCOME_BOUNDS.items():
         if lo <= total_roll <= hi:
             return name  # type: ignore[return-value]
@@ -94,6 +108,21 @@ def tier_from_total(total_roll: int) -> Literal["fail", "neutral", "success", "g
         return "fail"   # type: ignore[return-value]
     return "great"      # type: ignore[return-value]
 
+# ตาราง tier ต่อแต้มรวม สร้างครั้งเดียวตอน import → tier_from_total เป็น O(1)
+# นอกช่วง OUTCOME_BOUNDS ผลคงที่ (ต่ำกว่า = fail, สูงกว่า = great) จึงเก็บแค่สองค่าไว้
+_TIER_LO = min(lo for lo, _ in OUTCOME_BOUNDS.values())
+_TIER_HI = max(hi for _, hi in OUTCOME_BOUNDS.values())
+_TIER_TABLE = tuple(_scan_tier(t) for t in range(_TIER_LO, _TIER_HI + 1))
+_TIER_BELOW = _scan_tier(_TIER_LO - 1)
+_TIER_ABOVE = _scan_tier(_TIER_HI + 1)
+
+def tier_from_total(total_roll: int) -> Literal["fail", "neutral", "success", "great"]:
+    if total_roll < _TIER_LO:
+        return _TIER_BELOW   # type: ignore[return-value]
+    if total_roll > _TIER_HI:
+        return _TIER_ABOVE   # type: ignore[return-value]
+    return _TIER_TABLE[total_roll - _TIER_LO]   # type: ignore[return-value]
+
 def sanitize_mp_spend(turn: int, requested_mp: int, available_mp: int) -> int:
     """
     บังคับกติกา: ใช้ MP เพื่อบัฟทอยได้เฉพาะเทิร์นใน FORCED_MP_TURNS เท่านั้น
@@ -130,6 +159,35 @@ def make_roll(
         tier=tier_from_total(total),
     )
 
+# -----------------------------
+# โอกาสออกแต่ละ tier (แม่นยำ ไม่ต้องสุ่ม) — ให้ UI แสดงก่อนผู้เล่นตัดสินใจใช้ MP/BOOST
+# -----------------------------
+TIERS: Tuple[str, ...] = tuple(OUTCOME_BOUNDS)
+
+# ใช้ MP เกินนี้ลูกเต๋าทุกหน้าก็หลุดเพดานตารางแล้ว → distribution เท่ากันหมด
+MP_SPEND_SATURATION = (
+    max(0, -(-(_TIER_HI + 1 - DICE_MIN) // MP_BONUS_PER_POINT)) if MP_BONUS_PER_POINT > 0 else 0
+)
+
+def _distribution(mp_spent: int, boost: bool) -> Dict[str, Fraction]:
+    faces = DICE_MAX - DICE_MIN + 1
+    counts = dict.fromkeys(TIERS, 0)
+    for d in range(DICE_MIN, DICE_MAX + 1):
+        counts[tier_from_total(apply_mp_bonus(d, mp_spent, boost=boost))] += 1
+    return {tier: Fraction(c, faces) for tier, c in counts.items()}
+
+# (mp_spent, boost) → {tier: ความน่าจะเป็น} ครบทุกคู่ที่ต่างกันจริง
+TIER_DISTRIBUTIONS: Dict[Tuple[int, bool], Dict[str, Fraction]] = {
+    (mp, boost): _distribution(mp, boost)
+    for mp in range(MP_SPEND_SATURATION + 1)
+    for boost in (False, True)
+}
+
+def tier_distribution(mp_spent: int = 0, boost: bool = False) -> Dict[str, Fraction]:
+    """ความน่าจะเป็นของแต่ละ tier เมื่อใช้ MP mp_spent แต้ม (+BOOST) กับ d20 หนึ่งลูก"""
+    mp = min(max(0, int(mp_spent)), MP_SPEND_SATURATION)
+    return TIER_DISTRIBUTIONS[(mp, bool(boost))]
+
 # -----------------------------
 # เดินหน้าเทิร์น/ด่าน & เช็คสถานะเคลียร์
 # -----------------------------
@@ -0,0 +1,261 @@
+# roll/simulate.py
+# Monte Carlo จำลองการเล่นครบ 10×10 เทิร์นแบบ vectorized (NumPy) ไว้ปรับสมดุลเกม
+# - 1 แถวของ array = 1 รอบเล่น, วนแค่ 100 step แต่ละ step คำนวณทุกรอบพร้อมกัน → หลักล้านรอบในไม่กี่วินาที
+# - กติกาเดียวกับ progress.begin_turn/commit_turn: checkpoint → heal → boost → ทอย (MP เฉพาะ 3/6/9)
+#   → ผลตาม tier จาก rules.BASELINE_TIER_EFFECTS → หัก MP ที่ใช้ทอย → ตายเมื่อ HP ≤ 0
+# - ค่าคงที่ดึงจาก rules.py ทั้งหมด ส่ง overrides เพื่อทดลองค่าใหม่ก่อนแก้จริงได้
+#     simulate(1_000_000, overrides={"MP_BONUS_PER_POINT": 4, "HEAL_HP_AMOUNT": 12})
+# ไม่พึ่ง Django (ใช้ได้จาก notebook/สคริปต์) — CLI อยู่ที่ manage.py simulate_balance
+from __future__ import annotations
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:   # numpy ใช้แค่ตอนจำลอง ไม่จำเป็นต่อเว็บ
+    np = None
+
+from roll import rules
+
+TIERS = ("fail", "neutral", "success", "great")
+BOOST_POLICIES = ("never", "boss", "forced", "always")
+
+# ค่าเริ่มต้นของผู้เล่น (ตรงกับ default ของ models.Player)
+PLAYER_START = {"hp": 30, "mp": 10, "pot_heal": 1, "pot_boost": 0}
+PLAYER_HP_MAX = rules.PLAYER_HP_MAX
+PLAYER_MP_MAX = rules.PLAYER_MP_MAX
+
+@dataclass(frozen=True)
+class SimRules:
+    """ชุดค่าคงที่ที่ simulator ใช้ (ค่าเริ่มต้น = ค่าจริงใน rules.py)"""
+    STAGES_TOTAL: int
+    TURNS_PER_STAGE: int
+    CHECKPOINT_TURNS: frozenset
+    FORCED_MP_TURNS: frozenset
+    DICE_MIN: int
+    DICE_MAX: int
+    MP_BONUS_PER_POINT: int
+    BOOST_ROLL_BONUS: int
+    ITEM_MP_COST: int
+    HEAL_HP_AMOUNT: int
+    OUTCOME_BOUNDS: Dict[str, tuple]
+    BASELINE_TIER_EFFECTS: Dict[str, Dict[str, int]]
+    CHECKPOINT_HEAL_HP_FULL: bool
+    CHECKPOINT_RESTORE_MP_PCT: int
+    CHECKPOINT_GRANT_POTIONS: int
+    HP_MAX: int = PLAYER_HP_MAX
+    MP_MAX: int = PLAYER_MP_MAX
+
+    @classmethod
+    def from_rules(cls, **overrides) -> "SimRules":
+        values = {f.name: getattr(rules, f.name) for f in fields(cls) if hasattr(rules, f.name)}
+        values["CHECKPOINT_TURNS"] = frozenset(values["CHECKPOINT_TURNS"])
+        values["FORCED_MP_TURNS"] = frozenset(values["FORCED_MP_TURNS"])
+        unknown = set(overrides) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"unknown rule constant(s): {', '.join(sorted(unknown))}")
+        return replace(cls(**values), **{
+            k: frozenset(v) if k in ("CHECKPOINT_TURNS", "FORCED_MP_TURNS") else v
+            for k, v in overrides.items()
+        })
+
+    def tier_of_total(self, total: int) -> int:
+        for i, name in enumerate(TIERS):
+            lo, hi = self.OUTCOME_BOUNDS[name]
+            if lo <= total <= hi:
+                return i
+        return 0 if total < self.OUTCOME_BOUNDS["fail"][0] else len(TIERS) - 1
+
+@dataclass(frozen=True)
+class Policy:
+    """พฤติกรรมผู้เล่นจำลอง"""
+    heal_below: int = 15          # ใช้ Heal เมื่อ HP < ค่านี้ (0 = ไม่ใช้)
+    mp_spend: int = 1             # MP ที่ขอใช้บัฟทอยในเทิร์น 3/6/9 (ถูกตัดเหลือเท่าที่มี)
+    boost: str = "boss"           # ใช้ Boost เมื่อไหร่: never / boss / forced / always
+
+    def uses_boost(self, kind: str) -> bool:
+        if self.boost == "always":
+            return True
+        if self.boost == "boss":
+            return kind == "BOSS"
+        if self.boost == "forced":
+            return kind in ("FORCED_MP", "BOSS")
+        return False
+
+@dataclass
+class SimResult:
+    runs: int
+    rules: SimRules
+    policy: Policy
+    seed: Optional[int]
+    clears: int = 0
+    deaths_by_stage: List[int] = field(default_factory=list)   # index 0 = ด่าน 1
+    alive_by_step: List[int] = field(default_factory=list)     # จำนวนที่รอดหลังจบแต่ละเทิร์น (100 ค่า)
+    mean_hp: List[float] = field(default_factory=list)         # ค่าเฉลี่ยของคนที่ยังรอด ต่อ step
+    mean_mp: List[float] = field(default_factory=list)
+    mean_pot_heal: List[float] = field(default_factory=list)
+    mean_pot_boost: List[float] = field(default_factory=list)
+    tier_counts: Dict[str, int] = field(default_factory=dict)
+    heals_used: int = 0
+    boosts_used: int = 0
+    mp_spent: int = 0
+
+    @property
+    def clear_rate(self) -> float:
+        return self.clears / self.runs if self.runs else 0.0
+
+    def death_rate_by_stage(self) -> List[float]:
+        """P(ตายที่ด่าน s | เข้าด่าน s ได้)"""
+        out, entered = [], self.runs
+        for d in self.deaths_by_stage:
+            out.append(d / entered if entered else 0.0)
+            entered -= d
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        tiers_total = sum(self.tier_counts.values()) or 1
+        return {
+            "runs": self.runs,
+            "seed": self.seed,
+            "policy": {"heal_below": self.policy.heal_below, "mp_spend": self.policy.mp_spend,
+                       "boost": self.policy.boost},
+            "clear_rate": round(self.clear_rate, 6),
+            "deaths_by_stage": self.deaths_by_stage,
+            "death_rate_by_stage": [round(x, 6) for x in self.death_rate_by_stage()],
+            "survival_by_step": [round(a / self.runs, 6) for a in self.alive_by_step],
+            "mean_hp": [round(x, 3) for x in self.mean_hp],
+            "mean_mp": [round(x, 3) for x in self.mean_mp],
+            "mean_pot_heal": [round(x, 3) for x in self.mean_pot_heal],
+            "mean_pot_boost": [round(x, 3) for x in self.mean_pot_boost],
+            "tier_share": {k: round(v / tiers_total, 6) for k, v in self.tier_counts.items()},
+            "per_run": {
+                "heals_used": round(self.heals_used / self.runs, 4),
+                "boosts_used": round(self.boosts_used / self.runs, 4),
+                "mp_spent": round(self.mp_spent / self.runs, 4),
+            },
+        }
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("roll.simulate requires numpy (pip install numpy)")
+
+def _tier_table(r: SimRules, max_total: int):
+    """lookup: tier index ของ total = table[total - DICE_MIN]"""
+    return np.array([r.tier_of_total(t) for t in range(r.DICE_MIN, max_total + 1)], dtype=np.int8)
+
+def simulate(
+    runs: int,
+    *,
+    seed: Optional[int] = None,
+    policy: Optional[Policy] = None,
+    overrides: Optional[Dict[str, Any]] = None,
+    batch_size: int = 250_000,
+) -> SimResult:
+    """จำลอง runs รอบ (แบ่งเป็น batch เพื่อคุมหน่วยความจำ) แล้วรวมผล"""
+    _require_numpy()
+    r = SimRules.from_rules(**(overrides or {}))
+    policy = policy or Policy()
+    if policy.boost not in BOOST_POLICIES:
+        raise ValueError(f"boost policy must be one of {BOOST_POLICIES}")
+
+    steps = r.STAGES_TOTAL * r.TURNS_PER_STAGE
+    rng = np.random.default_rng(seed)
+    res = SimResult(runs=runs, rules=r, policy=policy, seed=seed)
+
+    deaths = np.zeros(r.STAGES_TOTAL, dtype=np.int64)
+    alive_steps = np.zeros(steps, dtype=np.int64)
+    sums = {k: np.zeros(steps, dtype=np.float64) for k in ("hp", "mp", "pot_heal", "pot_boost")}
+    tier_counts = np.zeros(len(TIERS), dtype=np.int64)
+
+    max_total = r.DICE_MAX + r.MP_MAX * r.MP_BONUS_PER_POINT + r.BOOST_ROLL_BONUS
+    table = _tier_table(r, max_total)
+    fx = {k: np.array([r.BASELINE_TIER_EFFECTS[t][k] for t in TIERS], dtype=np.int32)
+          for k in ("hp_delta", "mp_delta", "grant_heal", "grant_boost")}
+    mp_restore = int(r.MP_MAX * (r.CHECKPOINT_RESTORE_MP_PCT / 100.0))
+
+    done = 0
+    while done < runs:
+        n = min(batch_size, runs - done)
+        done += n
+        hp = np.full(n, PLAYER_START["hp"], dtype=np.int32)
+        mp = np.full(n, PLAYER_START["mp"], dtype=np.int32)
+        pot_heal = np.full(n, PLAYER_START["pot_heal"], dtype=np.int32)
+        pot_boost = np.full(n, PLAYER_START["pot_boost"], dtype=np.int32)
+        alive = np.ones(n, dtype=bool)
+
+        step = 0
+        for stage in range(1, r.STAGES_TOTAL + 1):
+            for turn in range(1, r.TURNS_PER_STAGE + 1):
+                kind = _classify(r, turn)
+
+                if turn in r.CHECKPOINT_TURNS:
+                    if r.CHECKPOINT_HEAL_HP_FULL:
+                        hp[:] = r.HP_MAX
+                    if mp_restore > 0:
+                        np.minimum(mp + mp_restore, r.MP_MAX, out=mp)
+                    pot_heal += r.CHECKPOINT_GRANT_POTIONS
+
+                if policy.heal_below > 0:
+                    use = alive & (hp < policy.heal_below) & (pot_heal > 0) & (mp >= r.ITEM_MP_COST)
+                    mp -= use * r.ITEM_MP_COST
+                    pot_heal -= use
+                    np.minimum(hp + use * r.HEAL_HP_AMOUNT, r.HP_MAX, out=hp)
+                    res.heals_used += int(use.sum())
+
+                boosted = np.zeros(n, dtype=bool)
+                if policy.uses_boost(kind):
+                    boosted = alive & (pot_boost > 0) & (mp >= r.ITEM_MP_COST)
+                    mp -= boosted * r.ITEM_MP_COST
+                    pot_boost -= boosted
+                    res.boosts_used += int(boosted.sum())
+
+                if turn in r.FORCED_MP_TURNS and policy.mp_spend > 0:
+                    spent = np.minimum(policy.mp_spend, mp)
+                    res.mp_spent += int(spent[alive].sum())
+                else:
+                    spent = 0
+
+                total = rng.integers(r.DICE_MIN, r.DICE_MAX + 1, size=n, dtype=np.int32)
+                total += spent * r.MP_BONUS_PER_POINT + boosted * r.BOOST_ROLL_BONUS
+                tier = table[np.clip(total, r.DICE_MIN, max_total) - r.DICE_MIN]
+                tier_counts += np.bincount(tier[alive], minlength=len(TIERS))
+
+                np.clip(hp + fx["hp_delta"][tier], 0, r.HP_MAX, out=hp)
+                np.clip(mp + fx["mp_delta"][tier], 0, r.MP_MAX, out=mp)
+                pot_heal += fx["grant_heal"][tier]
+                pot_boost += fx["grant_boost"][tier]
+                np.clip(mp - spent, 0, r.MP_MAX, out=mp)
+
+                died = alive & (hp <= 0)
+                deaths[stage - 1] += int(died.sum())
+                alive &= ~died
+
+                alive_steps[step] += int(alive.sum())
+                sums["hp"][step] += hp[alive].sum()
+                sums["mp"][step] += mp[alive].sum()
+                sums["pot_heal"][step] += pot_heal[alive].sum()
+                sums["pot_boost"][step] += pot_boost[alive].sum()
+                step += 1
+
+        res.clears += int(alive.sum())
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = {k: np.nan_to_num(v / alive_steps) for k, v in sums.items()}
+    res.deaths_by_stage = deaths.tolist()
+    res.alive_by_step = alive_steps.tolist()
+    res.mean_hp = means["hp"].tolist()
+    res.mean_mp = means["mp"].tolist()
+    res.mean_pot_heal = means["pot_heal"].tolist()
+    res.mean_pot_boost = means["pot_boost"].tolist()
+    res.tier_counts = dict(zip(TIERS, tier_counts.tolist()))
+    return res
+
+def _classify(r: SimRules, turn: int) -> str:
+    # เหมือน rules.classify_turn แต่ใช้ชุดเทิร์นจาก SimRules (รองรับ overrides)
+    if turn in r.CHECKPOINT_TURNS:
+        return "CHECKPOINT"
+    if turn in r.FORCED_MP_TURNS:
+        return "FORCED_MP"
+    if turn == r.TURNS_PER_STAGE:
+        return "BOSS"
+    return "NORMAL"
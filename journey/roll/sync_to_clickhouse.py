@@ -1,68 +1,413 @@
+# roll/sync_to_clickhouse.py
+# ส่ง EventLog → ตาราง event_log ใน ClickHouse แบบเพิ่มเฉพาะแถวใหม่ (watermark = EventLog.id ใน JobCursor)
+#   python manage.py sync_clickhouse                 # (cron) ส่งแถวใหม่ต่อจากรอบก่อน
+#   python -m roll.sync_to_clickhouse                # แบบเดิม รันเป็นสคริปต์ได้เหมือนกัน
+#
+# - แต่ละก้อน (batch_size แถว เรียงตาม id) insert เสร็จแล้วบันทึก checkpoint ทันที → หยุด/พังกลางทางแล้วรันต่อได้
+#   ก่อน insert จะจดช่วง id ที่กำลังส่ง (inflight) ไว้ก่อน: ถ้าพังหลัง insert แต่ก่อน checkpoint
+#   รอบหน้าจะเทียบ id กับ ClickHouse แล้วส่งเฉพาะแถวที่ยังไม่มี (ไม่ซ้ำ)
+# - late arrival: transaction ที่ได้ id น้อยกว่า watermark แต่ commit ทีหลังรอบที่แล้ว
+#   → ทุกรอบย้อนดูแถว id ≤ watermark ที่ ts อยู่ในช่วง overlap ก่อน last_ts แล้วส่งเฉพาะ id ที่ ClickHouse ยังไม่มี
+# - กันรันซ้อน: จองสิทธิ์ (lease) ใน cursor แบบเดียวกับการจองเทิร์นใน progress.begin_turn
+# - backfill(): ส่งย้อนหลังก้อนใหญ่ (หลัง --reset / ตั้งระบบใหม่) แบ่งช่วง id แล้วส่งขนานหลาย process
+#   python manage.py sync_clickhouse --reset --backfill --workers 8
+# - ส่งเป็นคอลัมน์ (client.insert column_oriented): DB แปลง ts/session_id/attrs ให้พร้อมส่ง → ไม่มีงานต่อแถวใน Python
+#   วัดก่อน/หลังได้ด้วย bench/ch_sync_bench.py
+# ต้องมีคอลัมน์ id ใน event_log (clickhouse/init_eventlog.sql หรือ clickhouse/002_eventlog_id.sql)
+from __future__ import annotations
 import os
 import sys
 from pathlib import Path
-import django
-import clickhouse_connect
-from roll.models import EventLog
 
-HERE = Path(__file__).resolve()
-OUTER = HERE.parents[1]   # .../journey
-ROOT = OUTER.parent       # .../Rolling_Journey
+if __name__ == "__main__":
+    # รันเป็นสคริปต์ตรงๆ: ตั้ง path + django.setup() ก่อน import model
+    import django
+
+    HERE = Path(__file__).resolve()
+    OUTER = HERE.parents[1]   # .../journey
+    ROOT = OUTER.parent       # .../Rolling_Journey
+
+    for p in (str(OUTER), str(ROOT)):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "journey.journey.settings")
+    django.setup()
+
+import io
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import uuid4
 
-for p in (str(OUTER), str(ROOT)):
-    if p not in sys.path:
-        sys.path.insert(0, p)
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import NotSupportedError, connection, connections, transaction
+from django.db.models import BigIntegerField, CharField, Max, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "journey.journey.settings")
-django.setup()
+from roll.models import EventLog, JobCursor
 
-def sync_event_logs(batch_size: int = 1000):
-    client = clickhouse_connect.get_client(
-        host="localhost", port=8123, username="default", password="1234"
+CURSOR_NAME = "clickhouse_sync"
+COLUMNS = [
+    "id", "ts", "player_id", "session_id", "type", "stage_index", "turn",
+    "hp", "mp", "potions", "pot_heal_ct", "pot_boost_ct", "attrs",
+]
+LEASE_TTL = timedelta(minutes=10)   # รอบที่ค้าง/ตายไปนานกว่านี้ถือว่าปล่อยสิทธิ์แล้ว
+
+class SyncBusy(RuntimeError):
+    """มีรอบ sync อื่นถือสิทธิ์อยู่ (หรือเสียสิทธิ์ไประหว่างทาง)"""
+
+# ---------- ClickHouse ----------
+
+def get_client(config: Optional[Dict[str, Any]] = None):
+    """clickhouse-connect client จาก settings.CLICKHOUSE (ใช้ร่วมกับ roll.analytics)"""
+    try:
+        import clickhouse_connect
+    except ImportError as e:
+        raise ImproperlyConfigured("ClickHouse support requires the clickhouse-connect package") from e
+    cfg = config if config is not None else getattr(settings, "CLICKHOUSE", {})
+    return clickhouse_connect.get_client(
+        host=cfg.get("HOST", "localhost"),
+        port=int(cfg.get("PORT", 8123)),
+        username=cfg.get("USER", "default"),
+        password=cfg.get("PASSWORD", ""),
+        database=cfg.get("DATABASE", "default"),
+        autogenerate_session_id=False,   # ให้หลาย thread ใช้ client เดียวกันได้
     )
 
-    qs = EventLog.objects.all().values(
-        "ts", "player_id", "session_id", "type", "stage_index", "turn",
-        "hp", "mp", "potions", "pot_heal_ct", "pot_boost_ct", "attrs"
+def _ts_epoch() -> RawSQL:
+    """ts → epoch วินาที (DateTime ของ ClickHouse ละเอียดแค่วินาทีอยู่แล้ว) ให้ DB คำนวณแทนการสร้าง datetime ทีละแถว"""
+    col = f"{connection.ops.quote_name(EventLog._meta.db_table)}.{connection.ops.quote_name('ts')}"
+    if connection.vendor == "postgresql":
+        sql = f"FLOOR(EXTRACT(EPOCH FROM {col}))::bigint"
+    elif connection.vendor == "sqlite":
+        sql = f"CAST(strftime('%%s', {col}) AS INTEGER)"   # sqlite เก็บ ts เป็นข้อความเวลา UTC
+    else:
+        raise NotSupportedError(f"ClickHouse sync does not support the {connection.vendor} backend")
+    return RawSQL(sql, (), output_field=BigIntegerField())
+
+def _columns(qs, limit: Optional[int] = None) -> List[tuple]:
+    """
+    EventLog queryset → tuple ละคอลัมน์ตาม COLUMNS สำหรับ client.insert(column_oriented=True) ([] ถ้าไม่มีแถว)
+    ค่าออกจาก DB ในรูปที่ส่งได้เลย: ts = epoch, session_id = ข้อความ, attrs = ข้อความ JSON ที่ DB serialize มาแล้ว
+    → ไม่ผ่าน from_db_value / int() / dict ทีละแถว และ ClickHouse parse attrs เอง
+    """
+    qs = qs.annotate(
+        ts_epoch=_ts_epoch(),
+        session_text=Cast("session_id", CharField()),
+        attrs_json=Coalesce(NullIf(Cast("attrs", TextField()), Value("null")), Value("{}"), output_field=TextField()),
+    ).values_list("id", "ts_epoch", "player_id", "session_text", *COLUMNS[4:-1], "attrs_json")
+    return list(zip(*(qs[:limit] if limit else qs)))
+
+def _existing_ids(client, table: str, lo: int, hi: int) -> set:
+    """id ใน ClickHouse ช่วง [lo, hi] (มี skip index minmax บน id → อ่านเฉพาะ granule ที่เกี่ยว)"""
+    rows = client.query(
+        f"SELECT id FROM {table} WHERE id >= {{lo:UInt64}} AND id <= {{hi:UInt64}}",
+        parameters={"lo": lo, "hi": hi},
+    ).result_rows
+    return {r[0] for r in rows}
+
+def _insert(client, table: str, columns: List[tuple]) -> int:
+    if not columns:
+        return 0
+    client.insert(table, columns, column_names=COLUMNS, column_oriented=True)
+    return len(columns[0])
+
+def _ship_missing(client, table: str, ids: Iterable[int], batch_size: int) -> int:
+    """ส่งเฉพาะ id (จาก Postgres) ที่ ClickHouse ยังไม่มี — ใช้กับช่วงที่อาจส่งไปแล้วบางส่วน"""
+    ids = sorted(ids)
+    shipped = 0
+    for i in range(0, len(ids), batch_size):
+        chunk = ids[i:i + batch_size]
+        missing = set(chunk) - _existing_ids(client, table, chunk[0], chunk[-1])
+        if missing:
+            shipped += _insert(client, table, _columns(EventLog.objects.filter(id__in=missing).order_by("id")))
+    return shipped
+
+# ---------- cursor / lease ----------
+
+def _acquire(token: str) -> Dict[str, Any]:
+    now = timezone.now()
+    with transaction.atomic():
+        cursor, _ = JobCursor.objects.select_for_update().get_or_create(name=CURSOR_NAME)
+        pos = dict(cursor.position)
+        held_at = pos.get("lease_at")
+        if pos.get("lease") and held_at and now - datetime.fromisoformat(held_at) < LEASE_TTL:
+            raise SyncBusy(f"another sync holds the lease since {held_at}")
+        pos.update(lease=token, lease_at=now.isoformat())
+        cursor.position = pos
+        cursor.save(update_fields=["position", "updated_at"])
+    return pos
+
+def _checkpoint(token: str, **changes) -> Dict[str, Any]:
+    """บันทึกตำแหน่ง + ต่ออายุ lease (ยกเลิกถ้ามีรอบอื่นแย่งสิทธิ์ไปแล้ว)"""
+    with transaction.atomic():
+        cursor = JobCursor.objects.select_for_update().get(name=CURSOR_NAME)
+        if cursor.position.get("lease") != token:
+            raise SyncBusy("sync lease was taken over by another run")
+        pos = {**cursor.position, **changes, "lease_at": timezone.now().isoformat()}
+        cursor.position = pos
+        cursor.save(update_fields=["position", "updated_at"])
+    return pos
+
+def _release(token: str) -> None:
+    with transaction.atomic():
+        cursor = JobCursor.objects.select_for_update().filter(name=CURSOR_NAME).first()
+        if cursor and cursor.position.get("lease") == token:
+            cursor.position = {k: v for k, v in cursor.position.items() if k not in ("lease", "lease_at")}
+            cursor.save(update_fields=["position", "updated_at"])
+
+def reset(client=None, *, table: str = "event_log") -> None:
+    """ล้าง event_log ใน ClickHouse + watermark → รอบถัดไปส่งใหม่ทั้งหมด (เช่น ข้อมูลจาก sync แบบเก่าที่ซ้ำ/ไม่มี id)"""
+    client = client or get_client()
+    client.command(f"TRUNCATE TABLE IF EXISTS {table}")
+    JobCursor.objects.filter(name=CURSOR_NAME).delete()
+
+# ---------- sync ----------
+
+def sync_event_logs(
+    batch_size: int = 5000,
+    *,
+    overlap_seconds: float = 300,
+    max_batches: Optional[int] = None,
+    client=None,
+    table: str = "event_log",
+) -> Dict[str, Any]:
+    """ส่ง EventLog ที่ ClickHouse ยังไม่มี: กู้ก้อนที่ค้าง → ย้อนดูช่วง overlap → ส่งแถวใหม่ทีละก้อน"""
+    client = client or get_client()
+    token = uuid4().hex
+    pos = _acquire(token)
+    started = time.perf_counter()
+    recovered = late = inserted = batches = 0
+    try:
+        last_id = int(pos.get("last_id", 0))
+        last_ts = pos.get("last_ts")
+
+        # 1) ก้อนที่รอบก่อนส่งค้างไว้ (insert แล้วแต่ยังไม่ทัน checkpoint?)
+        if pos.get("inflight"):
+            lo, hi = pos["inflight"]
+            ids = EventLog.objects.filter(id__gte=lo, id__lte=hi).order_by().values_list("id", flat=True)
+            recovered = _ship_missing(client, table, ids, batch_size)
+            last_id = max(last_id, hi)
+            pos = _checkpoint(token, last_id=last_id, inflight=None)
+
+        # 2) late arrival: แถว id ≤ watermark ที่เพิ่ง commit หลังรอบก่อน
+        if last_id and last_ts and overlap_seconds > 0:
+            since = datetime.fromisoformat(last_ts) - timedelta(seconds=overlap_seconds)
+            ids = EventLog.objects.filter(id__lte=last_id, ts__gte=since).order_by().values_list("id", flat=True)
+            late = _ship_missing(client, table, ids, batch_size)
+
+        # 3) แถวใหม่ตาม id ทีละก้อน + checkpoint หลังทุกก้อน
+        while max_batches is None or batches < max_batches:
+            columns = _columns(EventLog.objects.filter(id__gt=last_id).order_by("id"), limit=batch_size)
+            if not columns:
+                break
+            lo, hi = columns[0][0], columns[0][-1]
+            _checkpoint(token, inflight=[lo, hi])
+            inserted += _insert(client, table, columns)
+            newest = datetime.fromtimestamp(max(columns[1]), tz=dt_timezone.utc)
+            last_ts = max(newest, datetime.fromisoformat(last_ts)).isoformat() if last_ts else newest.isoformat()
+            last_id = hi
+            _checkpoint(token, last_id=last_id, last_ts=last_ts, inflight=None)
+            batches += 1
+    finally:
+        _release(token)
+
+    return {
+        "inserted": inserted,
+        "late": late,
+        "recovered": recovered,
+        "batches": batches,
+        "last_id": last_id,
+        "caught_up": not EventLog.objects.filter(id__gt=last_id).exists(),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+# ---------- backfill (ขนานหลาย process) ----------
+# ช่วง id (last_id, max(id)] ถูกแบ่งเป็น chunk ละ chunk_ids id → ส่งให้ ProcessPoolExecutor (แบบ replay.replay_many)
+# แต่ละ worker มี connection Postgres + ClickHouse client ของตัวเอง และทำ chunk ทีละช่วงย่อย batch_size id:
+#   - Postgres: COPY (SELECT ...) TO STDOUT CSV → ส่งเป็น bytes ก้อนเดียวให้ ClickHouse parse เอง (ไม่แปลงทีละแถวใน Python)
+#   - DB อื่น (sqlite ตอน dev): อ่านเป็นคอลัมน์ (_columns) + client.insert แบบเดียวกับรอบ incremental
+# ช่วงย่อยทำซ้ำได้: นับแถวใน ClickHouse เทียบ Postgres ก่อน — ครบแล้วข้าม / ไม่ครบลบช่วงนั้นแล้วส่งใหม่
+# → retry หรือรัน backfill ซ้ำหลังพังไม่ทำให้ข้อมูลซ้ำ
+# watermark ขยับตาม chunk ที่เสร็จต่อเนื่องจากต้นช่วง (chunk เสร็จไม่เรียงลำดับ) จบแล้วรอบ incremental ทำต่อได้ทันที
+
+_worker_client = None
+
+def _init_worker() -> None:
+    """ตั้ง Django ใน worker (กรณี start method ไม่ใช่ fork) — connection DB เปิดใหม่เองตอน query แรก"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+def _count_pg(lo: int, hi: int) -> int:
+    return EventLog.objects.filter(id__gte=lo, id__lte=hi).count()
+
+def _count_ch(client, table: str, lo: int, hi: int) -> int:
+    rows = client.query(
+        f"SELECT count() FROM {table} WHERE id >= {{lo:UInt64}} AND id <= {{hi:UInt64}}",
+        parameters={"lo": lo, "hi": hi},
+    ).result_rows
+    return int(rows[0][0]) if rows else 0
+
+def _copy_csv(lo: int, hi: int) -> bytes:
+    """Postgres COPY ของช่วง id → CSV (ts เป็น timestamptz มี offset, attrs เป็นข้อความ JSON)"""
+    qn = connection.ops.quote_name
+    sql = (
+        f"COPY (SELECT {', '.join(qn(c) for c in COLUMNS)} FROM {qn(EventLog._meta.db_table)}"
+        f" WHERE {qn('id')} BETWEEN {int(lo)} AND {int(hi)} ORDER BY {qn('id')}) TO STDOUT WITH (FORMAT csv)"
     )
+    buf = io.BytesIO()
+    with connection.cursor() as cur:
+        raw = cur.cursor
+        if hasattr(raw, "copy_expert"):      # psycopg2
+            raw.copy_expert(sql, buf)
+        else:                                # psycopg 3
+            with raw.copy(sql) as copy:
+                for block in copy:
+                    buf.write(block)
+    return buf.getvalue()
 
-    buf, total = [], 0
-
-    def flush():
-        nonlocal buf, total
-        if not buf:
-            return
-        client.insert(
-            "event_log",
-            buf,
-            column_names=[
-                "ts", "player_id", "session_id", "type", "stage_index", "turn",
-                "hp", "mp", "potions", "pot_heal_ct", "pot_boost_ct", "attrs"
-            ],
-        )
-        total += len(buf)
-        buf = []
-
-    for row in qs.iterator(chunk_size=batch_size):
-        buf.append([
-            row["ts"],
-            int(row["player_id"]),
-            str(row["session_id"]),
-            row["type"],
-            int(row["stage_index"]),
-            int(row["turn"]),
-            int(row["hp"]),
-            int(row["mp"]),
-            int(row["potions"]),
-            int(row["pot_heal_ct"]),
-            int(row["pot_boost_ct"]),
-            row["attrs"] or {}
-        ])
-        if len(buf) >= batch_size:
-            flush()
-
-    flush()
-    print("No event logs to sync." if total == 0 else f"✅ Inserted {total} rows into ClickHouse.")
+def _ship_range(client, table: str, lo: int, hi: int) -> None:
+    if connection.vendor == "postgresql":
+        data = _copy_csv(lo, hi)
+        if data:
+            client.raw_insert(
+                table, column_names=COLUMNS, insert_block=data, fmt="CSV",
+                settings={"date_time_input_format": "best_effort"},   # รับ '2026-01-01 12:00:00.123+07' ของ Postgres
+            )
+        return
+    _insert(client, table, _columns(EventLog.objects.filter(id__gte=lo, id__lte=hi).order_by("id")))
+
+def _backfill_chunk(args: Tuple[int, int, int, int, str, Optional[Dict[str, Any]], Callable]) -> Dict[str, Any]:
+    """ส่ง id [lo, hi] ทีละช่วงย่อย batch_size id — แต่ละช่วงย่อย retry ได้ถึง retries ครั้ง"""
+    global _worker_client
+    lo, hi, batch_size, retries, table, config, client_factory = args
+    started = time.perf_counter()
+    inserted = skipped = retried = 0
+    for a in range(lo, hi + 1, batch_size):
+        b = min(a + batch_size - 1, hi)
+        for attempt in range(retries + 1):
+            try:
+                if _worker_client is None:
+                    _worker_client = client_factory(config)
+                expected = _count_pg(a, b)
+                present = _count_ch(_worker_client, table, a, b) if expected else 0
+                if present == expected:
+                    skipped += present
+                    break
+                if present:
+                    # มีบางส่วน/ซ้ำจากรอบที่พัง → ลบทั้งช่วงแล้วส่งใหม่ (lightweight delete เห็นผลทันที)
+                    _worker_client.command(f"DELETE FROM {table} WHERE id >= {int(a)} AND id <= {int(b)}")
+                _ship_range(_worker_client, table, a, b)
+                inserted += expected
+                break
+            except Exception as e:
+                if attempt >= retries:
+                    raise RuntimeError(f"backfill ids {a}..{b} failed after {attempt + 1} attempt(s): {e!r}") from e
+                retried += 1
+                print(f"⚠️ backfill ids {a}..{b}: {e!r} — retry {attempt + 1}/{retries}")
+                _worker_client = None
+                connection.close()
+                time.sleep(min(2 ** attempt, 30))
+    return {"lo": lo, "hi": hi, "inserted": inserted, "skipped": skipped, "retries": retried,
+            "elapsed_s": round(time.perf_counter() - started, 3)}
+
+def _ranges(lo: int, hi: int, size: int) -> Iterator[Tuple[int, int]]:
+    for a in range(lo, hi + 1, size):
+        yield a, min(a + size - 1, hi)
+
+def backfill(
+    *,
+    workers: Optional[int] = None,
+    chunk_ids: int = 200_000,
+    batch_size: int = 20_000,
+    retries: int = 3,
+    table: str = "event_log",
+    config: Optional[Dict[str, Any]] = None,
+    client_factory: Callable = get_client,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    ส่ง EventLog ที่ id > watermark จนถึง max(id) ตอนเริ่ม แบบขนาน (ถือ lease เดียวกับ sync_event_logs)
+    - workers=1 รันใน process เดียว (debug ง่าย) | None = จำนวน core
+    - progress(stats) ถูกเรียกทุกครั้งที่ chunk เสร็จ: chunks_done/chunks/inserted/skipped/rows_per_s/eta_s
+    - client_factory(config) สร้าง ClickHouse client ในแต่ละ worker (ต้อง pickle ได้ = ฟังก์ชันระดับ module)
+    แถวที่ commit หลังเริ่ม (id > horizon หรือ late arrival) เก็บต่อด้วย sync_event_logs รอบถัดไป
+    """
+    workers = workers or os.cpu_count() or 1
+    token = uuid4().hex
+    pos = _acquire(token)
+    started = time.perf_counter()
+    stats = {"chunks": 0, "chunks_done": 0, "inserted": 0, "skipped": 0, "retries": 0, "workers": workers}
+    try:
+        last_id = int(pos.get("last_id", 0))
+        horizon = EventLog.objects.aggregate(m=Max("id"))["m"] or 0
+        stats.update(first_id=last_id + 1, horizon=horizon, last_id=last_id)
+        if horizon <= last_id:
+            stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+            return stats
+        stats["chunks"] = -(-(horizon - last_id) // chunk_ids)
+        done: Dict[int, int] = {}   # lo -> hi ของ chunk ที่เสร็จแล้วแต่ยังต่อจาก watermark ไม่ได้
+
+        def finished(res: Dict[str, Any]) -> None:
+            nonlocal last_id
+            for k in ("inserted", "skipped", "retries"):
+                stats[k] += res[k]
+            stats["chunks_done"] += 1
+            done[res["lo"]] = res["hi"]
+            while last_id + 1 in done:
+                last_id = done.pop(last_id + 1)
+            _checkpoint(token, last_id=last_id)   # ต่ออายุ lease ด้วย
+            elapsed = time.perf_counter() - started
+            rate = (stats["inserted"] + stats["skipped"]) / elapsed if elapsed else 0.0
+            left = stats["chunks"] - stats["chunks_done"]
+            stats.update(last_id=last_id, rows_per_s=round(rate, 1),
+                         eta_s=round(elapsed / stats["chunks_done"] * left, 1))
+            if progress:
+                progress(dict(stats))
+
+        def job(lo: int, hi: int):
+            return (lo, hi, batch_size, retries, table, config, client_factory)
+
+        ranges = _ranges(last_id + 1, horizon, chunk_ids)
+        if workers <= 1:
+            for lo, hi in ranges:
+                finished(_backfill_chunk(job(lo, hi)))
+        else:
+            connections.close_all()   # ไม่ให้ worker ที่ fork ออกไปใช้ socket เดียวกับ parent
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                pending = set()
+                try:
+                    for lo, hi in ranges:
+                        pending.add(pool.submit(_backfill_chunk, job(lo, hi)))
+                        if len(pending) >= workers * 2:
+                            ready, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for fut in ready:
+                                finished(fut.result())
+                    while pending:
+                        ready, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in ready:
+                            finished(fut.result())
+                except BaseException:
+                    for fut in pending:
+                        fut.cancel()
+                    raise
+
+        newest = EventLog.objects.filter(id__lte=horizon).order_by("-id").values_list("ts", flat=True).first()
+        _checkpoint(token, last_id=horizon, last_ts=newest.isoformat() if newest else pos.get("last_ts"), inflight=None)
+    finally:
+        _release(token)
+    stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return stats
 
 if __name__ == "__main__":
-    sync_event_logs()
+    result = sync_event_logs()
+    total = result["inserted"] + result["late"] + result["recovered"]
+    print("No event logs to sync." if total == 0 else f"✅ Inserted {total} rows into ClickHouse.")
@@ -1,3 +1,783 @@
-from django.test import TestCase
+# roll/tests.py
+#   python manage.py test roll.tests
+# - EngineTests: roll.engine ล้วนๆ (unittest ธรรมดา ไม่แตะ DB) + random.Random ที่ seed ไว้
+# - NarratorBreakerTests: ผลของ LLM นับกับ circuit breaker หลัง parse (200 แต่ content ใช้ไม่ได้ = ล้มเหลว)
+#                         + budget ต่อเทิร์นเป็น deadline (async ตัด stream ที่ค้างตรงเวลา)
+# - AdmissionGateTests / CircuitBreakerTests: primitive ของ thread/asyncio ใน roll.admission / roll.breaker (ไม่มี DB)
+# - ProgressMatchesEngineTests: progress.begin_turn/commit_turn ต้องเขียน EventLog ลำดับ/snapshot เดียวกับ engine
+# - TurnReservationTests: การจองเทิร์น (turn_token) — จองซ้อนได้ 409, หมดอายุแย่งได้, token เก่า commit ไม่ได้,
+#                         commit พังต้องคืนการจอง
+# - StartSessionTests: mapping X-ANON-ID ค้างหลัง gc_players ลบ Player → start_session ต้องฟื้นเอง
+# - SessionCacheTests: get_state ที่ cache อุ่นแล้วไม่แตะ DB, state สดหลัง act, end แล้วเล่นต่อไม่ได้
+# - StateETagTests: If-None-Match ตรง → 304, เล่นไปหนึ่งเทิร์นแล้ว ETag ต้องเปลี่ยน
+# - ActStreamTests: ตัดการเชื่อมต่อก่อนได้ chunk แรก → การจองเทิร์นต้องถูกคืน (ไม่ค้าง 409)
+# - MetricsViewTests: /api/metrics เฉพาะ staff
+# - RollupTests: rollups.rebuild ทีละก้อนเล็กๆ ต้องได้ตัวเลขเท่ากับ aggregate ตรงจาก EventLog/Session แบบแดชบอร์ดเดิม
+from __future__ import annotations
+import asyncio
+import json
+import random
+import threading
+import time
+import unittest
+from collections import defaultdict
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from uuid import UUID
 
-# Create your tests here.
+from django.db.models import Count, Max, Min
+from django.db.models.functions import TruncDate
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import Client, RequestFactory, TestCase
+from django.utils import timezone
+
+from roll import ai as narrator
+from roll import engine, identity, progress, rollups, views
+from roll.ai import AIResult
+from roll.admission import PRIORITY_ACT, PRIORITY_INTRO, AdmissionGate
+from roll.analytics import PostgresAnalytics
+from roll.breaker import CircuitBreaker
+from roll.engine import Effects, PlayerState, SessionState, play_turn
+from roll.enums import EventType, ItemCode, SessionStatus
+from roll.models import EventLog, Player, RollupSpan, Session
+from roll.rules import BASELINE_TIER_EFFECTS, BOOST_ROLL_BONUS, MP_BONUS_PER_POINT, PLAYER_HP_MAX
+
+NO_EFFECT = Effects()
+
+def _types(outcome) -> list:
+    return [ev.type for ev in outcome.events]
+
+def _strategy(session: SessionState, player: PlayerState) -> dict:
+    """ตัวเลือกของบอทในเทสต์: ใช้ MP ตอนเทิร์นบังคับ, HEAL เมื่อเลือดน้อย, BOOST เมื่อมี"""
+    return {
+        "use_mp": 2 if session.turn in (3, 6, 9) else 0,
+        "use_heal": player.hp <= 15,
+        "use_boost": player.pot_boost > 0 and session.turn == 10,
+    }
+
+# ---------- engine (ไม่มี DB) ----------
+
+class EngineTests(unittest.TestCase):
+    def test_checkpoint_turn(self):
+        player, session = PlayerState(hp=20, mp=2, pot_heal=0), SessionState(stage_index=1, turn=1)
+        out = play_turn(player, session, action_text="สำรวจ", rng=random.Random(1), effects=NO_EFFECT)
+
+        self.assertEqual(_types(out), [EventType.STAGE_ENTER, EventType.TURN_START, EventType.CHECKPOINT,
+                                       EventType.ACTION_RESULT, EventType.TURN_END])
+        self.assertEqual(player.as_tuple(), (PLAYER_HP_MAX, 7, 1, 0))   # เลือดเต็ม, MP +50%, ได้โพชั่น 1
+        self.assertEqual(out.player_delta, {"hp": (20, 30), "mp": (2, 7), "pot_heal": (0, 1)})
+        self.assertEqual(out.session_delta, {"turn": (1, 2)})
+        # snapshot ของแต่ละ event = state ณ ตอนเกิด ไม่ใช่ตอนจบเทิร์น
+        self.assertEqual(out.events[1].hp, 20)
+        self.assertEqual(out.events[2].hp, 30)
+
+    def test_forced_mp_accepted(self):
+        player, session = PlayerState(mp=5), SessionState(turn=3)
+        out = play_turn(player, session, use_mp=2, rng=random.Random(2), effects=NO_EFFECT)
+
+        self.assertEqual(_types(out), [EventType.TURN_START, EventType.MANA_EVENT_OFFERED,
+                                       EventType.MANA_EVENT_ACCEPTED, EventType.ACTION_RESULT, EventType.TURN_END])
+        self.assertEqual(out.roll.mp_spent, 2)
+        self.assertEqual(out.roll.total_roll, out.roll.dice_roll + 2 * MP_BONUS_PER_POINT)
+        self.assertEqual(player.mp, 3)
+        self.assertEqual(out.player_delta, {"mp": (5, 3)})
+
+    def test_forced_mp_declined_and_capped(self):
+        player, session = PlayerState(mp=0), SessionState(turn=6)
+        out = play_turn(player, session, use_mp=4, rng=random.Random(3), effects=NO_EFFECT)
+        self.assertIn(EventType.MANA_EVENT_DECLINED, _types(out))
+        self.assertEqual(out.roll.mp_spent, 0)          # MP ไม่พอ → ใช้ได้ 0
+        self.assertEqual(out.events[-2].attrs["mp_spent_roll"], 0)
+
+    def test_mp_ignored_outside_forced_turns(self):
+        player, session = PlayerState(mp=5), SessionState(turn=2)
+        out = play_turn(player, session, use_mp=3, rng=random.Random(4), effects=NO_EFFECT)
+        self.assertEqual(out.roll.mp_spent, 0)
+        self.assertEqual(player.mp, 5)
+        self.assertNotIn(EventType.MANA_EVENT_OFFERED, _types(out))
+
+    def test_heal_item(self):
+        player, session = PlayerState(hp=10, mp=3, pot_heal=1), SessionState(turn=2)
+        out = play_turn(player, session, use_heal=True, rng=random.Random(5), effects=NO_EFFECT)
+
+        used = [ev for ev in out.events if ev.type == EventType.ITEM_USED]
+        self.assertEqual(len(used), 1)
+        self.assertEqual(used[0].attrs["item"], ItemCode.HEAL)
+        self.assertEqual(player.as_tuple(), (20, 2, 0, 0))
+        self.assertEqual(out.player_delta, {"hp": (10, 20), "mp": (3, 2), "pot_heal": (1, 0)})
+
+    def test_heal_needs_mp(self):
+        player, session = PlayerState(hp=10, mp=0, pot_heal=1), SessionState(turn=2)
+        out = play_turn(player, session, use_heal=True, rng=random.Random(6), effects=NO_EFFECT)
+        self.assertNotIn(EventType.ITEM_USED, _types(out))
+        self.assertEqual(player.as_tuple(), (10, 0, 1, 0))
+        self.assertEqual(out.player_delta, {})
+
+    def test_boost_item(self):
+        player, session = PlayerState(mp=2, pot_boost=1), SessionState(turn=4)
+        out = play_turn(player, session, use_boost=True, rng=random.Random(7), effects=NO_EFFECT)
+
+        self.assertTrue(out.roll.boost_applied)
+        self.assertEqual(out.roll.total_roll, out.roll.dice_roll + BOOST_ROLL_BONUS)
+        self.assertEqual(player.as_tuple(), (PLAYER_HP_MAX, 1, 1, 0))
+
+    def test_death(self):
+        player, session = PlayerState(hp=5), SessionState(stage_index=4, turn=7)
+        out = play_turn(player, session, rng=random.Random(8), effects=Effects(hp_delta=-8))
+
+        self.assertTrue(out.dead and out.ended)
+        self.assertEqual(_types(out)[-3:], [EventType.DEATH, EventType.SESSION_END, EventType.TURN_END])
+        self.assertEqual(out.events[-2].attrs, {"status": SessionStatus.DEAD})
+        self.assertEqual(session.status, SessionStatus.DEAD)
+        self.assertEqual((session.stage_index, session.turn), (4, 7))   # ตายแล้วไม่เลื่อนตำแหน่ง
+        self.assertEqual(out.session_delta, {"status": (SessionStatus.ACTIVE, SessionStatus.DEAD)})
+        self.assertEqual(out.player_delta, {"hp": (5, 0)})
+        with self.assertRaises(ValueError):
+            play_turn(player, session, rng=random.Random(8))
+
+    def test_stage_clear(self):
+        player, session = PlayerState(), SessionState(stage_index=2, turn=10)
+        out = play_turn(player, session, rng=random.Random(9), effects=NO_EFFECT)
+
+        self.assertTrue(out.cleared_stage)
+        self.assertFalse(out.cleared_game)
+        self.assertEqual(_types(out)[-3:], [EventType.STAGE_CLEAR, EventType.STAGE_ENTER, EventType.TURN_END])
+        self.assertEqual(out.events[-3].attrs, {"stage_index": 2})
+        self.assertEqual(out.events[-2].attrs, {"stage_index": 3})
+        self.assertEqual(out.session_delta, {"stage_index": (2, 3), "turn": (10, 1)})
+
+    def test_game_clear(self):
+        player, session = PlayerState(), SessionState(stage_index=10, turn=10)
+        out = play_turn(player, session, rng=random.Random(10), effects=NO_EFFECT)
+
+        self.assertTrue(out.cleared_stage and out.cleared_game and out.ended)
+        self.assertEqual(_types(out)[-4:], [EventType.STAGE_CLEAR, EventType.CLEAR_GAME,
+                                            EventType.SESSION_END, EventType.TURN_END])
+        self.assertEqual(session.status, SessionStatus.CLEARED)
+        self.assertEqual(out.session_delta, {"status": (SessionStatus.ACTIVE, SessionStatus.CLEARED)})
+
+    def test_seeded_games_are_deterministic(self):
+        def run(seed):
+            rng = random.Random(seed)
+            player, session = PlayerState(), SessionState()
+            snapshots = []
+            while session.status == SessionStatus.ACTIVE:
+                out = play_turn(player, session, action_text="ไปต่อ", rng=rng, **_strategy(session, player))
+                snapshots.extend(ev.snapshot() for ev in out.events)
+            return session.status, snapshots
+
+        for seed in range(20):
+            status, events = run(seed)
+            self.assertIn(status, (SessionStatus.DEAD, SessionStatus.CLEARED))
+            self.assertEqual(run(seed), (status, events))
+            self.assertEqual(events[0][0], EventType.STAGE_ENTER)
+            self.assertEqual(events[-1][0], EventType.TURN_END)
+            self.assertEqual(sum(e[0] == EventType.SESSION_END for e in events), 1)
+
+# ---------- admission gate / circuit breaker (ไม่มี DB) ----------
+
+def _wait_until(cond, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.001)
+
+class AdmissionGateTests(unittest.TestCase):
+    def _queue(self, gate: AdmissionGate, priority: int, order: list) -> threading.Thread:
+        """thread ที่รอ slot แล้วจดลำดับที่ได้ (ถือ slot ไว้แป๊บเดียวแล้วคืน)"""
+        def run():
+            if gate.acquire(priority, timeout=5):
+                order.append(priority)
+                gate.release()
+        t = threading.Thread(target=run)
+        queued = gate.queued
+        t.start()
+        _wait_until(lambda: gate.queued == queued + 1)
+        return t
+
+    def test_act_is_admitted_before_intro(self):
+        gate, order = AdmissionGate(max_concurrent=1), []
+        self.assertTrue(gate.acquire())
+        waiters = [self._queue(gate, PRIORITY_INTRO, order), self._queue(gate, PRIORITY_ACT, order),
+                   self._queue(gate, PRIORITY_INTRO, order)]
+        gate.release()
+        for t in waiters:
+            t.join()
+        self.assertEqual(order, [PRIORITY_ACT, PRIORITY_INTRO, PRIORITY_INTRO])
+        self.assertEqual((gate.in_flight, gate.queued, gate.admitted), (0, 0, 4))
+
+    def test_rejected_after_max_wait(self):
+        gate = AdmissionGate(max_concurrent=1, max_wait_s=0.05)
+        self.assertTrue(gate.acquire())
+        started = time.monotonic()
+        self.assertFalse(gate.acquire())
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual((gate.rejected, gate.queued, gate.in_flight), (1, 0, 1))
+        gate.release()
+        self.assertEqual(gate.in_flight, 0)   # waiter ที่ถอดใจไปแล้วไม่ได้ slot ค้าง
+
+    def test_release_hands_slot_directly_to_waiter(self):
+        gate, order = AdmissionGate(max_concurrent=1, max_wait_s=0.01), []
+        self.assertTrue(gate.acquire())
+        hold = threading.Event()
+
+        def waiter():
+            if gate.acquire(timeout=5):
+                order.append("waiter")
+                hold.wait(5)
+                gate.release()
+        t = threading.Thread(target=waiter)
+        t.start()
+        _wait_until(lambda: gate.queued == 1)
+
+        gate.release()
+        self.assertEqual(gate.in_flight, 1)      # ไม่ลดเป็น 0 ระหว่างส่งต่อ → คนมาใหม่แซงคิวไม่ได้
+        self.assertFalse(gate.acquire())
+        hold.set()
+        t.join()
+        self.assertEqual(order, ["waiter"])
+        self.assertEqual(gate.in_flight, 0)
+
+    def test_cancelled_aacquire_returns_granted_slot(self):
+        gate = AdmissionGate(max_concurrent=1, max_wait_s=5)
+
+        async def run():
+            self.assertTrue(await gate.aacquire())
+            task = asyncio.ensure_future(gate.aacquire())
+            while gate.queued == 0:
+                await asyncio.sleep(0)
+            gate.release()                       # ส่ง slot ให้ task แล้ว แต่ task ยังไม่ได้ตื่น
+            task.cancel()                        # request ถูกยกเลิกพอดี
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return gate.in_flight, await gate.aacquire(timeout=0.01)
+
+        self.assertEqual(asyncio.run(run()), (0, True))
+
+    def test_cancelled_aacquire_leaves_queue(self):
+        gate = AdmissionGate(max_concurrent=1, max_wait_s=5)
+
+        async def run():
+            await gate.aacquire()
+            task = asyncio.ensure_future(gate.aacquire())
+            while gate.queued == 0:
+                await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            gate.release()
+
+        asyncio.run(run())
+        self.assertEqual((gate.in_flight, gate.queued), (0, 0))
+
+    def test_slot_context_managers_release(self):
+        gate = AdmissionGate(max_concurrent=1, max_wait_s=0.01)
+        with gate.slot() as admitted:
+            self.assertTrue(admitted)
+            with gate.slot() as second:
+                self.assertFalse(second)
+        self.assertEqual(gate.in_flight, 0)
+
+        async def run():
+            async with gate.aslot(PRIORITY_INTRO) as admitted:
+                return admitted, gate.in_flight
+        self.assertEqual(asyncio.run(run()), (True, 1))
+        self.assertEqual(gate.in_flight, 0)
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("roll.breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        b = self.breaker
+        b.record_failure()
+        b.record_success()                       # สำเร็จคั่น → นับใหม่
+        b.record_failure()
+        self.assertEqual(b.state, CircuitBreaker.CLOSED)
+        b.record_failure(timeout=True)
+        self.assertEqual(b.state, CircuitBreaker.OPEN)
+        self.assertFalse(b.allow())
+        self.assertEqual((b.opens, b.timeouts, b.short_circuits), (1, 1, 1))
+
+    def test_half_open_lets_one_probe_through(self):
+        b = self.breaker
+        b.record_failure(), b.record_failure()
+        self.now += 31
+        self.assertTrue(b.allow())
+        self.assertEqual(b.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(b.allow())              # probe เดียว ที่เหลือใช้ baseline
+        self.assertEqual(b.probes, 1)
+
+    def test_probe_failure_reopens(self):
+        b = self.breaker
+        b.record_failure(), b.record_failure()
+        self.now += 31
+        self.assertTrue(b.allow())
+        b.record_failure()                       # ครั้งเดียวก็เปิดใหม่ ไม่ต้องครบ threshold
+        self.assertEqual((b.state, b.opens), (CircuitBreaker.OPEN, 2))
+        self.now += 10
+        self.assertFalse(b.allow())
+
+    def test_probe_success_closes(self):
+        b = self.breaker
+        b.record_failure(), b.record_failure()
+        self.now += 31
+        self.assertTrue(b.allow())
+        b.record_success()
+        self.assertEqual(b.state, CircuitBreaker.CLOSED)
+        self.assertTrue(b.allow() and b.allow())
+
+    def test_lost_probe_is_replaced_after_reset_timeout(self):
+        b = self.breaker
+        b.record_failure(), b.record_failure()
+        self.now += 31
+        self.assertTrue(b.allow())               # probe ที่ไม่เคยรายงานผล (client ตัดสาย)
+        self.now += 31
+        self.assertTrue(b.allow())
+        self.assertEqual(b.probes, 2)
+
+# ---------- narrator → circuit breaker (ไม่มี DB) ----------
+
+def _llm_response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def _llm_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+def _fake_client(create):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+GOOD_JSON = json.dumps({"narration": "เงามืดขยับ", "hp_delta": -2})
+
+class NarratorBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        patcher = mock.patch.object(narrator, "narrator_breaker", self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unparseable_200_counts_as_failure(self):
+        for content in ("", None, "ขอโทษ ตอบเป็น JSON ไม่ได้"):
+            client = _fake_client(lambda **kw: _llm_response(content))
+            self.assertIsNone(narrator.call_llm_narrator({}, groq_client=client))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual((self.breaker.successes, self.breaker.failures), (0, 3))
+
+    def test_parsed_response_counts_as_success(self):
+        client = _fake_client(lambda **kw: _llm_response(GOOD_JSON))
+        self.assertEqual(narrator.call_llm_narrator({}, groq_client=client)["narration"], "เงามืดขยับ")
+        self.assertEqual((self.breaker.successes, self.breaker.failures), (1, 0))
+
+    def test_async_unparseable_200_counts_as_failure(self):
+        async def create(**kw):
+            return _llm_response("")
+        self.assertIsNone(asyncio.run(narrator.acall_llm_narrator({}, groq_client=_fake_client(create))))
+        self.assertEqual((self.breaker.successes, self.breaker.failures), (0, 1))
+
+    def test_stream_success_only_when_content_parses(self):
+        def create(chunks):
+            return _fake_client(lambda **kw: iter([_llm_chunk(c) for c in chunks]))
+
+        list(narrator.stream_llm_narrator({}, groq_client=create([GOOD_JSON[:10], GOOD_JSON[10:]])))
+        self.assertEqual((self.breaker.successes, self.breaker.failures), (1, 0))
+        list(narrator.stream_llm_narrator({}, groq_client=create(["", "not json"])))
+        self.assertEqual((self.breaker.successes, self.breaker.failures), (1, 1))
+
+    def test_budget_timeout_phases_fit_in_remaining_budget(self):
+        t = narrator._budget_timeout(time.monotonic() + 8.0)
+        self.assertLessEqual(t.pool + t.connect + t.write + t.read, 8.0)
+        self.assertGreater(t.read, 4.0)
+
+    def test_async_stalled_stream_is_cut_at_the_budget(self):
+        class Stalled:
+            def __aiter__(self):
+                return self
+            async def __anext__(self):
+                if not hasattr(self, "sent"):
+                    self.sent = True
+                    return _llm_chunk('{"narration": "')
+                await asyncio.sleep(30)   # provider เงียบไปกลาง stream
+
+        async def create(**kw):
+            return Stalled()
+
+        async def consume():
+            return [c async for c in narrator.astream_llm_narrator({}, groq_client=_fake_client(create), timeout_s=0.2)]
+
+        started = time.monotonic()
+        with self.assertRaises(narrator.NarratorBudgetExceeded):
+            asyncio.run(consume())
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual((self.breaker.failures, self.breaker.timeouts), (1, 1))
+
+    def test_async_slow_call_is_cut_at_the_budget(self):
+        async def create(**kw):
+            await asyncio.sleep(30)
+
+        started = time.monotonic()
+        self.assertIsNone(asyncio.run(narrator.acall_llm_narrator({}, groq_client=_fake_client(create), timeout_s=0.2)))
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.breaker.timeouts, 1)
+
+# ---------- progress (DB) = engine ----------
+
+class ProgressMatchesEngineTests(TestCase):
+    def _play_db(self, seed: int, max_turns: int = 100):
+        player = Player.objects.create(anon_id=f"test-{seed}")
+        session = Session.objects.create(player=player)
+        rng = random.Random(seed)
+        for _ in range(max_turns):
+            if session.status != SessionStatus.ACTIVE:
+                break
+            choice = _strategy(SessionState.of(session), PlayerState.of(player))
+            plan = progress.begin_turn(session=session, player=player, action_text="ไปต่อ", rng=rng, **choice)
+            ai = AIResult(narration="", **BASELINE_TIER_EFFECTS[plan.roll.tier])
+            progress.commit_turn(plan, ai)
+        rows = (EventLog.objects.filter(session=session).order_by("id")
+                .values_list("type", "stage_index", "turn", "hp", "mp", "pot_heal_ct", "pot_boost_ct"))
+        player.refresh_from_db()
+        session.refresh_from_db()
+        return list(rows), PlayerState.of(player).as_tuple(), (session.stage_index, session.turn, session.status)
+
+    def _play_engine(self, seed: int, max_turns: int = 100):
+        player, session = PlayerState(), SessionState()
+        rng = random.Random(seed)
+        events = []
+        for _ in range(max_turns):
+            if session.status != SessionStatus.ACTIVE:
+                break
+            out = play_turn(player, session, action_text="ไปต่อ", rng=rng, **_strategy(session, player))
+            events.extend(ev.snapshot() for ev in out.events)
+        return events, player.as_tuple(), (session.stage_index, session.turn, session.status)
+
+    def test_same_events_and_final_state(self):
+        for seed in (1, 2, 3, 11):
+            with self.subTest(seed=seed):
+                self.assertEqual(self._play_db(seed), self._play_engine(seed))
+
+    def test_action_result_attrs_carry_ai_result(self):
+        player = Player.objects.create(anon_id="test-attrs")
+        session = Session.objects.create(player=player, turn=2)
+        plan = progress.begin_turn(session=session, player=player, action_text="ไปต่อ", rng=random.Random(0))
+        progress.commit_turn(plan, AIResult(narration="n", hp_delta=-3, status=["bleeding"]))
+
+        attrs = EventLog.objects.get(session=session, type=EventType.ACTION_RESULT).attrs
+        self.assertEqual((attrs["hp_delta"], attrs["status"], attrs["narration"]), (-3, ["bleeding"], "n"))
+        self.assertNotIn("source", attrs)
+        self.assertEqual(attrs["dice_roll"], plan.roll.dice_roll)
+        player.refresh_from_db()
+        self.assertEqual(player.hp, PLAYER_HP_MAX - 3)
+
+    def test_engine_fields_match_models(self):
+        for f in engine.PLAYER_FIELDS:
+            Player._meta.get_field(f)
+        for f in engine.SESSION_FIELDS:
+            Session._meta.get_field(f)
+
+# ---------- การจองเทิร์น ----------
+
+class TurnReservationTests(TestCase):
+    def setUp(self):
+        self.player = Player.objects.create(anon_id="reserve")
+        self.session = Session.objects.create(player=self.player, turn=2)
+
+    def _begin(self, seed: int = 0):
+        # instance ใหม่ทุกครั้ง เหมือนสอง request ที่โหลด session มาแยกกัน
+        session = Session.objects.get(pk=self.session.pk)
+        return progress.begin_turn(session=session, player=session.player, action_text="ไปต่อ", rng=random.Random(seed))
+
+    def _ai(self, plan):
+        return AIResult(narration="", **BASELINE_TIER_EFFECTS[plan.roll.tier])
+
+    def test_second_begin_conflicts_and_act_returns_409(self):
+        plan = self._begin()
+        with self.assertRaises(progress.TurnConflict):
+            self._begin()
+
+        resp = Client(HTTP_X_ANON_ID="reserve").post(f"/api/session/{self.session.pk}/act",
+                                                     data=json.dumps({"action_text": "ไปต่อ"}),
+                                                     content_type="application/json")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(Session.objects.get(pk=self.session.pk).turn_token, plan.token)
+
+    def test_expired_reservation_can_be_taken_over(self):
+        stale = self._begin()
+        Session.objects.filter(pk=self.session.pk).update(
+            turn_reserved_at=timezone.now() - progress.TURN_RESERVATION_TTL - timedelta(seconds=1))
+
+        plan = self._begin(seed=1)
+        self.assertNotEqual(plan.token, stale.token)
+        with self.assertRaises(progress.TurnConflict):
+            progress.commit_turn(stale, self._ai(stale))
+        progress.commit_turn(plan, self._ai(plan))
+
+        session = Session.objects.get(pk=self.session.pk)
+        self.assertEqual((session.turn, session.turn_token), (3, None))
+        self.assertEqual(EventLog.objects.filter(session=session, type=EventType.ACTION_RESULT).count(), 1)
+
+    def test_commit_with_stale_token_is_rejected_without_touching_new_reservation(self):
+        stale = self._begin()
+        progress.release_turn(stale)
+        plan = self._begin(seed=1)
+
+        with self.assertRaises(progress.TurnConflict):
+            progress.commit_turn(stale, self._ai(stale))
+        session = Session.objects.get(pk=self.session.pk)
+        self.assertEqual((session.turn, session.turn_token), (2, plan.token))   # ไม่คืนการจองของ plan
+        self.assertFalse(EventLog.objects.filter(session=session).exists())
+
+    def test_commit_on_ended_session_conflicts(self):
+        plan = self._begin()
+        Session.objects.filter(pk=self.session.pk).update(status=SessionStatus.ESCAPED)
+        with self.assertRaises(progress.TurnConflict):
+            progress.commit_turn(plan, self._ai(plan))
+        with self.assertRaises(progress.TurnConflict):
+            self._begin()
+
+    def test_exception_inside_commit_releases_reservation(self):
+        plan = self._begin()
+        with mock.patch.object(progress, "_persist_turn", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                progress.commit_turn(plan, self._ai(plan))
+
+        session = Session.objects.get(pk=self.session.pk)
+        self.assertEqual((session.turn, session.turn_token, session.turn_reserved_at), (2, None, None))
+        self.assertFalse(EventLog.objects.filter(session=session).exists())
+        retry = self._begin()                                    # กดใหม่ได้ทันที ไม่ใช่ 409
+        progress.commit_turn(retry, self._ai(retry))
+
+# ---------- start_session หลัง gc_players ----------
+
+class StartSessionTests(TestCase):
+    def test_stale_identity_mapping_is_re_resolved(self):
+        pid = identity.resolve_player_id(anon_id="gc-stale")
+        Player.objects.filter(pk=pid).delete()                   # gc_players ลบ แต่ LRU ของ worker นี้ยังจำ pid เดิม
+
+        resp = Client(HTTP_X_ANON_ID="gc-stale").post("/api/session/start")
+        self.assertEqual(resp.status_code, 201)
+        player = Player.objects.get(anon_id="gc-stale")
+        self.assertEqual(Session.objects.get(player=player).status, SessionStatus.ACTIVE)
+        self.assertEqual(identity.resolve_player_id(anon_id="gc-stale"), player.pk)
+
+    def test_create_session_survives_player_deleted_mid_request(self):
+        player = Player.objects.get(pk=identity.resolve_player_id(anon_id="gc-race"))
+        Player.objects.filter(pk=player.pk).delete()             # ลบหลัง resolve แต่ก่อน INSERT Session
+        request = RequestFactory().post("/api/session/start", HTTP_X_ANON_ID="gc-race")
+        request.user = AnonymousUser()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_player, session = views._create_session(request, player)
+        self.assertEqual(Player.objects.get(anon_id="gc-race").pk, new_player.pk)
+        self.assertEqual(Session.objects.get(pk=session.pk).player_id, new_player.pk)
+        self.assertEqual(EventLog.objects.get(session=session).type, EventType.SESSION_START)
+
+# ---------- session_cache ----------
+
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_X_ANON_ID="cached")
+        with self.captureOnCommitCallbacks(execute=True):   # session_cache.store รันตอน commit
+            self.sid = self.client.post("/api/session/start").json()["session_id"]
+
+    def _get_state(self):
+        return self.client.get(f"/api/session/{self.sid}/state")
+
+    def _post(self, path: str, body=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/session/{self.sid}/{path}", data=json.dumps(body or {}),
+                                    content_type="application/json")
+
+    def test_warm_get_state_hits_no_db(self):
+        self.assertEqual(self._get_state().status_code, 200)
+        with self.assertNumQueries(0):
+            resp = self._get_state()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["turn"], 1)
+
+    def test_state_after_act_is_fresh(self):
+        self._get_state()
+        self.assertEqual(self._post("act", {"action_text": "ไปต่อ"}).status_code, 200)
+
+        with self.assertNumQueries(0):                   # write-through หลัง commit → ยัง hit
+            state = self._get_state().json()
+        session = Session.objects.select_related("player").get(pk=self.sid)
+        self.assertEqual((state["turn"], state["status"], state["stage_index"]),
+                         (session.turn, session.status, session.stage_index))
+        self.assertEqual(state["turn"], 2)
+        self.assertEqual(state["player"], views._player_json(session.player))
+
+    def test_ended_session_is_rejected(self):
+        self._get_state()
+        self.assertEqual(self._post("end").status_code, 200)
+
+        self.assertEqual(self._post("end").status_code, 400)
+        self.assertEqual(self._post("act", {"action_text": "ไปต่อ"}).status_code, 400)
+        self.assertEqual(self._get_state().json()["status"], SessionStatus.ESCAPED)
+
+    def test_other_player_cannot_use_cached_session(self):
+        self._get_state()
+        resp = Client(HTTP_X_ANON_ID="intruder").get(f"/api/session/{self.sid}/state")
+        self.assertEqual(resp.status_code, 404)
+
+class StateETagTests(TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_X_ANON_ID="etag")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.url = f"/api/session/{self.client.post('/api/session/start').json()['session_id']}"
+
+    def test_if_none_match_returns_304(self):
+        tag = self.client.get(f"{self.url}/state").headers["ETag"]
+        with self.assertNumQueries(0):
+            resp = self.client.get(f"{self.url}/state", HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp.headers["ETag"], tag)
+
+    def test_etag_changes_after_turn(self):
+        tag = self.client.get(f"{self.url}/state").headers["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{self.url}/act", data=json.dumps({"action_text": "ไปต่อ"}),
+                             content_type="application/json")
+
+        resp = self.client.get(f"{self.url}/state", HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["ETag"], tag)
+        self.assertEqual(resp.json()["turn"], 2)
+
+# ---------- act_stream ----------
+
+class ActStreamTests(TestCase):
+    def setUp(self):
+        self.client = Client(HTTP_X_ANON_ID="stream")
+        self.sid = self.client.post("/api/session/start").json()["session_id"]
+
+    def _act_stream(self):
+        return self.client.post(f"/api/session/{self.sid}/act/stream", data=json.dumps({"action_text": "ไปต่อ"}),
+                                content_type="application/json")
+
+    def test_disconnect_before_first_chunk_releases_turn(self):
+        resp = self._act_stream()
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNotNone(Session.objects.get(pk=self.sid).turn_token)
+        resp.close()                                             # server ปิด response โดยยังไม่ได้อ่าน body เลย
+
+        session = Session.objects.get(pk=self.sid)
+        self.assertIsNone(session.turn_token)
+        self.assertEqual(session.turn, 1)                        # ไม่ได้ commit
+        self.assertEqual(self._act_stream().status_code, 200)   # กดใหม่ได้ทันที ไม่ใช่ 409
+
+    def test_full_stream_commits_turn(self):
+        resp = self._act_stream()
+        body = b"".join(resp.streaming_content).decode()
+        resp.close()
+        self.assertIn("event: result", body)
+        session = Session.objects.get(pk=self.sid)
+        self.assertIsNone(session.turn_token)
+        self.assertEqual(session.turn, 2)
+
+# ---------- /api/metrics ----------
+
+class MetricsViewTests(TestCase):
+    def test_staff_only(self):
+        client = Client()
+        self.assertEqual(client.get("/api/metrics").status_code, 302)   # → หน้า login ของ admin
+        client.force_login(User.objects.create_user("player"))
+        self.assertEqual(client.get("/api/metrics").status_code, 302)
+        client.force_login(User.objects.create_user("ops", is_staff=True))
+        resp = client.get("/api/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("identity_cache", resp.json())
+
+# ---------- rollups = aggregate ตรง ----------
+
+def _direct_kpis() -> dict:
+    """ตัวเลขชุดเดียวกับ native_dashboard ก่อนมี rollup: aggregate สดจาก EventLog/Session"""
+    starts = EventLog.objects.filter(type=EventType.SESSION_START)
+    deaths = EventLog.objects.filter(type=EventType.DEATH)
+
+    stage_seconds = defaultdict(list)
+    spans = EventLog.objects.values("session_id", "stage_index").annotate(tmin=Min("ts"), tmax=Max("ts"))
+    for r in spans:
+        if r["tmax"] > r["tmin"]:
+            stage_seconds[r["stage_index"]].append((r["tmax"] - r["tmin"]).total_seconds())
+
+    t0 = dict(starts.values_list("session_id").annotate(t=Min("ts")).order_by())
+    to_death = [(td - t0[sid]).total_seconds()
+                for sid, td in deaths.values_list("session_id").annotate(t=Min("ts")).order_by() if sid in t0]
+
+    ent = dict(starts.annotate(day=TruncDate("ts")).values_list("day").annotate(c=Count("id")).order_by())
+    fin = dict(Session.objects.filter(status=SessionStatus.CLEARED).annotate(day=TruncDate("ended_at"))
+               .values_list("day").annotate(c=Count("id")).order_by())
+    return {
+        "entrants": starts.values("player_id").distinct().count(),
+        "finishers": Session.objects.filter(status=SessionStatus.CLEARED).values("player_id").distinct().count(),
+        "avg_time_to_death": sum(to_death) / len(to_death) if to_death else 0.0,
+        "active_by_stage": dict(Session.objects.filter(status=SessionStatus.ACTIVE)
+                                .values_list("stage_index").annotate(c=Count("id")).order_by()),
+        "deaths_by_stage": dict(deaths.values_list("stage_index").annotate(c=Count("id")).order_by()),
+        "stage_avg_seconds": {s: sum(v) / len(v) for s, v in stage_seconds.items()},
+        "daily": [(d, ent.get(d, 0), fin.get(d, 0)) for d in sorted(set(ent) | set(fin))],
+    }
+
+class RollupTests(TestCase):
+    def _play(self, anon_id: str, *, max_turns: int = 200, escape: bool = False) -> UUID:
+        client = Client(HTTP_X_ANON_ID=anon_id)
+        sid = UUID(client.post("/api/session/start").json()["session_id"])
+        status, turns = SessionStatus.ACTIVE, 0
+        while status == SessionStatus.ACTIVE and turns < max_turns:
+            body = {"action_text": "ไปต่อ", "use_mp": 2, "use_heal": turns % 4 == 0, "use_boost": True}
+            status = client.post(f"/api/session/{sid}/act", data=json.dumps(body),
+                                 content_type="application/json").json().get("status", status)
+            turns += 1
+        if escape and status == SessionStatus.ACTIVE:
+            client.post(f"/api/session/{sid}/end")
+        return sid
+
+    def _assert_matches_direct(self):
+        got, want = PostgresAnalytics().dashboard(), _direct_kpis()
+        for name in ("entrants", "finishers", "active_by_stage", "deaths_by_stage", "daily"):
+            self.assertEqual(getattr(got, name), want[name], name)
+        self.assertAlmostEqual(got.avg_time_to_death, want["avg_time_to_death"], places=6)
+        self.assertEqual(got.stage_avg_seconds.keys(), want["stage_avg_seconds"].keys())
+        for stage, secs in want["stage_avg_seconds"].items():
+            self.assertAlmostEqual(got.stage_avg_seconds[stage], secs, places=6)
+
+    def test_rebuild_in_small_batches_matches_direct_aggregates(self):
+        for i in range(3):
+            self._play(f"rollup-{i}")
+            self._play(f"rollup-{i}")
+        self._play("rollup-live", max_turns=13)                  # ยังค้าง ACTIVE
+        self._play("rollup-escape", max_turns=4, escape=True)
+
+        r = rollups.rebuild(batch_size=7, settle=0)
+        self.assertTrue(r["caught_up"])
+        self.assertGreater(r["batches"], 1)
+        self._assert_matches_direct()
+
+        # refresh ต่อจาก watermark (ไม่ rebuild) ก็ต้องได้ค่าเดียวกัน
+        self._play("rollup-late", max_turns=9)
+        rollups.refresh(batch_size=5, settle=0)
+        self._assert_matches_direct()
+
+    def test_refresh_prunes_spans_of_gone_sessions(self):
+        live = self._play("prune-live", max_turns=3)
+        gone = self._play("prune-gone", max_turns=3)
+        rollups.refresh(settle=0)
+        self.assertEqual(set(RollupSpan.objects.values_list("session_id", flat=True)), {live, gone})
+
+        Session.objects.filter(pk=gone).delete()                 # เช่น gc_players (EventLog หายตาม cascade)
+        # ปิด session โดยไม่มี session_end แต่ยังมี event ที่ยังไม่ได้รวม → span ต้องอยู่จนกว่าจะรวมครบ
+        self._play("prune-live", max_turns=1)                   # เล่นต่อ session เดิมอีกเทิร์น
+        Session.objects.filter(pk=live).update(status=SessionStatus.ESCAPED)
+        rollups.prune_spans()
+        self.assertEqual(set(RollupSpan.objects.values_list("session_id", flat=True)), {live})
+
+        r = rollups.refresh(settle=0)
+        self.assertGreater(r["pruned_spans"], 0)
+        self.assertFalse(RollupSpan.objects.exists())
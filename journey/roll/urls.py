@@ -1,11 +1,17 @@
 from django.urls import path,include
-from roll import views
+from django.conf import settings
+from roll import views, views_async
 from .views import native_dashboard
 
+# บน ASGI เปิด ROLL_ASYNC_VIEWS เพื่อใช้ endpoint แบบ async (views แบบ sync ยังเป็น fallback)
+api = views_async if getattr(settings, "ROLL_ASYNC_VIEWS", False) else views
+
 urlpatterns = [ 
-    path("api/session/start", views.start_session, name="start_session"),
-    path("api/session/<uuid:session_id>/state", views.get_state, name="get_state"),
-    path("api/session/<uuid:session_id>/act", views.act, name="act"),
+    path("api/session/start", api.start_session, name="start_session"),
+    path("api/session/<uuid:session_id>/state", api.get_state, name="get_state"),
+    path("api/odds", views.odds, name="odds"),
+    path("api/session/<uuid:session_id>/act", api.act, name="act"),
+    path("api/session/<uuid:session_id>/act/stream", api.act_stream, name="act_stream"),
     path("api/session/<uuid:session_id>/end", views.end_session, name="end_session"),
 
     path('', views.login_view, name='home'),  # หน้าแรกคือ login
@@ -13,7 +19,8 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('game/', views.game_view, name='game'),
-    path("api/session/<uuid:session_id>/intro", views.intro, name="intro"),
+    path("api/session/<uuid:session_id>/intro", api.intro, name="intro"),
+    path("api/metrics", views.metrics_view, name="metrics"),
     path("dashboard/", native_dashboard, name="native_dashboard"),
 ]
 
@@ -1,170 +1,55 @@
 from __future__ import annotations
 from django.shortcuts import render, redirect
 from types import SimpleNamespace
+from typing import Optional
 
 # Create your views here.
 
+import hashlib
 import json
 from uuid import uuid4
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed
-from django.views.decorators.http import require_http_methods
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_http_methods
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import csrf_exempt,csrf_protect
-from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db import transaction
-from .models import Player, Session, Stage, EventLog
+from django.db import IntegrityError, transaction
+from .models import Player, Session, Stage
 from .enums import EventType, SessionStatus
-from .progress import resolve_turn
+from .progress import (
+    resolve_turn, TurnConflict,
+    begin_turn, stream_fetch_effects, release_turn, commit_turn,
+)
+from .events import EventBuffer
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.http import require_http_methods
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.conf import settings
 from django.contrib.auth.models import User
-from roll.ai import resolve_effects
-from roll.rules import classify_turn
+from roll.ai import resolve_effects, PRIORITY_INTRO
+from roll.rules import (
+    classify_turn,
+    TIERS, TIER_DISTRIBUTIONS, MP_SPEND_SATURATION,
+    DICE_MIN, DICE_MAX, MP_BONUS_PER_POINT, BOOST_ROLL_BONUS, ITEM_MP_COST, FORCED_MP_TURNS,
+)
+from roll.caches import intro_cache, intro_key, session_cache, instances_from_entry
+from roll import identity, metrics
 # ---------- helpers ----------
 # roll/views.py
 # journey/roll/views.py
-from collections import defaultdict
-from django.db.models import Count, Avg, Max, Min, F, Q
-from django.db.models.functions import TruncDate
 from django.shortcuts import render
 
-from .models import Player, Session, EventLog
-try:
-    # เผื่อโปรเจ็กต์คุณมี enums
-    from .enums import SessionStatus
-    ACTIVE = getattr(SessionStatus, "ACTIVE", "ACTIVE")
-    FINISHED = getattr(SessionStatus, "FINISHED", "FINISHED")
-except Exception:
-    # กันไว้ถ้าไม่มี enums
-    ACTIVE = "ACTIVE"
-    FINISHED = "FINISHED"
+from . import analytics
 
 def native_dashboard(request):
-    # ---------- 🧍 ผู้เล่น ----------
-    # ถ้ามี log session_start ก็ใช้เป็นตัวนับ entrant; ถ้ายังไม่ยิง log ใช้จำนวน Player กันไว้
-    total_entrants = (
-        EventLog.objects.filter(type="session_start").values("player_id").distinct().count()
-        or Player.objects.count()
-    )
-
-    finishers = (
-        Session.objects.filter(status=FINISHED)
-        .values("player_id").distinct().count()
-    )
-    completion_rate = round((finishers / total_entrants) * 100, 1) if total_entrants else 0.0
-
-    recent_players = (
-        Session.objects
-        .values("player_id")
-        .annotate(
-            last_started=Max("started_at"),
-            rounds=Count("id"),
-            last_status=Max("status"),
-        )
-        .order_by("-last_started")[:10]
-    )
-
-    # ---------- 🗺️ ความคืบหน้า ----------
-    # แจกแจง stage ปัจจุบัน (จะเลือก ACTIVE ตามชื่อหมวดในหน้า)
-    current_stage_dist = (
-        Session.objects.filter(status=ACTIVE)
-        .values("stage_index")
-        .annotate(c=Count("id"))
-        .order_by("stage_index")
-    )
-    stage_labels = [f"S{s['stage_index']}" for s in current_stage_dist]
-    stage_counts = [s["c"] for s in current_stage_dist]
-
-    # ---------- 💀 สถิติความตาย ----------
-    deaths = EventLog.objects.filter(type="death")
-    death_total = deaths.count()
-    death_by_stage = list(
-        deaths.values("stage_index").annotate(c=Count("id")).order_by("-c")[:10]
-    )
-    top_death_stage = death_by_stage[0]["stage_index"] if death_by_stage else None
-
-    # ---------- ⏱️ เวลาเล่น ----------
-    # (แก้แบบไม่ซ้อน Aggregate) ดึง min/max ต่อ (session, stage) แล้วคำนวณเฉลี่ยใน Python
-    span_qs = (
-        EventLog.objects
-        .values("session_id", "stage_index")
-        .annotate(tmin=Min("ts"), tmax=Max("ts"))
-    )
-    stage_seconds = defaultdict(list)
-    for r in span_qs:
-        tmin, tmax = r["tmin"], r["tmax"]
-        if tmin and tmax and tmax > tmin:
-            secs = (tmax - tmin).total_seconds()
-            stage_seconds[r["stage_index"]].append(secs)
-
-    time_stage_labels, time_stage_avg_sec = [], []
-    for s in sorted(stage_seconds.keys()):
-        vals = stage_seconds[s]
-        avg_sec = sum(vals) / len(vals) if vals else 0
-        time_stage_labels.append(f"S{s}")
-        time_stage_avg_sec.append(round(avg_sec, 1))
-
-    # เวลาเฉลี่ยก่อนตาย: session_start -> death ที่เร็วสุดของ session
-    starts = (
-        EventLog.objects.filter(type="session_start")
-        .values("session_id").annotate(t0=Min("ts"))
-    )
-    t0_map = {str(x["session_id"]): x["t0"] for x in starts}
-    to_death = []
-    for d in deaths.values("session_id").annotate(td=Min("ts")):
-        s_id = str(d["session_id"])
-        if s_id in t0_map:
-            to_death.append((d["td"] - t0_map[s_id]).total_seconds())
-    avg_time_to_death = round(sum(to_death) / len(to_death), 1) if to_death else 0.0
-
-    # ---------- รายวัน: entrants vs finishers ----------
-    daily_ent = (
-        EventLog.objects.filter(type="session_start")
-        .annotate(day=TruncDate("ts")).values("day").annotate(c=Count("id")).order_by("day")
-    )
-    daily_fin = (
-        Session.objects.filter(status=FINISHED, ended_at__isnull=False)
-        .annotate(day=TruncDate("ended_at")).values("day").annotate(c=Count("id")).order_by("day")
-    )
-    # รวมวันทั้งหมดเพื่อทำแกน x เดียว
-    all_days = sorted({str(x["day"]) for x in daily_ent} | {str(x["day"]) for x in daily_fin})
-    ent_map = {str(x["day"]): x["c"] for x in daily_ent}
-    fin_map = {str(x["day"]): x["c"] for x in daily_fin}
-    daily_labels = all_days
-    daily_ent_vals = [ent_map.get(d, 0) for d in all_days]
-    daily_fin_vals = [fin_map.get(d, 0) for d in all_days]
-
-    context = {
-        # KPI
-        "total_entrants": total_entrants,
-        "finishers": finishers,
-        "completion_rate": completion_rate,
-        "avg_time_to_death": avg_time_to_death,
-
-        # ผู้เล่นล่าสุด
-        "recent_players": list(recent_players),
-
-        # ความคืบหน้า
-        "stage_labels": stage_labels,
-        "stage_counts": stage_counts,
-
-        # ความตาย
-        "death_total": death_total,
-        "top_death_stage": top_death_stage,
-        "death_by_stage": death_by_stage,
-
-        # เวลาเล่น
-        "time_stage_labels": time_stage_labels,
-        "time_stage_avg_sec": time_stage_avg_sec,
-
-        # รายวัน
-        "daily_labels": daily_labels,
-        "daily_ent_vals": daily_ent_vals,
-        "daily_fin_vals": daily_fin_vals,
-    }
-    return render(request, "roll/native_dashboard.html", context)
+    """
+    ตัวเลขมาจาก roll/analytics.py ตาม settings.ANALYTICS_BACKEND
+    (ตาราง rollup บน Postgres หรือ event_log ใน ClickHouse) — ไม่ aggregate EventLog สดข้างๆ ธุรกรรมของเกม
+    """
+    return render(request, "roll/native_dashboard.html", analytics.dashboard().to_context())
 
 ########################################################################################
 
@@ -279,50 +164,226 @@ def game_view(request):
     return render(request, "game.html", {})
 
 
-def _get_or_create_player(request) -> Player:
+def _player_id(request) -> int:
+    """
+    Player.id ของผู้เรียก (login → ผูกกับ user, ไม่งั้นใช้ header X-ANON-ID; ไม่มีทั้งคู่สร้างผู้เล่นใหม่)
+    ผ่าน roll.identity: warm hit ไม่แตะ DB, cold miss = INSERT ... ON CONFLICT คำสั่งเดียว (ไม่แข่งกันแบบ get_or_create)
+    """
+    return identity.resolve_player_id(*identity.request_identity(request))
+
+def _get_or_create_player(request, pid: Optional[int] = None) -> Player:
     """
     Finds or creates a player.
     - For logged-in users, it's linked to their user account.
     - For anonymous users, it uses the 'X-ANON-ID' header or creates a new one.
+    pid: id ที่ resolve ไว้แล้วใน request นี้ (ไม่มี X-ANON-ID แต่ละครั้งที่ resolve = ผู้เล่นใหม่ → ต้อง resolve ครั้งเดียว)
     """
-    if request.user and request.user.is_authenticated:
-        # --- THIS IS THE FIX ---
-        # When creating a player for a logged-in user for the first time,
-        # also create a unique anon_id for them.
-        player, _ = Player.objects.get_or_create(
-            user=request.user,
-            defaults={'anon_id': uuid4().hex}
-        )
-        return player
+    player = Player.objects.filter(pk=pid if pid is not None else _player_id(request)).first()
+    if player is None:
+        # mapping ค้างของ Player ที่ถูกลบไปแล้ว → ล้างแล้ว resolve ใหม่ (จะสร้างแถวใหม่ให้)
+        identity.forget(*identity.request_identity(request))
+        player = Player.objects.get(pk=_player_id(request))
+    return player
 
-    # This part for anonymous users is already correct
+def _owns_entry(request, cached_player: dict) -> bool:
+    """ผู้เรียกเป็นเจ้าของ snapshot นี้ไหม (เกณฑ์เดียวกับ _get_or_create_player: user ก่อน แล้วค่อย X-ANON-ID)"""
+    if request.user and request.user.is_authenticated:
+        return cached_player["user_id"] == request.user.pk
     anon_id = request.headers.get("X-ANON-ID")
-    if not anon_id:
-        anon_id = uuid4().hex
-    
-    player, _ = Player.objects.get_or_create(anon_id=anon_id)
-    return player
+    return bool(anon_id) and cached_player["anon_id"] == anon_id
 
-def _log_session(player: Player, session: Session, etype: EventType, attrs=None):
-    """log บางเหตุการณ์ระดับ session (ไม่ไปซ้ำกับ progress ที่ log ระดับ turn)"""
-    EventLog.objects.create(
-        ts=timezone.now(),
-        player=player,
-        session=session,
-        type=etype,
-        stage_index=session.stage_index,
-        turn=session.turn,
-        hp=player.hp,
-        mp=player.mp,
-        potions=(player.pot_heal + player.pot_boost),
-        pot_heal_ct=player.pot_heal,
-        pot_boost_ct=player.pot_boost,
-        attrs=attrs or {},
-    )
+def _player_and_session(request, session_id):
+    """
+    (player, session) ของผู้เรียก — ลอง session_cache ก่อน (hit = ไม่มี query)
+    miss → หา session ของผู้เล่นนี้ (404 ถ้าไม่ใช่ของผู้เรียก) แล้วเติม cache ถ้า session ยัง ACTIVE
+    """
+    entry = session_cache.get(session_id)
+    if entry is not None and _owns_entry(request, entry["player"]):
+        return instances_from_entry(entry)
+    # Player มากับ session ใน query เดียว (id ผู้เล่นได้จาก identity cache)
+    session = (Session.objects.select_related("player")
+               .filter(id=session_id, player_id=_player_id(request)).first())
+    if session is None:
+        raise Http404("No Session matches the given query.")
+    session_cache.fill(session, session.player)
+    return session.player, session
+
+def _log_session(player: Player, session: Session, etype: EventType, attrs=None, *, events: EventBuffer = None):
+    """log บางเหตุการณ์ระดับ session (ไม่ไปซ้ำกับ progress ที่ log ระดับ turn)
+    - ถ้าส่ง events มา จะต่อท้าย buffer นั้น (ผู้เรียกเป็นคน flush)
+    - ถ้าไม่ส่ง จะเขียนลง DB ทันที
+    """
+    buf = events if events is not None else EventBuffer()
+    buf.log(player, session, etype, attrs=attrs)
+    if events is None:
+        buf.flush()
 
 def _bad_request(msg: str):
     return HttpResponseBadRequest(json.dumps({"error": msg}), content_type="application/json")
 
+def _conflict(msg: str):
+    return JsonResponse({"error": msg}, status=409)
+
+# ---------- response/body helpers (ใช้ร่วมกับ views_async) ----------
+
+def _player_json(player) -> dict:
+    return {"hp": player.hp, "mp": player.mp, "pot_heal": player.pot_heal, "pot_boost": player.pot_boost}
+
+def _state_json(session, player) -> dict:
+    return {
+        "session_id": str(session.id),
+        "status": session.status,
+        "stage_index": session.stage_index,
+        "turn": session.turn,
+        "player": _player_json(player),
+    }
+
+def _parse_act_body(request):
+    """
+    แปลง body ของ act → (kwargs สำหรับ resolve_turn, None)
+    ถ้า body ไม่ถูกต้องคืน (None, response 400)
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8")) if request.body else {}
+    except json.JSONDecodeError:
+        return None, _bad_request("invalid JSON body")
+
+    action_text = (payload.get("action_text") or "").strip()
+    if not action_text:
+        return None, _bad_request("action_text is required")
+
+    seed = payload.get("seed")  # อนุญาต None หรือ int
+    rng = None
+    if isinstance(seed, int):
+        import random
+        rng = random.Random(seed)
+
+    return {
+        "action_text": action_text,
+        "use_mp": int(payload.get("use_mp") or 0),
+        "use_heal": bool(payload.get("use_heal") or False),
+        "use_boost": bool(payload.get("use_boost") or False),
+        "rng": rng,
+    }, None
+
+def _roll_json(roll) -> dict:
+    return {
+        "dice_roll": roll.dice_roll,
+        "mp_spent": roll.mp_spent,
+        "mp_bonus": roll.mp_bonus,
+        "boost_applied": roll.boost_applied,
+        "boost_bonus": roll.boost_bonus,
+        "total_roll": roll.total_roll,
+        "tier": roll.tier,
+    }
+
+def _act_json(session, player, result) -> dict:
+    return {
+        "session_id": str(session.id),
+        "status": session.status,
+        "stage_index": session.stage_index,
+        "turn_index": session.turn,       # <--- เดิมใช้ "turn" ทับชื่ออ็อบเจ็กต์
+        "player": _player_json(player),
+        "turn": {
+            "kind": result["kind"],
+            "narration": result["narration"],      # <--- ใส่ข้อความ AI
+            "cleared_stage": result["cleared_stage"],
+            "cleared_game": result["cleared_game"],
+            "dead": result["dead"],
+            "roll": _roll_json(result["roll"]),
+        },
+    }
+
+def _effects_json(ai) -> dict:
+    """ผล AI หลัง _validated (ไม่รวม narration ที่ส่งไปแล้ว)"""
+    return {k: v for k, v in ai.to_attrs().items() if k != "narration"}
+
+def _sse(event: str, data: dict) -> str:
+    """จัดรูปแบบ 1 ข้อความของ Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _sse_response(stream) -> StreamingHttpResponse:
+    resp = StreamingHttpResponse(stream, content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"   # กัน nginx buffer ทั้งก้อน
+    return resp
+
+class _TurnStream:
+    """
+    body ของ act_stream: ห่อ generator ของ SSE แล้วคืนการจองเทิร์นตอน response ปิด ถ้ายังไม่ได้ commit
+    Django เรียก close() ของ body เสมอ (WSGI/ASGI) แม้ client ตัดก่อนได้ chunk แรก — ตอนนั้น generator ยังไม่เริ่ม
+    try/except ข้างใน generator จึงไม่มีโอกาสทำงาน และผู้เล่นจะโดน 409 จนการจองหมดอายุ
+    """
+    def __init__(self, plan, stream):
+        self.plan = plan
+        self.committed = False   # generator ตั้งเป็น True หลัง commit_turn สำเร็จ
+        self._stream = stream
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    def close(self):
+        if hasattr(self._stream, "close"):
+            self._stream.close()
+        if not self.committed:
+            self.committed = True
+            release_turn(self.plan)
+
+# ---------- conditional GET (ETag) ----------
+# client poll state/intro ถี่ๆ → ตอบ 304 ได้ก่อน serialize (และก่อนเรียก narrator ของ intro)
+# validator = updated_at ของ session + ของผู้เล่น: ทุกจุดที่เขียน state (commit_turn, end_session) บันทึก updated_at ด้วยเสมอ
+# ทั้งสองค่าอยู่ใน session_cache entry → cache hit คำนวณ ETag ได้โดยไม่มี query
+
+def _state_etag(session, player, kind: str) -> str:
+    raw = f"{kind}|{session.id}|{session.updated_at.timestamp()!r}|{player.updated_at.timestamp()!r}"
+    tag = quote_etag(hashlib.sha1(raw.encode("ascii")).hexdigest()[:16])
+    # intro: narration ของตำแหน่งเดิมอาจถูกสร้างใหม่ (intro_cache หมดอายุ) แต่ความหมายเท่าเดิม → weak
+    return f"W/{tag}" if kind == "intro" else tag
+
+def _with_etag(response, tag: str):
+    response.headers["ETag"] = tag
+    # state เป็นของผู้เล่นคนเดียว: ห้าม shared cache เก็บ และให้ browser revalidate ทุกครั้ง
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Cookie", "X-ANON-ID"])
+    return response
+
+def _not_modified(request, tag: str):
+    """304 (พร้อม header เดิม) ถ้า If-None-Match ตรง ไม่งั้น None → ให้ view สร้าง response เต็ม"""
+    response = get_conditional_response(request, etag=tag)
+    return _with_etag(response, tag) if response is not None else None
+
+def _intro_response(session, player, narration: str, tag: str, *, from_llm: bool):
+    """narration จาก LLM (สดหรือจาก intro_cache) ได้ ETag; baseline ชั่วคราวไม่ให้ ETag/ไม่ให้เก็บ → โหลดใหม่ได้ลอง LLM อีก"""
+    response = JsonResponse(_intro_json(session, player, narration))
+    if not from_llm:
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+    return _with_etag(response, tag)
+
+INTRO_ACTION_TEXT = "สำรวจรอบตัว"
+
+def _intro_roll():
+    # roll ปลอมสำหรับบรรยาย (ไม่ทอยจริง)
+    return SimpleNamespace(
+        dice_roll=10,
+        mp_spent=0,
+        total_roll=10,
+        tier="neutral",
+        boost_applied=False,
+        mp_bonus=0,
+        boost_bonus=0,
+    )
+
+def _intro_json(session, player, narration: str) -> dict:
+    return {
+        "session_id": str(session.id),
+        "status": session.status,
+        "stage_index": session.stage_index,
+        "turn_index": session.turn,
+        "turn_intro": {"narration": narration},
+        "player": _player_json(player),
+    }
+
 
 # ---------- endpoints ----------
 
@@ -334,52 +395,84 @@ def start_session(request):
     - ถ้ามี ACTIVE อยู่แล้ว: คืน session เดิม (ป้องกันซ้อน)
     - ไม่ log STAGE_ENTER ที่นี่ ปล่อยให้ progress.resolve_turn จัดตอนเทิร์นแรก
     """
-    player = _get_or_create_player(request)
-
-    existing = Session.objects.filter(player=player, status=SessionStatus.ACTIVE).first()
+    pid = _player_id(request)
+    existing = (Session.objects.select_related("player")
+                .filter(player_id=pid, status=SessionStatus.ACTIVE).first())
     if existing:
         # มีอยู่แล้ว → คืน state ปัจจุบัน
-        return JsonResponse({
-            "session_id": str(existing.id),
-            "status": existing.status,
-            "stage_index": existing.stage_index,
-            "turn": existing.turn,
-            "player": {"hp": player.hp, "mp": player.mp, "pot_heal": player.pot_heal, "pot_boost": player.pot_boost},
-            "note": "resume_active_session",
-        }, status=200)
+        session_cache.fill(existing, existing.player)
+        return JsonResponse({**_state_json(existing, existing.player), "note": "resume_active_session"}, status=200)
+
+    player = _get_or_create_player(request, pid)
 
     # ถ้าอยากกันเริ่มที่ stage 1 ต้องมี Stage(1) ใน DB (ไม่จำเป็นต้อง FK)
     if not Stage.objects.filter(index=1).exists():
         # ไม่บังคับ แต่เตือน
         pass
 
-    with transaction.atomic():
-        session = Session.objects.create(player=player, stage_index=1, turn=1, status=SessionStatus.ACTIVE)
-        _log_session(player, session, EventType.SESSION_START)
+    player, session = _create_session(request, player)
+    return JsonResponse(_state_json(session, player), status=201)
 
-    return JsonResponse({
-        "session_id": str(session.id),
-        "status": session.status,
-        "stage_index": session.stage_index,
-        "turn": session.turn,
-        "player": {"hp": player.hp, "mp": player.mp, "pot_heal": player.pot_heal, "pot_boost": player.pot_boost},
-    }, status=201)
+def _create_session(request, player: Player):
+    """
+    (player, session) ใหม่ — player อาจถูก gc_players ลบไปหลัง resolve (mapping ใน LRU ค้าง):
+    _insert_session เจอแถวหาย (หรือ INSERT ชน FK) → ล้าง mapping ของผู้เรียก resolve ใหม่ (ได้ Player แถวใหม่) แล้วสร้างอีกครั้ง
+    """
+    try:
+        return player, _insert_session(player)
+    except (Player.DoesNotExist, IntegrityError):
+        identity.forget(*identity.request_identity(request))
+        player = _get_or_create_player(request)
+        return player, _insert_session(player)
+
+@transaction.atomic
+def _insert_session(player: Player) -> Session:
+    # ล็อกแถว player ก่อน: gc_players ข้ามแถวที่ถูกล็อก (skip_locked) และ FK ของ Postgres ตรวจตอน commit
+    # (ถ้าอยู่ใน transaction ชั้นนอกจะไม่ได้ IntegrityError ที่นี่) → เช็คเองว่ายังมีแถวอยู่
+    if not Player.objects.select_for_update().filter(pk=player.pk).exists():
+        raise Player.DoesNotExist(f"Player {player.pk} was deleted")
+    session = Session.objects.create(player=player, stage_index=1, turn=1, status=SessionStatus.ACTIVE)
+    _log_session(player, session, EventType.SESSION_START)
+    transaction.on_commit(lambda: session_cache.store(session, player))
+    return session
 
 
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_state(request, session_id):
-    """อ่านสถานะล่าสุดของ session"""
-    player = _get_or_create_player(request)
-    session = get_object_or_404(Session, id=session_id, player=player)
+    """อ่านสถานะล่าสุดของ session (session ที่ ACTIVE อยู่ใน session_cache → ไม่แตะ DB; ไม่เปลี่ยน → 304)"""
+    player, session = _player_and_session(request, session_id)
+
+    tag = _state_etag(session, player, "state")
+    return _not_modified(request, tag) or _with_etag(JsonResponse(_state_json(session, player)), tag)
+
+
+def _odds_payload() -> dict:
+    dists = [
+        {"mp_spent": mp, "boost": boost, "odds": {t: round(float(p), 4) for t, p in dist.items()}}
+        for (mp, boost), dist in sorted(TIER_DISTRIBUTIONS.items())
+    ]
+    return {
+        "tiers": list(TIERS),
+        "dice": [DICE_MIN, DICE_MAX],
+        "mp_bonus_per_point": MP_BONUS_PER_POINT,
+        "boost_bonus": BOOST_ROLL_BONUS,
+        "item_mp_cost": ITEM_MP_COST,
+        "mp_turns": sorted(FORCED_MP_TURNS),
+        "mp_spend_saturation": MP_SPEND_SATURATION,   # ใช้ MP มากกว่านี้โอกาสเท่าเดิม
+        "distributions": dists,
+    }
 
-    return JsonResponse({
-        "session_id": str(session.id),
-        "status": session.status,
-        "stage_index": session.stage_index,
-        "turn": session.turn,
-        "player": {"hp": player.hp, "mp": player.mp, "pot_heal": player.pot_heal, "pot_boost": player.pot_boost},
-    })
+# ตารางคงที่ตลอดอายุโปรเซส → คำนวณ body/ETag ครั้งเดียว
+_ODDS_BODY = json.dumps(_odds_payload(), ensure_ascii=False)
+_ODDS_ETAG = hashlib.sha1(_ODDS_BODY.encode("utf-8")).hexdigest()[:16]
+
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=3600)
+@etag(lambda request: _ODDS_ETAG)
+def odds(request):
+    """โอกาสออกแต่ละ tier ของทุกคู่ (mp_spent, boost) — ไม่แตะ DB, cache ได้ทั้ง browser/CDN"""
+    return HttpResponse(_ODDS_BODY, content_type="application/json")
 
 
 @csrf_exempt
@@ -396,73 +489,72 @@ def act(request, session_id):
       "seed": 123                # (optional) สำหรับรีเพลย์/เทสต์
     }
     """
-    player = _get_or_create_player(request)
-    session = get_object_or_404(Session, id=session_id, player=player)
+    player, session = _player_and_session(request, session_id)
 
     if session.status != SessionStatus.ACTIVE:
         return _bad_request(f"session is not ACTIVE (status={session.status})")
 
+    params, error = _parse_act_body(request)
+    if error:
+        return error
+
+    # ป้องกันกดซ้ำในเทิร์นเดียว: resolve_turn จองเทิร์นด้วย lock สั้นๆ
+    # แล้วเรียก LLM นอก transaction (ไม่ถือ row lock/connection ระหว่างรอ)
     try:
-        payload = json.loads(request.body.decode("utf-8")) if request.body else {}
-    except json.JSONDecodeError:
-        return _bad_request("invalid JSON body")
+        # เรียก service จัดการเทิร์น (เป็นแหล่งเดียวที่แตะกติกา/log รายเทิร์น)
+        result = resolve_turn(session=session, player=player, **params)
+    except TurnConflict as e:
+        return _conflict(str(e))
 
-    action_text = (payload.get("action_text") or "").strip()
-    if not action_text:
-        return _bad_request("action_text is required")
+    # ส่งผลลัพธ์ให้ client
+    return JsonResponse(_act_json(session, player, result))
 
-    use_mp    = int(payload.get("use_mp") or 0)
-    use_heal  = bool(payload.get("use_heal") or False)
-    use_boost = bool(payload.get("use_boost") or False)
-    seed      = payload.get("seed")  # อนุญาต None หรือ int
 
-    # ป้องกันกดซ้ำในเทิร์นเดียว: ล็อกแถว session
-    with transaction.atomic():
-        session = Session.objects.select_for_update().get(id=session.id)
-        # เรียก service จัดการเทิร์น (เป็นแหล่งเดียวที่แตะกติกา/log รายเทิร์น)
-        rng = None
-        if isinstance(seed, int):
-            import random
-            rng = random.Random(seed)
-
-        result = resolve_turn(
-            session=session,
-            player=player,
-            action_text=action_text,
-            use_mp=use_mp,
-            use_heal=use_heal,
-            use_boost=use_boost,
-            rng=rng,
-        )
+@csrf_exempt
+@require_http_methods(["POST"])
+def act_stream(request, session_id):
+    """
+    act แบบ streaming (text/event-stream) body เหมือน act ทุกอย่าง กติกาเกมเหมือนเดิม:
+    - event: roll       ผลทอยเต๋า ส่งทันทีหลังจองเทิร์น
+    - event: narration  {"text": ...} ทยอยส่งตามที่ LLM ตอบ
+    - event: result     ปิดท้าย: state ใหม่ + effects ที่ validate แล้ว (turn.narration คือฉบับสมบูรณ์)
+    - event: error      ถ้า commit ไม่ได้ (เช่น การจองเทิร์นหมดอายุ)
+    """
+    player, session = _player_and_session(request, session_id)
 
-    # ส่งผลลัพธ์ให้ client
-    roll = result["roll"]
-    return JsonResponse({
-        "session_id": str(session.id),
-        "status": session.status,
-        "stage_index": session.stage_index,
-        "turn_index": session.turn,       # <--- เดิมใช้ "turn" ทับชื่ออ็อบเจ็กต์
-        "player": {
-            "hp": player.hp, "mp": player.mp,
-            "pot_heal": player.pot_heal, "pot_boost": player.pot_boost,
-        },
-        "turn": {
-            "kind": result["kind"],
-            "narration": result["narration"],      # <--- ใส่ข้อความ AI
-            "cleared_stage": result["cleared_stage"],
-            "cleared_game": result["cleared_game"],
-            "dead": result["dead"],
-            "roll": {
-                "dice_roll": roll.dice_roll,
-                "mp_spent": roll.mp_spent,
-                "mp_bonus": roll.mp_bonus,
-                "boost_applied": roll.boost_applied,
-                "boost_bonus": roll.boost_bonus,
-                "total_roll": roll.total_roll,
-                "tier": roll.tier,
-            },
-        },
-    })
+    if session.status != SessionStatus.ACTIVE:
+        return _bad_request(f"session is not ACTIVE (status={session.status})")
+
+    params, error = _parse_act_body(request)
+    if error:
+        return error
+
+    try:
+        plan = begin_turn(session=session, player=player, **params)
+    except TurnConflict as e:
+        return _conflict(str(e))
+
+    def stream():
+        yield _sse("roll", {"kind": plan.kind, "roll": _roll_json(plan.roll)})
+
+        ai = None
+        for kind, value in stream_fetch_effects(plan):
+            if kind == "narration":
+                yield _sse("narration", {"text": value})
+            else:
+                ai = value
+
+        try:
+            result = commit_turn(plan, ai)
+        except TurnConflict as e:
+            yield _sse("error", {"error": str(e)})
+            return
+        turn.committed = True
+        yield _sse("result", {**_act_json(session, player, result), "effects": _effects_json(ai)})
+
+    # client ตัดการเชื่อมต่อ (ก่อนหรือระหว่าง stream)/narrator พัง → _TurnStream.close() คืนการจองให้กดใหม่ได้
+    turn = _TurnStream(plan, stream())
+    return _sse_response(turn)
 
 
 @csrf_exempt
@@ -472,51 +564,55 @@ def end_session(request, session_id):
     จบ session ด้วยมือ (เช่น ปุ่ม Quit)
     - ตอนนี้ใช้สถานะ ESCAPED เป็นตัวแทนของ "เลิกรอบเล่น"
     """
-    player = _get_or_create_player(request)
-    session = get_object_or_404(Session, id=session_id, player=player)
+    player, session = _player_and_session(request, session_id)
 
     if session.status != SessionStatus.ACTIVE:
         return _bad_request(f"session is not ACTIVE (status={session.status})")
 
     with transaction.atomic():
-        session.status = SessionStatus.ESCAPED
-        session.ended_at = timezone.now()
-        session.save(update_fields=["status", "ended_at", "updated_at"])
+        # snapshot ใน session_cache อาจค้าง (backend "local" ของอีก worker) → จบแบบมีเงื่อนไขใน DB เสมอ
+        now = timezone.now()
+        ended = (Session.objects.filter(pk=session.pk, status=SessionStatus.ACTIVE)
+                 .update(status=SessionStatus.ESCAPED, ended_at=now, updated_at=now))
+        session = Session.objects.select_related("player").get(pk=session.pk)   # ค่าจริงไว้ log + cache
+        player = session.player
+        transaction.on_commit(lambda: session_cache.store(session, player))   # tombstone / แก้ snapshot ค้าง
+        if not ended:
+            return _bad_request(f"session is not ACTIVE (status={session.status})")
+        key = intro_key(session)
         _log_session(player, session, EventType.SESSION_END, attrs={"status": SessionStatus.ESCAPED})
+        transaction.on_commit(lambda: intro_cache.pop(key))
 
     return JsonResponse({"ok": True, "session_id": str(session.id), "status": session.status})
 
 @csrf_exempt
 @require_http_methods(["GET"])
 def intro(request, session_id):
-    player = _get_or_create_player(request)
-    session = get_object_or_404(Session, id=session_id, player=player)
-    kind = classify_turn(session.turn)
-
-    # roll ปลอมสำหรับบรรยาย (ไม่ทอยจริง)
-    fake = SimpleNamespace(
-        dice_roll=10,
-        mp_spent=0,
-        total_roll=10,
-        tier="neutral",
-        boost_applied=False,
-        mp_bonus=0,
-        boost_bonus=0,
-    )
+    player, session = _player_and_session(request, session_id)
+    tag = _state_etag(session, player, "intro")
+    not_modified = _not_modified(request, tag)
+    if not_modified:
+        return not_modified
+
+    # intro ของตำแหน่ง (stage, turn) เดิมไม่ต้องเรียก LLM ซ้ำ
+    key = intro_key(session)
+    narration = intro_cache.get(key)
+    from_llm = True   # ใน intro_cache มีแต่ narration จาก LLM
+    if narration is None:
+        ai = resolve_effects(
+            session=session, player=player, roll=_intro_roll(),
+            action_text=INTRO_ACTION_TEXT, kind=classify_turn(session.turn),
+            priority=PRIORITY_INTRO,   # intro รอได้ ให้ act ไปก่อน
+        )
+        narration = ai.narration
+        from_llm = ai.source == "llm"
+        if from_llm:   # baseline (LLM ล้ม/breaker/คิวเต็ม) ไม่ cache → ครั้งหน้าลอง LLM ใหม่
+            intro_cache.set(key, narration)
 
-    ai = resolve_effects(
-        session=session, player=player, roll=fake,
-        action_text="สำรวจรอบตัว", kind=kind
-    )
+    return _intro_response(session, player, narration, tag, from_llm=from_llm)
 
-    return JsonResponse({
-        "session_id": str(session.id),
-        "status": session.status,
-        "stage_index": session.stage_index,
-        "turn_index": session.turn,
-        "turn_intro": {"narration": ai.narration},
-        "player": {
-            "hp": player.hp, "mp": player.mp,
-            "pot_heal": player.pot_heal, "pot_boost": player.pot_boost,
-        },
-    })
\ No newline at end of file
+@staff_member_required
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """ตัวเลข runtime ของโปรเซสนี้ (cache hit/miss ฯลฯ) — เฉพาะ staff: มีขนาด cache/คิว LLM ที่ไม่ควรเปิดสาธารณะ"""
+    return JsonResponse(metrics.snapshot())
\ No newline at end of file
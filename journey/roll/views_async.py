@@ -0,0 +1,200 @@
+# roll/views_async.py
+# เวอร์ชัน async ของ endpoint เกม สำหรับรันบน ASGI (journey/asgi.py)
+# - ใช้ async ORM + AsyncGroq → 1 worker process รอ narrator ได้หลายร้อยเทิร์นพร้อมกัน
+# - ช่วงที่ต้องใช้ transaction/select_for_update (จอง/commit เทิร์น) รันผ่าน sync_to_async สั้นๆ
+# - view แบบ sync ใน roll/views.py ยังอยู่ครบ ใช้เป็น fallback (เลือกผ่าน settings.ROLL_ASYNC_VIEWS)
+from __future__ import annotations
+import asyncio
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from roll import identity
+from roll.ai import aresolve_effects, PRIORITY_INTRO
+from roll.caches import intro_cache, intro_key, session_cache, instances_from_entry
+from roll.enums import SessionStatus
+from roll.models import Player, Session
+from roll.progress import (
+    aresolve_turn, TurnConflict,
+    begin_turn, astream_fetch_effects, release_turn, commit_turn,
+)
+from roll.rules import classify_turn
+from roll.views import (
+    INTRO_ACTION_TEXT,
+    _act_json, _bad_request, _conflict, _create_session, _effects_json,
+    _intro_response, _intro_roll, _not_modified, _parse_act_body, _roll_json, _sse, _sse_response,
+    _state_etag, _state_json, _with_etag, _TurnStream,
+)
+
+# ---------- helpers ----------
+
+class _ATurnStream(_TurnStream):
+    """เหมือน views._TurnStream แต่ห่อ async generator (ASGI เรียก response.close() ผ่าน sync_to_async)"""
+    __iter__ = None   # ให้ StreamingHttpResponse มองเป็น async iterator
+
+    def __aiter__(self):
+        return aiter(self._stream)
+
+async def _aplayer_id(request) -> int:
+    """เหมือน views._player_id"""
+    return await identity.aresolve_player_id(*await identity.arequest_identity(request))
+
+async def _aget_or_create_player(request, pid: Optional[int] = None) -> Player:
+    """เหมือน views._get_or_create_player แต่ใช้ async ORM"""
+    player = await Player.objects.filter(pk=pid if pid is not None else await _aplayer_id(request)).afirst()
+    if player is None:
+        identity.forget(*await identity.arequest_identity(request))
+        player = await Player.objects.aget(pk=await _aplayer_id(request))
+    return player
+
+async def _aowns_entry(request, cached_player: dict) -> bool:
+    """เหมือน views._owns_entry (request.auser() แทน request.user)"""
+    user = await request.auser()
+    if user and user.is_authenticated:
+        return cached_player["user_id"] == user.pk
+    anon_id = request.headers.get("X-ANON-ID")
+    return bool(anon_id) and cached_player["anon_id"] == anon_id
+
+async def _aplayer_and_session(request, session_id):
+    """เหมือน views._player_and_session"""
+    entry = await session_cache.aget(session_id)
+    if entry is not None and await _aowns_entry(request, entry["player"]):
+        return instances_from_entry(entry)
+    session = await (Session.objects.select_related("player")
+                     .filter(id=session_id, player_id=await _aplayer_id(request)).afirst())
+    if session is None:
+        raise Http404("No Session matches the given query.")
+    await session_cache.afill(session, session.player)
+    return session.player, session
+
+async def _abegin_turn(**kwargs):
+    """
+    begin_turn ใน thread — client ตัดระหว่างรอ → ASGI ยกเลิก view (ไม่มี response ให้ _ATurnStream ปิด)
+    แต่ thread ยังจองต่อจนเสร็จ → รอให้เสร็จแล้วคืนการจองก่อนปล่อย CancelledError ออกไป
+    """
+    reserve = asyncio.ensure_future(sync_to_async(begin_turn)(**kwargs))
+    try:
+        return await asyncio.shield(reserve)
+    except asyncio.CancelledError:
+        try:
+            await sync_to_async(release_turn)(await reserve)
+        except TurnConflict:
+            pass
+        raise
+
+# ---------- endpoints ----------
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def start_session(request):
+    """เหมือน views.start_session (คืน session ACTIVE เดิมถ้ามี)"""
+    pid = await _aplayer_id(request)
+    existing = await (Session.objects.select_related("player")
+                      .filter(player_id=pid, status=SessionStatus.ACTIVE).afirst())
+    if existing:
+        await session_cache.afill(existing, existing.player)
+        return JsonResponse({**_state_json(existing, existing.player), "note": "resume_active_session"}, status=200)
+
+    player = await _aget_or_create_player(request, pid)
+
+    player, session = await sync_to_async(_create_session)(request, player)
+    return JsonResponse(_state_json(session, player), status=201)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+async def get_state(request, session_id):
+    """อ่านสถานะล่าสุดของ session (session ที่ ACTIVE อยู่ใน session_cache → ไม่แตะ DB; ไม่เปลี่ยน → 304)"""
+    player, session = await _aplayer_and_session(request, session_id)
+    tag = _state_etag(session, player, "state")
+    return _not_modified(request, tag) or _with_etag(JsonResponse(_state_json(session, player)), tag)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def act(request, session_id):
+    """เล่น 1 เทิร์น — body เหมือน views.act ทุกอย่าง"""
+    player, session = await _aplayer_and_session(request, session_id)
+
+    if session.status != SessionStatus.ACTIVE:
+        return _bad_request(f"session is not ACTIVE (status={session.status})")
+
+    params, error = _parse_act_body(request)
+    if error:
+        return error
+
+    try:
+        result = await aresolve_turn(session=session, player=player, **params)
+    except TurnConflict as e:
+        return _conflict(str(e))
+
+    return JsonResponse(_act_json(session, player, result))
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def act_stream(request, session_id):
+    """act แบบ SSE — ลำดับ event เหมือน views.act_stream"""
+    player, session = await _aplayer_and_session(request, session_id)
+
+    if session.status != SessionStatus.ACTIVE:
+        return _bad_request(f"session is not ACTIVE (status={session.status})")
+
+    params, error = _parse_act_body(request)
+    if error:
+        return error
+
+    try:
+        plan = await _abegin_turn(session=session, player=player, **params)
+    except TurnConflict as e:
+        return _conflict(str(e))
+
+    async def stream():
+        yield _sse("roll", {"kind": plan.kind, "roll": _roll_json(plan.roll)})
+
+        ai = None
+        async for kind, value in astream_fetch_effects(plan):
+            if kind == "narration":
+                yield _sse("narration", {"text": value})
+            else:
+                ai = value
+
+        try:
+            result = await sync_to_async(commit_turn)(plan, ai)
+        except TurnConflict as e:
+            yield _sse("error", {"error": str(e)})
+            return
+        turn.committed = True
+        yield _sse("result", {**_act_json(session, player, result), "effects": _effects_json(ai)})
+
+    turn = _ATurnStream(plan, stream())
+    return _sse_response(turn)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+async def intro(request, session_id):
+    player, session = await _aplayer_and_session(request, session_id)
+    tag = _state_etag(session, player, "intro")
+    not_modified = _not_modified(request, tag)
+    if not_modified:
+        return not_modified
+
+    key = intro_key(session)
+    narration = intro_cache.get(key)
+    from_llm = True   # ใน intro_cache มีแต่ narration จาก LLM
+    if narration is None:
+        ai = await aresolve_effects(
+            session=session, player=player, roll=_intro_roll(),
+            action_text=INTRO_ACTION_TEXT, kind=classify_turn(session.turn),
+            priority=PRIORITY_INTRO,   # intro รอได้ ให้ act ไปก่อน
+        )
+        narration = ai.narration
+        from_llm = ai.source == "llm"
+        if from_llm:   # baseline (LLM ล้ม/breaker/คิวเต็ม) ไม่ cache → ครั้งหน้าลอง LLM ใหม่
+            intro_cache.set(key, narration)
+
+    return _intro_response(session, player, narration, tag, from_llm=from_llm)